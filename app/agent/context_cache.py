@@ -0,0 +1,108 @@
+"""Gemini context caching of large, stable prompt prefixes.
+
+Prompt builders put the static part of a prompt (the node's system prompt
+plus fixed reference material) in the leading SystemMessage.
+generate_gemini_structured(..., cache_prefix=True) registers that text once as
+Gemini cached content and sends only the remaining messages on each call, so
+repeated calls (one per section of a page, and across pages) neither resend
+nor re-bill the prefix at the full input rate.
+
+Cached contents are keyed by model and a hash of the prefix, live for
+GEMINI_CONTEXT_CACHE_TTL_SECONDS and are recreated shortly before they
+expire. Prefixes the API refuses to cache (e.g. below the model's minimum
+size) are remembered for the TTL and sent inline.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Optional
+
+from app.agent.rate_limits import estimate_tokens
+from app.config import Config
+
+# Stop handing out a cached content this long before it expires
+_EXPIRY_MARGIN_SECONDS = 30
+
+_ENTRIES: dict[str, tuple[Optional[str], float]] = {}
+_ENTRIES_LOCK = threading.Lock()
+_CREATE_LOCKS: dict[tuple[int, str], asyncio.Lock] = {}
+
+
+def _entry_key(model: str, prefix: str) -> str:
+    digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+    return f"{model.removeprefix('models/')}:{digest}"
+
+
+def _lookup(key: str) -> tuple[bool, Optional[str]]:
+    """(known, cached content name) for `key`; name None = not cacheable."""
+    with _ENTRIES_LOCK:
+        entry = _ENTRIES.get(key)
+    if entry is None or entry[1] <= time.monotonic():
+        return False, None
+    return True, entry[0]
+
+
+def _create_lock(key: str) -> asyncio.Lock:
+    # Locks belong to the loop that created them; key them by loop as well
+    lock_key = (id(asyncio.get_running_loop()), key)
+    with _ENTRIES_LOCK:
+        lock = _CREATE_LOCKS.get(lock_key)
+        if lock is None:
+            lock = _CREATE_LOCKS[lock_key] = asyncio.Lock()
+    return lock
+
+
+def invalidate(model: str, prefix: str) -> None:
+    """Forget the cached content of `prefix` (e.g. after it was deleted)."""
+    with _ENTRIES_LOCK:
+        _ENTRIES.pop(_entry_key(model, prefix), None)
+
+
+async def get_cached_content(model: str, prefix: str) -> Optional[str]:
+    """
+    Name of a live Gemini cached content holding `prefix` as the system
+    instruction, creating it if needed; None when caching is off or the
+    prefix can't be cached.
+    """
+    if not Config.GEMINI_CONTEXT_CACHE_ENABLED or not prefix:
+        return None
+    if estimate_tokens(prefix) < Config.GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+        return None
+    key = _entry_key(model, prefix)
+    known, name = _lookup(key)
+    if known:
+        return name
+
+    # One creation per prefix, even when a whole page of sections asks at once
+    async with _create_lock(key):
+        known, name = _lookup(key)
+        if known:
+            return name
+
+        from app.agent.llm import get_genai_client
+
+        ttl = max(int(Config.GEMINI_CONTEXT_CACHE_TTL_SECONDS), 60)
+        try:
+            cache = await get_genai_client().aio.caches.create(
+                model=model,
+                config={
+                    "system_instruction": prefix,
+                    "ttl": f"{ttl}s",
+                    "display_name": key[:128],
+                },
+            )
+            name = cache.name
+            print(f"[CONTEXT_CACHE] Cached {model} prompt prefix as {name}")
+        except Exception as e:
+            print(f"[CONTEXT_CACHE] Prefix for {model} not cached: {e}")
+            name = None
+        with _ENTRIES_LOCK:
+            _ENTRIES[key] = (
+                name,
+                time.monotonic() + max(ttl - _EXPIRY_MARGIN_SECONDS, 1),
+            )
+        return name
@@ -0,0 +1,199 @@
+"""Compaction of the conversation history sent to, and kept for, the LLMs.
+
+`state.messages` grows with every follow-up, including full file reads and
+lint dumps returned by tools. Two things keep it in check:
+
+- stale_tool_stubs: tool results from earlier turns (before the latest user
+  message) are replaced by short stubs. The router returns these at the start
+  of every run, so the checkpoint itself stops growing with old payloads.
+- compact_history: before a node calls its model, the history is fitted into
+  that node's token budget (Config.HISTORY_TOKEN_BUDGETS). The newest turns
+  are kept whole, older turns are folded into a short summary, and if the
+  current turn alone is over budget its older tool results are stubbed.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Optional, Sequence
+
+from langchain_core.messages import AIMessage, SystemMessage, ToolMessage
+
+from app.config import Config
+
+# Rough prompt-size heuristic, as in app/agent/rate_limits.py
+_CHARS_PER_TOKEN = 4
+# Each summarized message keeps at most this much of its text
+_SUMMARY_SNIPPET_CHARS = 300
+# The summary may use half the budget left by the kept turns, but at least this
+_SUMMARY_MIN_CHARS = 1200
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(
+            str(part.get("text", "")) if isinstance(part, dict) else str(part)
+            for part in content
+        )
+    return str(content or "")
+
+
+def message_tokens(message: Any) -> int:
+    chars = len(_text(getattr(message, "content", "")))
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        chars += len(json.dumps([call.get("args") for call in tool_calls], default=str))
+    return chars // _CHARS_PER_TOKEN + 1
+
+
+def _is_human(message: Any) -> bool:
+    return getattr(message, "type", None) == "human"
+
+
+def _last_human_index(messages: Sequence[Any]) -> int:
+    for index in range(len(messages) - 1, -1, -1):
+        if _is_human(messages[index]):
+            return index
+    return 0
+
+
+def _stub(message: ToolMessage) -> ToolMessage:
+    size = len(_text(message.content))
+    return ToolMessage(
+        content=(
+            f"[{message.name or 'tool'} output from an earlier step removed to "
+            f"save context ({size} chars). Call the tool again if you need it.]"
+        ),
+        tool_call_id=message.tool_call_id,
+        name=message.name,
+        id=message.id,
+    )
+
+
+def _stubbable(message: Any) -> bool:
+    return (
+        isinstance(message, ToolMessage)
+        and len(_text(message.content)) >= Config.HISTORY_STUB_MIN_CHARS
+    )
+
+
+def stale_tool_stubs(messages: Sequence[Any]) -> list[ToolMessage]:
+    """
+    Stubs for large tool results of earlier turns. Returned from a node, they
+    replace the originals in the checkpoint (add_messages matches on id).
+    """
+    if not Config.HISTORY_COMPACTION_ENABLED:
+        return []
+    boundary = _last_human_index(messages)
+    return [
+        _stub(message)
+        for message in messages[:boundary]
+        if _stubbable(message) and message.id
+    ]
+
+
+def _summarize(messages: Sequence[Any], max_chars: int) -> Optional[SystemMessage]:
+    lines: list[str] = []
+    for message in messages:
+        kind = getattr(message, "type", None)
+        if kind == "human":
+            text = _text(message.content).strip()
+            lines.append(f"- User: {text[:_SUMMARY_SNIPPET_CHARS]}")
+        elif kind == "ai":
+            tool_calls = getattr(message, "tool_calls", None) or []
+            if tool_calls:
+                names = ", ".join(call.get("name") or "tool" for call in tool_calls)
+                lines.append(f"- Assistant used tools: {names}")
+            text = _text(message.content).strip()
+            if text:
+                lines.append(f"- Assistant: {text[:_SUMMARY_SNIPPET_CHARS]}")
+    if not lines:
+        return None
+    # Keep the most recent lines when the summary itself is too long
+    kept: list[str] = []
+    size = 0
+    for line in reversed(lines):
+        size += len(line) + 1
+        if size > max_chars:
+            break
+        kept.append(line)
+    omitted = len(lines) - len(kept)
+    header = "Summary of earlier conversation (older turns were compacted):"
+    if omitted:
+        header += f"\n- ({omitted} earlier items omitted)"
+    return SystemMessage(content=header + "\n" + "\n".join(reversed(kept)))
+
+
+def budget_for(node: str) -> int:
+    """History token budget of `node` (Config.HISTORY_TOKEN_BUDGETS)."""
+    for entry in Config.HISTORY_TOKEN_BUDGETS.split(","):
+        name, _, value = entry.partition("=")
+        if name.strip() == node:
+            try:
+                return int(value)
+            except ValueError:
+                break
+    return Config.HISTORY_DEFAULT_TOKEN_BUDGET
+
+
+def compact_history(messages: Sequence[Any], *, node: str) -> list[Any]:
+    """`messages` fitted into `node`'s token budget (see module docstring)."""
+    messages = list(messages)
+    if not Config.HISTORY_COMPACTION_ENABLED or not messages:
+        return messages
+    budget = budget_for(node)
+    boundary = _last_human_index(messages)
+
+    # Earlier turns never need full tool payloads
+    messages = [
+        _stub(message) if index < boundary and _stubbable(message) else message
+        for index, message in enumerate(messages)
+    ]
+    sizes = [message_tokens(message) for message in messages]
+    if sum(sizes) <= budget:
+        return messages
+
+    # Keep whole turns, newest first, while they fit; the current turn always
+    start = boundary
+    used = sum(sizes[boundary:])
+    for index in range(boundary - 1, -1, -1):
+        if not _is_human(messages[index]):
+            continue
+        turn = sum(sizes[index:start])
+        if used + turn > budget:
+            break
+        used += turn
+        start = index
+
+    kept = messages[start:]
+    if used > budget:
+        # The current turn alone is too big: stub its older tool results,
+        # keeping the answers to the latest batch of tool calls
+        last_call = max(
+            (
+                i
+                for i, m in enumerate(kept)
+                if isinstance(m, AIMessage) and m.tool_calls
+            ),
+            default=len(kept),
+        )
+        for index in range(len(kept)):
+            if used <= budget or index >= last_call:
+                break
+            if _stubbable(kept[index]):
+                stub = _stub(kept[index])
+                used -= message_tokens(kept[index]) - message_tokens(stub)
+                kept[index] = stub
+
+    summary = _summarize(
+        messages[:start],
+        max((budget - used) * _CHARS_PER_TOKEN // 2, _SUMMARY_MIN_CHARS),
+    )
+    if start:
+        print(
+            f"[HISTORY] {node}: compacted {start} earlier messages "
+            f"({sum(sizes[:start])} tokens) into a summary"
+        )
+    return ([summary] if summary is not None else []) + kept
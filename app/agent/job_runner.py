@@ -1,18 +1,30 @@
-"""Background runners for LangGraph jobs.
+"""Runners for queued LangGraph jobs.
 
-These helpers execute the graph in the background and append job events
-to MongoDB as nodes run. Frontend can poll job state via the jobs API.
+Worker processes (see app/worker.py) claim jobs from the durable queue and
+call these helpers, which execute the graph and append job events to MongoDB
+as nodes run. Frontend can poll job state via the jobs API.
 """
 
 from __future__ import annotations
 
+import asyncio
+import time
 from typing import Any, Tuple
 
 from langchain_core.messages import HumanMessage
 
 from app.agent.graph import agent
+from app.agent.prompt_fragments import forget_job
 from app.models.job import JobStatus
+from app.utils.job_cancellation import (
+    LEASE_LOST,
+    JobCancelled,
+    register_job,
+    unregister_job,
+)
 from app.utils.jobs import log_job_event, update_job_status, pop_last_agent_message
+from app.utils.llm_usage import flush_job_usage, usage_callbacks
+from app.utils.metrics import JOB_SECONDS, metrics_callbacks
 
 
 DEFAULT_NODE_MESSAGES = {
@@ -73,6 +85,18 @@ def _final_message(job_id: str, last_message: str, default: str) -> str:
     return default
 
 
+def _record_job_cancelled(job_id: str, session_id: str) -> None:
+    print(f"[JOB_RUNNER] Job {job_id} cancelled")
+    log_job_event(
+        job_id,
+        node="__end__",
+        message="Job cancelled.",
+        event_type="job_cancelled",
+        data={"session_id": session_id},
+    )
+    update_job_status(job_id, status=JobStatus.CANCELLED)
+
+
 def _summarize_tool_event(
     tool_name: str, tool_calls: list[dict[str, Any]]
 ) -> Tuple[str, dict[str, Any]]:
@@ -235,46 +259,91 @@ def _extract_tool_metadata(update: dict[str, Any]) -> dict[str, Any]:
     return meta
 
 
-def run_chat_job(job_id: str, session_id: str, message: str) -> None:
+def _graph_config(session_id: str, job_id: str | None = None) -> dict[str, Any]:
+    return {
+        "configurable": {
+            "thread_id": session_id,
+            "session_id": session_id,  # Pass session_id to tools
+        },
+        # Lets LLM usage be attributed to the job (see app/utils/llm_usage.py)
+        "metadata": {"job_id": job_id} if job_id else {},
+        "recursion_limit": 30,
+        "callbacks": [*metrics_callbacks(), *usage_callbacks()],
+    }
+
+
+def _record_job_completed(job_id: str, session_id: str, message: str) -> None:
+    log_job_event(
+        job_id,
+        node="__end__",
+        message=message,
+        event_type="job_completed",
+        data={"session_id": session_id},
+    )
+    update_job_status(job_id, status=JobStatus.COMPLETED)
+
+
+# Per job type: messages for the final event, the nodes whose output becomes
+# that final message and the node name used for crash events.
+_JOB_KINDS: dict[str, dict[str, Any]] = {
+    "chat": {
+        "end_message": "Graph execution completed",
+        "fallback_end_message": "Changes applied to landing page",
+        "meaningful_nodes": (
+            "codegen",
+            "followup_codegen",
+            "deployment_fixer",
+            "fix_errors",
+            "deployer",
+            "clarify",
+        ),
+    },
+    "init": {
+        "end_message": "Landing page creation completed",
+        "fallback_end_message": "Landing page creation completed",
+        "meaningful_nodes": ("codegen", "deployment_fixer", "fix_errors"),
+    },
+}
+
+
+async def _run_graph_job(
+    job_id: str,
+    session_id: str,
+    graph_input: dict[str, Any] | None,
+    *,
+    kind: str,
+) -> None:
     """
-    Execute a chat job in the background.
+    Stream a graph run and append its node events to the job.
 
-    Streams LangGraph events and appends them as JobEvents in MongoDB.
+    `graph_input=None` resumes the session thread from its latest checkpoint
+    instead of starting a new run. Cancellation is checked between supersteps.
     """
+    spec = _JOB_KINDS[kind]
+    token = register_job(job_id)
+    last_meaningful_message = ""
+    started = time.perf_counter()
+    outcome = "error"
     try:
+        token.raise_if_cancelled()
         saw_graph_end = False
-        last_meaningful_message = ""
-        for event in agent.stream(
-            {
-                "messages": [HumanMessage(content=message)],
-                "session_id": session_id,
-                "job_id": job_id,
-            },
-            config={
-                "configurable": {
-                    "thread_id": session_id,
-                    "session_id": session_id,  # Pass session_id to tools
-                },
-                "recursion_limit": 30,
-            },
+        async for event in agent.astream(
+            graph_input, config=_graph_config(session_id, job_id)
         ):
+            token.raise_if_cancelled()
             for node, update in event.items():
                 if node == "__start__":
                     continue
 
                 # When the graph signals __end__, mark the job as completed and record a final event.
                 if node == "__end__":
-                    final_msg = _final_message(
-                        job_id, last_meaningful_message, "Graph execution completed"
-                    )
-                    log_job_event(
+                    _record_job_completed(
                         job_id,
-                        node="__end__",
-                        message=final_msg,
-                        event_type="job_completed",
-                        data={"session_id": session_id},
+                        session_id,
+                        _final_message(
+                            job_id, last_meaningful_message, spec["end_message"]
+                        ),
                     )
-                    update_job_status(job_id, status=JobStatus.COMPLETED)
                     saw_graph_end = True
                     continue
 
@@ -324,14 +393,7 @@ def run_chat_job(job_id: str, session_id: str, message: str) -> None:
                     continue
 
                 # Track last message from core implementation nodes for final event
-                if node in (
-                    "codegen",
-                    "followup_codegen",
-                    "deployment_fixer",
-                    "fix_errors",
-                    "deployer",
-                    "clarify",
-                ):
+                if node in spec["meaningful_nodes"]:
                     last_meaningful_message = msg
 
                 # NOTE: we deliberately avoid storing the raw `update` object in MongoDB,
@@ -345,43 +407,71 @@ def run_chat_job(job_id: str, session_id: str, message: str) -> None:
                     data=tool_meta,
                 )
         if not saw_graph_end:
-            final_msg = _final_message(
-                job_id, last_meaningful_message, "Changes applied to landing page"
-            )
-            log_job_event(
+            _record_job_completed(
                 job_id,
-                node="__end__",
-                message=final_msg,
-                event_type="job_completed",
-                data={"session_id": session_id},
+                session_id,
+                _final_message(
+                    job_id, last_meaningful_message, spec["fallback_end_message"]
+                ),
             )
-            update_job_status(job_id, status=JobStatus.COMPLETED)
+        outcome = "ok"
+    except (JobCancelled, asyncio.CancelledError):
+        # CancelledError also surfaces from node tasks cancelled with the job;
+        # anything else (e.g. worker shutdown) propagates.
+        if not token.cancelled:
+            raise
+        if token.reason == LEASE_LOST:
+            # The job is another worker's now; leave its status alone
+            outcome = "lease_lost"
+            print(f"[JOB_RUNNER] Stopped {kind} job {job_id}: queue lease lost")
+        else:
+            outcome = "cancelled"
+            _record_job_cancelled(job_id, session_id)
     except Exception as e:
         if _is_graph_end_exception(e):
-            final_msg = _final_message(
-                job_id, last_meaningful_message, "Graph execution completed"
-            )
-            log_job_event(
+            outcome = "ok"
+            _record_job_completed(
                 job_id,
-                node="__end__",
-                message=final_msg,
-                event_type="job_completed",
-                data={"session_id": session_id},
+                session_id,
+                _final_message(job_id, last_meaningful_message, spec["end_message"]),
             )
-            update_job_status(job_id, status=JobStatus.COMPLETED)
         else:
-            print(f"[JOB_RUNNER] Chat job failed: {e}")
+            print(f"[JOB_RUNNER] {kind.capitalize()} job failed: {e}")
             log_job_event(
                 job_id,
-                node="chat_job_runner",
-                message="Chat job crashed before completion.",
+                node=f"{kind}_job_runner",
+                message=f"{kind.capitalize()} job crashed before completion.",
                 event_type="error",
                 data={"error": str(e)},
             )
             update_job_status(job_id, status=JobStatus.FAILED, error_message=str(e))
+    finally:
+        JOB_SECONDS.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+        unregister_job(job_id)
+        forget_job(job_id)
+        await asyncio.to_thread(flush_job_usage, job_id)
 
 
-def run_init_job(
+async def run_chat_job(job_id: str, session_id: str, message: str) -> None:
+    """
+    Execute a chat job on the worker's event loop.
+
+    Streams LangGraph events via agent.astream and appends them as JobEvents
+    in MongoDB.
+    """
+    await _run_graph_job(
+        job_id,
+        session_id,
+        {
+            "messages": [HumanMessage(content=message)],
+            "session_id": session_id,
+            "job_id": job_id,
+        },
+        kind="chat",
+    )
+
+
+async def run_init_job(
     job_id: str,
     session_id: str,
     init_payload: dict[str, Any],
@@ -389,145 +479,57 @@ def run_init_job(
     state_overrides: dict[str, Any] | None = None,
 ) -> None:
     """
-    Execute an init job in the background.
+    Execute an init job on the worker's event loop.
 
     Mirrors the behavior of the previous /init/stream endpoint but persists
     node events to the jobs collection instead of streaming SSE.
     """
-    try:
-        saw_graph_end = False
-        last_meaningful_message = ""
-        combined = "INITIAL CREATION PAYLOAD\n" + init_payload_text
-
-        initial_state: dict[str, Any] = {
-            "messages": [HumanMessage(content=combined)],
-            "init_payload": init_payload,
-            "init_payload_text": init_payload_text,
-            "session_id": session_id,
-            "job_id": job_id,
-        }
-        if state_overrides:
-            initial_state.update(state_overrides)
-
-        for event in agent.stream(
-            initial_state,
-            config={
-                "configurable": {"thread_id": session_id, "session_id": session_id},
-                "recursion_limit": 30,
-            },
-        ):
-            for node, update in event.items():
-                if node == "__start__":
-                    continue
-
-                if node == "__end__":
-                    final_msg = _final_message(
-                        job_id,
-                        last_meaningful_message,
-                        "Landing page creation completed",
-                    )
-                    log_job_event(
-                        job_id,
-                        node="__end__",
-                        message=final_msg,
-                        event_type="job_completed",
-                        data={"session_id": session_id},
-                    )
-                    update_job_status(job_id, status=JobStatus.COMPLETED)
-                    saw_graph_end = True
-                    continue
+    combined = "INITIAL CREATION PAYLOAD\n" + init_payload_text
 
-                if not isinstance(update, dict):
-                    continue
+    initial_state: dict[str, Any] = {
+        "messages": [HumanMessage(content=combined)],
+        "init_payload": init_payload,
+        "init_payload_text": init_payload_text,
+        "session_id": session_id,
+        "job_id": job_id,
+    }
+    if state_overrides:
+        initial_state.update(state_overrides)
 
-                tool_meta = _extract_tool_metadata(update)
-                has_tool_activity = bool(
-                    tool_meta.get("tool_name") or tool_meta.get("tool_calls")
-                )
-
-                if node.endswith("_tools") and tool_meta.get("tool_name"):
-                    msg, extra_meta = _summarize_tool_event(
-                        tool_meta["tool_name"], tool_meta.get("tool_calls", [])
-                    )
-                    if extra_meta:
-                        tool_meta.update(extra_meta)
-                else:
-                    if has_tool_activity:
-                        continue
+    await _run_graph_job(job_id, session_id, initial_state, kind="init")
 
-                    msg = _extract_message_from_update(
-                        update, node=node, tool_meta=tool_meta
-                    )
-                    default_msg = DEFAULT_NODE_MESSAGES.get(node)
-                    if not msg:
-                        msg = default_msg or ""
-                    elif len(msg) > 240:
-                        msg = msg[:240] + "…"
-                        if default_msg:
-                            msg = default_msg
-                    elif default_msg and msg.strip().startswith("Thanks"):
-                        msg = default_msg
 
-                if not msg:
-                    msg = DEFAULT_NODE_MESSAGES.get(node, "Node activity recorded")
+async def resume_job(job_id: str, session_id: str, kind: str) -> bool:
+    """
+    Continue an interrupted job from the session's latest checkpoint.
 
-                default_msg = DEFAULT_NODE_MESSAGES.get(node)
-                should_skip_default = (
-                    default_msg
-                    and msg == default_msg
-                    and node in SUPPRESS_DEFAULT_NODE_LOGS
-                    and not tool_meta
-                )
-                if should_skip_default:
-                    continue
+    Nodes that already completed (their writes are in the checkpoint) are not
+    re-run; the graph picks up at the pending superstep.
 
-                # Track last message from implementation/error-fix nodes for final event
-                if node in ("codegen", "deployment_fixer", "fix_errors"):
-                    last_meaningful_message = msg
+    Returns:
+        False when the checkpoint does not belong to this job (the run never
+        reached its first checkpoint), so the caller must start it afresh.
+    """
+    snapshot = await agent.aget_state(_graph_config(session_id))
+    values = getattr(snapshot, "values", None) or {}
+    if values.get("job_id") != job_id:
+        return False
 
-                log_job_event(
-                    job_id,
-                    node=node,
-                    message=msg,
-                    event_type="node",
-                    data=tool_meta,
-                )
-        if not saw_graph_end:
-            final_msg = _final_message(
-                job_id,
-                last_meaningful_message,
-                "Landing page creation completed",
-            )
-            log_job_event(
-                job_id,
-                node="__end__",
-                message=final_msg,
-                event_type="job_completed",
-                data={"session_id": session_id},
-            )
-            update_job_status(job_id, status=JobStatus.COMPLETED)
-    except Exception as e:
-        if _is_graph_end_exception(e):
-            final_msg = _final_message(
-                job_id,
-                last_meaningful_message,
-                "Landing page creation completed",
-            )
-            log_job_event(
-                job_id,
-                node="__end__",
-                message=final_msg,
-                event_type="job_completed",
-                data={"session_id": session_id},
-            )
-            update_job_status(job_id, status=JobStatus.COMPLETED)
-        else:
-            print(f"[JOB_RUNNER] Init job failed: {e}")
-            log_job_event(
-                job_id,
-                node="init_job_runner",
-                message="Init job crashed before completion.",
-                event_type="error",
-                data={"error": str(e)},
-            )
-            update_job_status(job_id, status=JobStatus.FAILED, error_message=str(e))
+    if not snapshot.next:
+        # The graph finished but the worker died before recording it.
+        _record_job_completed(
+            job_id,
+            session_id,
+            _final_message(job_id, "", _JOB_KINDS[kind]["end_message"]),
+        )
+        return True
+
+    log_job_event(
+        job_id,
+        node="job_recovery",
+        message="Resuming from the last checkpoint.",
+        event_type="job_resumed",
+        data={"next_nodes": list(snapshot.next)},
+    )
+    await _run_graph_job(job_id, session_id, None, kind=kind)
+    return True
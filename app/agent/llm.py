@@ -0,0 +1,517 @@
+"""Process-wide registry of LLM clients used by the graph nodes.
+
+Chat models, tool-bound models and structured-output runnables are built once
+per (provider, model, options) and reused, so nodes keep their HTTP
+connection pools warm instead of paying a TLS handshake and a schema build on
+every invocation. Request timeouts and SDK retries come from Config.
+
+With LLM_PROVIDER_MODE=record/replay, provider calls are recorded to or
+replayed from fixture files (app/agent/llm_fixtures.py).
+
+Every runnable handed out, and generate_gemini_structured, goes through the
+provider/model rate limiter (app/agent/rate_limits.py). Structured calls are
+looked up in the response cache first (app/agent/llm_cache.py).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Literal, Optional, Sequence, Type, TypeVar
+
+from google import genai
+from google.genai import errors as genai_errors
+from langchain_core.messages import SystemMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+from app.agent import context_cache, llm_cache, llm_fixtures
+from app.agent.rate_limits import RateLimiter, estimate_tokens, get_rate_limiter
+from app.agent.retry import LLM_LATENCY
+from app.config import Config
+from app.utils.llm_usage import current_run_context, record_llm_usage
+from app.utils.metrics import LLM_SECONDS, timed
+
+Provider = Literal["openai", "google"]
+SchemaT = TypeVar("SchemaT", bound=BaseModel)
+
+DEFAULT_GEMINI_MODEL = "gemini-3-pro-preview"
+
+_LOCK = threading.RLock()  # builders nest (tool/structured -> chat)
+_CACHE: dict[tuple, Any] = {}
+
+
+def _freeze(options: dict[str, Any]) -> tuple:
+    return tuple(sorted(options.items()))
+
+
+def _cached(key: tuple, build: Callable[[], Any]) -> Any:
+    client = _CACHE.get(key)
+    if client is not None:
+        return client
+    with _LOCK:
+        client = _CACHE.get(key)
+        if client is None:
+            client = build()
+            _CACHE[key] = client
+    return client
+
+
+def _client_defaults() -> dict[str, Any]:
+    defaults: dict[str, Any] = {}
+    if Config.LLM_REQUEST_TIMEOUT_SECONDS > 0:
+        defaults["timeout"] = Config.LLM_REQUEST_TIMEOUT_SECONDS
+    if Config.LLM_MAX_RETRIES is not None:
+        defaults["max_retries"] = Config.LLM_MAX_RETRIES
+    return defaults
+
+
+def _build_chat_model(provider: Provider, model: str, options: dict[str, Any]):
+    kwargs = {**_client_defaults(), **options}
+    if provider == "openai":
+        return ChatOpenAI(model=model, **kwargs)
+    if provider == "google":
+        return ChatGoogleGenerativeAI(model=model, **kwargs)
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    """Total tokens reported for a model response, if any."""
+    if isinstance(result, dict) and "raw" in result:
+        result = result["raw"]
+    usage = getattr(result, "usage_metadata", None) or {}
+    total = usage.get("total_tokens") if isinstance(usage, dict) else None
+    return int(total) if total else None
+
+
+class RateLimitedRunnable(Runnable):
+    """Runs `bound` once the provider/model rate limiter has capacity."""
+
+    def __init__(self, bound: Runnable, limiter: RateLimiter) -> None:
+        self.bound = bound
+        self.limiter = limiter
+
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        with self.limiter.limit_sync(estimate_tokens(input)) as reservation:
+            result = self.bound.invoke(input, config, **kwargs)
+            reservation.tokens_used = _usage_tokens(result)
+        return result
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        async with self.limiter.limit(estimate_tokens(input)) as reservation:
+            result = await self.bound.ainvoke(input, config, **kwargs)
+            reservation.tokens_used = _usage_tokens(result)
+        return result
+
+
+class CachedStructuredRunnable(Runnable):
+    """Serves structured responses from the LLM response cache when possible."""
+
+    def __init__(
+        self,
+        bound: Runnable,
+        provider: Provider,
+        model: str,
+        schema: Type[BaseModel],
+        options: dict[str, Any],
+    ) -> None:
+        self.bound = bound
+        self.provider = provider
+        self.model = model
+        self.schema = schema
+        self.options = options
+
+    def _lookup(self, input: Any, config: Optional[RunnableConfig]):
+        return llm_cache.lookup(
+            self.provider, self.model, self.schema, input, self.options, config
+        )
+
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        cached = self._lookup(input, config)
+        if cached.hit is not None:
+            return cached.hit
+        result = self.bound.invoke(input, config, **kwargs)
+        cached.store(result)
+        return result
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        cached = await llm_cache.alookup(
+            self.provider, self.model, self.schema, input, self.options, config
+        )
+        if cached.hit is not None:
+            return cached.hit
+        result = await self.bound.ainvoke(input, config, **kwargs)
+        await cached.astore(result)
+        return result
+
+
+def _raw_chat_model(provider: Provider, model: str, options: dict[str, Any]):
+    key = ("raw", provider, model, _freeze(options))
+    return _cached(key, lambda: _build_chat_model(provider, model, options))
+
+
+def _limited(provider: Provider, model: str, bound: Runnable) -> Runnable:
+    return RateLimitedRunnable(bound, get_rate_limiter(provider, model))
+
+
+def _provider_runnable(
+    provider: Provider,
+    model: str,
+    signature: dict[str, Any],
+    build: Callable[[], Runnable],
+    schema: Optional[Type[BaseModel]] = None,
+) -> Runnable:
+    """`build()`, or its record/replay stand-in (see app/agent/llm_fixtures.py)."""
+    if llm_fixtures.provider_mode() == "live":
+        return build()
+    return llm_fixtures.RecordReplayRunnable(build, provider, model, signature, schema)
+
+
+def get_chat_model(provider: Provider, model: str, **options: Any) -> Runnable:
+    """Shared chat model for `model`; `options` are constructor kwargs."""
+    key = ("chat", provider, model, _freeze(options))
+    return _cached(
+        key,
+        lambda: _limited(
+            provider,
+            model,
+            _provider_runnable(
+                provider,
+                model,
+                {"kind": "chat", "options": options},
+                lambda: _raw_chat_model(provider, model, options),
+            ),
+        ),
+    )
+
+
+def get_tool_model(
+    provider: Provider,
+    model: str,
+    tools: Sequence[Any],
+    *,
+    bind: dict[str, Any] | None = None,
+    **options: Any,
+) -> Runnable:
+    """
+    Shared chat model with `tools` bound.
+
+    `bind` holds bind_tools kwargs (tool_choice, parallel_tool_calls, ...).
+    Tools are keyed by name, so each distinct tool set gets one runnable.
+    """
+    bind = bind or {}
+    tool_names = tuple(getattr(tool, "name", repr(tool)) for tool in tools)
+    key = ("tools", provider, model, _freeze(options), tool_names, _freeze(bind))
+    return _cached(
+        key,
+        lambda: _limited(
+            provider,
+            model,
+            _provider_runnable(
+                provider,
+                model,
+                {
+                    "kind": "tools",
+                    "options": options,
+                    "tools": tool_names,
+                    "bind": bind,
+                },
+                lambda: _raw_chat_model(provider, model, options).bind_tools(
+                    list(tools), **bind
+                ),
+            ),
+        ),
+    )
+
+
+def get_structured_model(
+    provider: Provider, model: str, schema: Type[BaseModel], **options: Any
+) -> Runnable:
+    """Shared `with_structured_output(schema)` runnable, backed by the cache."""
+    key = ("structured", provider, model, _freeze(options), schema)
+    return _cached(
+        key,
+        lambda: CachedStructuredRunnable(
+            _limited(
+                provider,
+                model,
+                _provider_runnable(
+                    provider,
+                    model,
+                    {
+                        "kind": "structured",
+                        "options": options,
+                        "schema": json_schema_for(schema),
+                    },
+                    lambda: _raw_chat_model(
+                        provider, model, options
+                    ).with_structured_output(schema),
+                    schema,
+                ),
+            ),
+            provider,
+            model,
+            schema,
+            options,
+        ),
+    )
+
+
+def get_genai_client() -> genai.Client:
+    """Shared google-genai SDK client (for calls made outside LangChain)."""
+
+    def _build() -> genai.Client:
+        if Config.LLM_REQUEST_TIMEOUT_SECONDS <= 0:
+            return genai.Client()
+        timeout_ms = int(Config.LLM_REQUEST_TIMEOUT_SECONDS * 1000)
+        return genai.Client(http_options={"timeout": timeout_ms})
+
+    return _cached(("genai",), _build)
+
+
+@lru_cache(maxsize=None)
+def json_schema_for(schema: Type[BaseModel]) -> dict[str, Any]:
+    """`schema.model_json_schema()`, computed once per model class."""
+    return schema.model_json_schema()
+
+
+def messages_to_prompt(messages: Sequence[Any]) -> str:
+    """Flatten LangChain messages into a single prompt string."""
+    parts: list[str] = []
+    for message in messages:
+        content = getattr(message, "content", "")
+        if isinstance(content, str):
+            parts.append(content.strip())
+        elif isinstance(content, list):
+            parts.append("\n".join(str(item) for item in content))
+        else:
+            parts.append(str(content))
+    return "\n\n".join(part for part in parts if part).strip()
+
+
+def is_cached_content_conflict(error: BaseException) -> bool:
+    """
+    True for Gemini's refusal to combine cached content with request-level
+    system_instruction, tools or tool_config.
+    """
+    return (
+        isinstance(error, genai_errors.ClientError)
+        and error.code == 400
+        and "cachedcontent" in str(error).lower().replace(" ", "")
+    )
+
+
+def _genai_contents(
+    messages: Sequence[Any], *, system_as_user: bool = False
+) -> tuple[str, list[dict[str, Any]]]:
+    """
+    (system instruction, role-tagged contents) of LangChain messages for the
+    google-genai SDK. Tool calls and results become text, as no tools are
+    declared on these requests. With `system_as_user`, system messages stay in
+    place as user turns (requests served from cached content can't carry a
+    system instruction of their own).
+    """
+    system_parts: list[str] = []
+    contents: list[dict[str, Any]] = []
+    for message in messages:
+        text = messages_to_prompt([message])
+        kind = getattr(message, "type", None)
+        if kind == "system" and not system_as_user:
+            if text:
+                system_parts.append(text)
+            continue
+        if kind == "ai":
+            role = "model"
+            calls = getattr(message, "tool_calls", None) or []
+            text = "\n".join(
+                [text]
+                + [f"[Called {call.get('name')} with {call.get('args')}]" for call in calls]
+            ).strip()
+        elif kind == "tool":
+            role = "user"
+            text = f"[Result of {getattr(message, 'name', None) or 'tool'}]\n{text}"
+        else:
+            role = "user"
+        if text:
+            contents.append({"role": role, "parts": [{"text": text}]})
+    return "\n\n".join(system_parts), contents
+
+
+async def _gemini_request(
+    model: str,
+    contents: Any,
+    request_config: dict[str, Any],
+    on_text: Optional[Callable[[str], None]],
+) -> tuple[str, Any]:
+    """(response text, usage metadata); streams when `on_text` is given."""
+    models = get_genai_client().aio.models
+    if on_text is None:
+        response = await models.generate_content(
+            model=model, contents=contents, config=request_config
+        )
+        return getattr(response, "text", "") or "", response.usage_metadata
+    text = ""
+    usage = None
+    stream = await models.generate_content_stream(
+        model=model, contents=contents, config=request_config
+    )
+    async for chunk in stream:
+        # Usage arrives with the final chunks; keep the latest
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        if chunk.text:
+            text += chunk.text
+            on_text(text)
+    return text, usage
+
+
+async def generate_gemini_structured(
+    messages: Sequence[Any],
+    schema: Type[SchemaT],
+    label: str = "request",
+    *,
+    model: str = DEFAULT_GEMINI_MODEL,
+    cache_prefix: bool = False,
+    on_text: Optional[Callable[[str], None]] = None,
+) -> SchemaT:
+    """
+    Ask Gemini for JSON matching `schema` via the SDK's native async client.
+
+    Waiting on the response holds no executor thread, so fan-out width is
+    bounded only by the caller's own concurrency limits. System messages are
+    sent as the system instruction and the rest as role-tagged contents. With
+    `cache_prefix`,
+    a leading SystemMessage is served from Gemini context caching (see
+    app/agent/context_cache.py) and only the remaining messages are sent.
+    With `on_text`, the response is streamed and `on_text` is called with the
+    raw JSON text received so far after every chunk.
+
+    Raises:
+        ValueError: if the prompt or the response text is empty.
+        LLMCacheMiss: in cache replay mode when the call was never recorded.
+        LLMFixtureMissing: in provider replay mode without a recorded fixture.
+    """
+    prompt = messages_to_prompt(messages)
+    if not prompt:
+        raise ValueError(f"Gemini prompt for {label} was empty.")
+    cached = await llm_cache.alookup("google", model, schema, prompt)
+    if cached.hit is not None:
+        return cached.hit
+
+    fixture_key = None
+    if llm_fixtures.provider_mode() != "live":
+        fixture_key = llm_fixtures.fixture_key(
+            "google", model, {"kind": "genai", "schema": json_schema_for(schema)}, prompt
+        )
+    started = time.perf_counter()
+    if fixture_key and llm_fixtures.provider_mode() == "replay":
+        replayed = await llm_fixtures.replay_genai(fixture_key, label, on_text)
+        raw_text, usage_counts = replayed["text"], replayed["usage"]
+    else:
+        raw_text, usage_counts = await _generate_gemini_live(
+            messages, prompt, schema, model, cache_prefix, on_text
+        )
+        if fixture_key:
+            llm_fixtures.save_fixture(
+                fixture_key,
+                {
+                    "provider": "google",
+                    "model": model,
+                    "latency_seconds": time.perf_counter() - started,
+                    "recorded_at": time.time(),
+                    "result": {"text": raw_text, "usage": usage_counts},
+                },
+            )
+    job_id, node = current_run_context()
+    record_llm_usage(
+        job_id=job_id,
+        node=node,
+        model=model,
+        seconds=time.perf_counter() - started,
+        **usage_counts,
+    )
+    if not raw_text.strip():
+        raise ValueError(f"Gemini returned empty response text for {label}.")
+    result = schema.model_validate_json(raw_text)
+    await cached.astore(result)
+    return result
+
+
+async def _generate_gemini_live(
+    messages: Sequence[Any],
+    prompt: str,
+    schema: Type[BaseModel],
+    model: str,
+    cache_prefix: bool,
+    on_text: Optional[Callable[[str], None]],
+) -> tuple[str, dict[str, int]]:
+    """(response text, token counts) of one rate-limited Gemini SDK call."""
+    inline_config: dict[str, Any] = {
+        "response_mime_type": "application/json",
+        "response_json_schema": json_schema_for(schema),
+    }
+    system_instruction, inline_contents = _genai_contents(messages)
+    if not inline_contents:
+        # Nothing but system text: send it as the user turn
+        system_instruction, inline_contents = "", prompt
+    if system_instruction:
+        inline_config["system_instruction"] = system_instruction
+
+    # Served from cached content: the leading system message lives in the
+    # cache and the rest goes as contents
+    request_config, contents, sent_text = inline_config, inline_contents, prompt
+    prefix = ""
+    if cache_prefix and messages and isinstance(messages[0], SystemMessage):
+        prefix = messages_to_prompt(messages[:1])
+        cached_content = await context_cache.get_cached_content(model, prefix)
+        _, cached_contents = _genai_contents(messages[1:], system_as_user=True)
+        if cached_content and cached_contents:
+            request_config = {
+                key: value
+                for key, value in inline_config.items()
+                if key != "system_instruction"
+            }
+            request_config["cached_content"] = cached_content
+            contents = cached_contents
+            sent_text = messages_to_prompt(messages[1:])
+
+    limiter = get_rate_limiter("google", model)
+    async with limiter.limit(estimate_tokens(sent_text)) as reservation:
+        with timed(LLM_SECONDS, model=model):
+            started = time.perf_counter()
+            try:
+                raw_text, usage = await _gemini_request(
+                    model, contents, request_config, on_text
+                )
+            except genai_errors.ClientError as e:
+                if "cached_content" not in request_config or e.code not in (
+                    403,
+                    404,
+                ):
+                    raise
+                # The cached content expired or was deleted early: send inline
+                context_cache.invalidate(model, prefix)
+                started = time.perf_counter()
+                raw_text, usage = await _gemini_request(
+                    model, inline_contents, inline_config, on_text
+                )
+            # Provider time only (no limiter queueing or cache work): the
+            # section hedge threshold is a quantile of these samples
+            LLM_LATENCY.record(model, time.perf_counter() - started)
+        reservation.tokens_used = getattr(usage, "total_token_count", None)
+    return raw_text, {
+        "input_tokens": getattr(usage, "prompt_token_count", None) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", None) or 0,
+        "total_tokens": getattr(usage, "total_token_count", None) or 0,
+        "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+    }
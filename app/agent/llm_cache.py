@@ -0,0 +1,315 @@
+"""Content-addressed cache of structured LLM responses.
+
+Structured calls (get_structured_model runnables and
+generate_gemini_structured) are keyed by a SHA-256 of provider, model,
+client options, output schema and the normalized prompt messages, so a rerun
+with the same inputs (QA replays of one init payload, reruns of a session)
+gets the stored response back instead of calling the model again.
+
+Configured through Config:
+- LLM_CACHE_MODE: "off", "on" (read and write) or "replay" (read only; a
+  miss raises LLMCacheMiss, for reproducible benchmarks).
+- LLM_CACHE_BACKEND: "memory" (per-process LRU), "disk" (JSON files under
+  LLM_CACHE_DIR) or "mongo" (shared collection with a TTL index).
+- LLM_CACHE_NODES: graph nodes whose calls are cached ("*" = all).
+- LLM_CACHE_TTL_SECONDS: age after which an entry is ignored (0 = never).
+
+Async callers use alookup / CacheLookup.astore, which run the disk and mongo
+backends in a worker thread so a section fan-out never blocks the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Optional, Sequence, Type
+
+from pydantic import BaseModel
+
+from app.config import Config
+from app.db import get_llm_cache_collection
+from app.utils.metrics import counter
+from app.utils.ttl_cache import TTLCache
+
+try:
+    from langchain_core.runnables.config import ensure_config  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    ensure_config = None  # type: ignore
+
+LLM_CACHE_REQUESTS = counter(
+    "agent_llm_cache_requests_total",
+    "Structured LLM calls looked up in the response cache.",
+    ("node", "result"),
+)
+
+
+class LLMCacheMiss(RuntimeError):
+    """Raised in replay mode when a call has no recorded response."""
+
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        return content.strip()
+    if isinstance(content, list):
+        return [_normalize_content(item) for item in content]
+    return content
+
+
+def normalize_message(message: Any) -> dict[str, Any]:
+    """Role, content and tool calls of a message, with incidental whitespace removed."""
+    if isinstance(message, str):
+        return {"type": "human", "content": message.strip()}
+    normalized = {
+        "type": getattr(message, "type", type(message).__name__),
+        "content": _normalize_content(getattr(message, "content", message)),
+    }
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        normalized["tool_calls"] = [
+            {"name": call.get("name"), "args": call.get("args")} for call in tool_calls
+        ]
+    tool_call_id = getattr(message, "tool_call_id", None)
+    if tool_call_id:
+        normalized["tool_call_id"] = tool_call_id
+    return normalized
+
+
+def normalize_messages(messages: Any) -> list[dict[str, Any]]:
+    if isinstance(messages, (str, BaseModel)) or not isinstance(messages, Sequence):
+        messages = [messages]
+    return [normalize_message(message) for message in messages]
+
+
+def cache_key(
+    provider: str,
+    model: str,
+    schema: Type[BaseModel],
+    messages: Any,
+    options: Optional[dict[str, Any]] = None,
+) -> str:
+    """SHA-256 of everything that determines a structured response."""
+    from app.agent.llm import json_schema_for
+
+    payload = {
+        "provider": provider,
+        "model": model.removeprefix("models/"),
+        "options": options or {},
+        "schema": json_schema_for(schema),
+        "messages": normalize_messages(messages),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    blocking = False
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self._items: TTLCache[str, dict] = TTLCache(
+            max_entries=max_entries, ttl_seconds=ttl_seconds
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._items.get(key)
+
+    def set(self, key: str, value: dict) -> None:
+        self._items.set(key, value)
+
+
+class DiskCacheBackend:
+    """One JSON file per entry, sharded by the first two hex digits."""
+
+    blocking = True
+
+    def __init__(self, directory: str, ttl_seconds: float) -> None:
+        self.directory = Path(directory)
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if self.ttl_seconds > 0 and time.time() - entry["stored_at"] > self.ttl_seconds:
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value: dict) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"stored_at": time.time(), "value": value}), encoding="utf-8"
+        )
+        os.replace(tmp_path, path)
+
+
+class MongoCacheBackend:
+    """Entries shared by every worker; expired ones are removed by a TTL index."""
+
+    blocking = True
+
+    def __init__(self, collection, ttl_seconds: float) -> None:
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[dict]:
+        doc = self.collection.find_one({"_id": key}, {"value": 1, "expires_at": 1})
+        if doc is None:
+            return None
+        # The TTL monitor runs about once a minute; don't serve stale entries
+        expires_at = doc.get("expires_at")
+        if expires_at is not None and expires_at <= datetime.utcnow():
+            return None
+        return doc.get("value")
+
+    def set(self, key: str, value: dict) -> None:
+        now = datetime.utcnow()
+        fields: dict[str, Any] = {"value": value, "created_at": now}
+        if self.ttl_seconds > 0:
+            fields["expires_at"] = now + timedelta(seconds=self.ttl_seconds)
+        self.collection.update_one({"_id": key}, {"$set": fields}, upsert=True)
+
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def get_cache_backend():
+    """Configured backend, or None when the cache is off or unavailable."""
+    global _BACKEND
+    if Config.LLM_CACHE_MODE not in {"on", "replay"}:
+        return None
+    if _BACKEND is not None:
+        return _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            backend_name = Config.LLM_CACHE_BACKEND
+            ttl = Config.LLM_CACHE_TTL_SECONDS
+            if backend_name == "disk":
+                _BACKEND = DiskCacheBackend(Config.LLM_CACHE_DIR, ttl)
+            elif backend_name == "mongo":
+                collection = get_llm_cache_collection()
+                if collection is None:
+                    print("[LLM_CACHE] MongoDB unavailable; using the memory backend")
+                    _BACKEND = MemoryCacheBackend(Config.LLM_CACHE_MAX_ENTRIES, ttl)
+                else:
+                    _BACKEND = MongoCacheBackend(collection, ttl)
+            else:
+                _BACKEND = MemoryCacheBackend(Config.LLM_CACHE_MAX_ENTRIES, ttl)
+    return _BACKEND
+
+
+def current_node(config: Optional[dict] = None) -> Optional[str]:
+    """Graph node the current call runs in (from LangGraph's run metadata)."""
+    if ensure_config is None:
+        return None
+    metadata = ensure_config(config).get("metadata") or {}
+    return metadata.get("langgraph_node")
+
+
+def _node_enabled(node: Optional[str]) -> bool:
+    nodes = {name.strip() for name in Config.LLM_CACHE_NODES.split(",") if name.strip()}
+    return "*" in nodes or (node is not None and node in nodes)
+
+
+class CacheLookup:
+    """Result of looking up one call: `hit` holds the cached response."""
+
+    def __init__(self, key: Optional[str], node: Optional[str], hit=None) -> None:
+        self.key = key
+        self.node = node
+        self.hit = hit
+
+    def store(self, result: Any) -> None:
+        if self.key is None or Config.LLM_CACHE_MODE != "on":
+            return
+        if not isinstance(result, BaseModel):
+            return
+        backend = get_cache_backend()
+        if backend is None:
+            return
+        try:
+            backend.set(self.key, result.model_dump(mode="json"))
+        except Exception as e:
+            print(f"[LLM_CACHE] Warning: failed to store response: {e}")
+
+    async def astore(self, result: Any) -> None:
+        if _blocking_backend():
+            await asyncio.to_thread(self.store, result)
+        else:
+            self.store(result)
+
+
+def _blocking_backend() -> bool:
+    backend = get_cache_backend()
+    return backend is not None and backend.blocking
+
+
+def lookup(
+    provider: str,
+    model: str,
+    schema: Type[BaseModel],
+    messages: Any,
+    options: Optional[dict[str, Any]] = None,
+    config: Optional[dict] = None,
+) -> CacheLookup:
+    """
+    Look up a structured call in the cache.
+
+    Raises:
+        LLMCacheMiss: in replay mode when the call was never recorded.
+    """
+    node = current_node(config)
+    backend = get_cache_backend()
+    if backend is None or not _node_enabled(node):
+        return CacheLookup(None, node)
+    key = cache_key(provider, model, schema, messages, options)
+    try:
+        value = backend.get(key)
+    except Exception as e:
+        print(f"[LLM_CACHE] Warning: cache lookup failed: {e}")
+        value = None
+    if value is not None:
+        try:
+            hit = schema.model_validate(value)
+        except Exception as e:
+            # Schema changed since the entry was written; treat as a miss
+            print(f"[LLM_CACHE] Discarding entry {key[:12]} for {node}: {e}")
+        else:
+            LLM_CACHE_REQUESTS.inc(node=node or "", result="hit")
+            return CacheLookup(key, node, hit)
+    LLM_CACHE_REQUESTS.inc(node=node or "", result="miss")
+    if Config.LLM_CACHE_MODE == "replay":
+        raise LLMCacheMiss(
+            f"No recorded {provider}/{model} response for node {node} (key {key[:12]})"
+        )
+    return CacheLookup(key, node)
+
+
+async def alookup(
+    provider: str,
+    model: str,
+    schema: Type[BaseModel],
+    messages: Any,
+    options: Optional[dict[str, Any]] = None,
+    config: Optional[dict] = None,
+) -> CacheLookup:
+    """lookup for async callers (see the module docstring)."""
+    if _blocking_backend():
+        # to_thread copies the context, so the run's node is still visible
+        return await asyncio.to_thread(
+            lookup, provider, model, schema, messages, options, config
+        )
+    return lookup(provider, model, schema, messages, options, config)
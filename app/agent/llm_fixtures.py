@@ -0,0 +1,239 @@
+"""Offline record/replay of LLM responses for deterministic benchmarks.
+
+With Config.LLM_PROVIDER_MODE:
+- "live"   - calls go to the providers (default);
+- "record" - calls go to the providers and every response is also written
+             to a fixture file under LLM_FIXTURES_DIR;
+- "replay" - no provider is contacted (no API keys needed); responses are
+             read from the fixtures after a synthetic delay, and a call with
+             no fixture raises LLMFixtureMissing.
+
+Covers every runnable handed out by app/agent/llm.py (chat, tool-bound and
+structured models for OpenAI and Gemini) and generate_gemini_structured.
+Fixtures are keyed by provider, model, call signature (options, tools,
+schema) and the normalized messages, so one recording replays a whole
+init/chat run.
+
+Synthetic latency (LLM_REPLAY_LATENCY):
+- "recorded"          - the latency measured while recording (default);
+- "none"              - no delay;
+- "fixed:S"           - S seconds;
+- "uniform:A,B"       - uniform between A and B seconds;
+- "lognormal:M,SIGMA" - log-normal with median M seconds.
+Delays are multiplied by LLM_REPLAY_LATENCY_SCALE and drawn from an RNG
+seeded with LLM_REPLAY_SEED.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional, Type
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel
+
+from app.agent.llm_cache import normalize_messages
+from app.config import Config
+from app.utils.llm_usage import current_run_context, record_llm_usage
+
+
+class LLMFixtureMissing(RuntimeError):
+    """Raised in replay mode when a call was never recorded."""
+
+
+def provider_mode() -> str:
+    return Config.LLM_PROVIDER_MODE
+
+
+def fixture_key(
+    provider: str, model: str, signature: dict[str, Any], input: Any
+) -> str:
+    payload = {
+        "provider": provider,
+        "model": model.removeprefix("models/"),
+        "signature": signature,
+        "messages": normalize_messages(input),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _fixture_path(key: str) -> Path:
+    return Path(Config.LLM_FIXTURES_DIR) / key[:2] / f"{key}.json"
+
+
+def load_fixture(key: str, description: str) -> dict[str, Any]:
+    """
+    Raises:
+        LLMFixtureMissing: if `key` was never recorded.
+    """
+    try:
+        return json.loads(_fixture_path(key).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise LLMFixtureMissing(
+            f"No recorded response for {description} (fixture {key[:12]}); "
+            "run once with LLM_PROVIDER_MODE=record"
+        ) from None
+
+
+def save_fixture(key: str, fixture: dict[str, Any]) -> None:
+    path = _fixture_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(json.dumps(fixture, indent=1), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+_RNG = random.Random(Config.LLM_REPLAY_SEED)
+_RNG_LOCK = threading.Lock()
+
+
+def replay_delay(recorded_seconds: float) -> float:
+    """Synthetic latency of one replayed call, per LLM_REPLAY_LATENCY."""
+    kind, _, args = Config.LLM_REPLAY_LATENCY.partition(":")
+    values = [float(value) for value in args.split(",") if value.strip()]
+    with _RNG_LOCK:
+        if kind == "none":
+            delay = 0.0
+        elif kind == "fixed" and values:
+            delay = values[0]
+        elif kind == "uniform" and len(values) >= 2:
+            delay = _RNG.uniform(values[0], values[1])
+        elif kind == "lognormal" and len(values) >= 2:
+            delay = _RNG.lognormvariate(math.log(max(values[0], 1e-6)), values[1])
+        else:
+            delay = recorded_seconds
+    return max(delay, 0.0) * Config.LLM_REPLAY_LATENCY_SCALE
+
+
+def _encode_result(result: Any) -> dict[str, Any]:
+    if isinstance(result, BaseMessage):
+        return {"type": "message", "value": message_to_dict(result)}
+    if isinstance(result, BaseModel):
+        return {"type": "structured", "value": result.model_dump(mode="json")}
+    return {"type": "json", "value": result}
+
+
+def _decode_result(encoded: dict[str, Any], schema: Optional[Type[BaseModel]]) -> Any:
+    if encoded["type"] == "message":
+        return messages_from_dict([encoded["value"]])[0]
+    if encoded["type"] == "structured" and schema is not None:
+        return schema.model_validate(encoded["value"])
+    return encoded["value"]
+
+
+class RecordReplayRunnable(Runnable):
+    """
+    Records the responses of the provider runnable built by `build`, or
+    replays them without building it.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[], Runnable],
+        provider: str,
+        model: str,
+        signature: dict[str, Any],
+        schema: Optional[Type[BaseModel]] = None,
+    ) -> None:
+        self.build = build
+        self.provider = provider
+        self.model = model
+        self.signature = signature
+        self.schema = schema
+        self._bound: Optional[Runnable] = None
+
+    @property
+    def bound(self) -> Runnable:
+        if self._bound is None:
+            self._bound = self.build()
+        return self._bound
+
+    def _key(self, input: Any) -> str:
+        return fixture_key(self.provider, self.model, self.signature, input)
+
+    def _replay(self, input: Any, config: Optional[RunnableConfig]):
+        description = f"{self.provider}/{self.model} {self.signature.get('kind')}"
+        fixture = load_fixture(self._key(input), description)
+        result = _decode_result(fixture["result"], self.schema)
+        usage = getattr(result, "usage_metadata", None) or {}
+        job_id, node = current_run_context(config)
+        record_llm_usage(
+            job_id=job_id,
+            node=node,
+            model=self.model,
+            input_tokens=usage.get("input_tokens") or 0,
+            output_tokens=usage.get("output_tokens") or 0,
+            total_tokens=usage.get("total_tokens") or 0,
+            seconds=fixture.get("latency_seconds", 0.0),
+        )
+        return result, replay_delay(fixture.get("latency_seconds", 0.0))
+
+    def _record(self, input: Any, result: Any, seconds: float) -> None:
+        try:
+            save_fixture(
+                self._key(input),
+                {
+                    "provider": self.provider,
+                    "model": self.model,
+                    "signature": self.signature,
+                    "latency_seconds": seconds,
+                    "recorded_at": time.time(),
+                    "result": _encode_result(result),
+                },
+            )
+        except Exception as e:
+            print(f"[LLM_FIXTURES] Warning: failed to record response: {e}")
+
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        if provider_mode() == "replay":
+            result, delay = self._replay(input, config)
+            time.sleep(delay)
+            return result
+        started = time.perf_counter()
+        result = self.bound.invoke(input, config, **kwargs)
+        self._record(input, result, time.perf_counter() - started)
+        return result
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        if provider_mode() == "replay":
+            result, delay = self._replay(input, config)
+            await asyncio.sleep(delay)
+            return result
+        started = time.perf_counter()
+        result = await self.bound.ainvoke(input, config, **kwargs)
+        self._record(input, result, time.perf_counter() - started)
+        return result
+
+
+async def replay_genai(
+    key: str, label: str, on_text: Optional[Callable[[str], None]] = None
+) -> dict[str, Any]:
+    """
+    Replay a recorded google-genai response ({"text", "usage", ...}),
+    streaming it to `on_text` in pieces over the synthetic delay.
+    """
+    fixture = load_fixture(key, f"Gemini {label}")
+    delay = replay_delay(fixture.get("latency_seconds", 0.0))
+    text = fixture["result"]["text"]
+    if on_text is None:
+        await asyncio.sleep(delay)
+        return fixture["result"]
+    pieces = 10
+    for index in range(1, pieces + 1):
+        await asyncio.sleep(delay / pieces)
+        on_text(text[: len(text) * index // pieces])
+    return fixture["result"]
@@ -2,9 +2,8 @@ from __future__ import annotations
 
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 
+from app.agent.llm import get_tool_model
 from app.agent.prompts_new import ARCHITECT_SYSTEM_PROMPT
 from app.agent.state import BuilderState
 from app.agent.tools.files import list_files, read_file, read_lines
@@ -13,7 +12,7 @@ load_dotenv()
 
 tools = [list_files, read_file, read_lines]
 
-_architect_llm_ = ChatOpenAI(model="gpt-5").bind_tools(tools)
+_architect_llm_ = get_tool_model("openai", "gpt-5", tools)
 
 
 def architect(state: BuilderState) -> BuilderState:
@@ -1,9 +1,9 @@
 from __future__ import annotations
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
 
+from app.agent.history import compact_history
+from app.agent.llm import get_chat_model
 from app.agent.prompts_new import CLARIFY_SYSTEM_PROMPT
 from app.agent.state import BuilderState
 from app.agent.tools.files import list_files, read_file, read_lines
@@ -12,15 +12,15 @@ load_dotenv()
 
 tools = [list_files, read_file, read_lines]
 
-_clarify_llm_ = ChatGoogleGenerativeAI(
-    model="models/gemini-3-pro-preview", thinking_budget=64
+_clarify_llm_ = get_chat_model(
+    "google", "models/gemini-3-pro-preview", thinking_budget=64
 )
 
 
-def clarify(state: BuilderState) -> BuilderState:
+async def clarify(state: BuilderState) -> BuilderState:
     SYS = SystemMessage(content=CLARIFY_SYSTEM_PROMPT)
-    messages = [SYS, *state.messages]
-    clarify_response = _clarify_llm_.invoke(messages)
+    messages = [SYS, *compact_history(state.messages, node="clarify")]
+    clarify_response = await _clarify_llm_.ainvoke(messages)
     print(f"Clarify response: {clarify_response}")
 
     # Check for malformed function call
@@ -36,7 +36,7 @@ def clarify(state: BuilderState) -> BuilderState:
         )
         messages.append(clarify_response)
         messages.append(recovery_msg)
-        clarify_response = _clarify_llm_.invoke(messages)
+        clarify_response = await _clarify_llm_.ainvoke(messages)
         print(f"[CLARIFY] Retry response: {clarify_response}")
 
     # Handle both string and list content types
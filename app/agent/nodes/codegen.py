@@ -2,19 +2,19 @@ from __future__ import annotations
 
 import asyncio
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Type
+from typing import Any, Dict, List, Tuple
 import re
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from app.agent.llm import generate_gemini_structured, get_structured_model
 from app.agent.prompts.codegen import PAGE_CODEGEN_PROMPT, LAYOUT_CODEGEN_PROMPT
 from app.agent.state import BuilderState
 from app.agent.tools.files import get_session_dir
+from app.utils.job_cancellation import track_job_task
 from app.utils.jobs import log_job_event
-from toon import encode
-from google import genai
+from app.agent.prompt_fragments import encode_fragment
 
 
 class PageCodeOutput(BaseModel):
@@ -38,7 +38,6 @@ def _normalize_filename(value: str | None) -> str:
 EXAMPLES_BASE_DIR = Path(__file__).resolve().parent.parent / "examples"
 PAGE_EXAMPLE_PATH = EXAMPLES_BASE_DIR / "app" / "page.tsx"
 LAYOUT_EXAMPLE_PATH = EXAMPLES_BASE_DIR / "app" / "layout.tsx"
-_GENAI_CLIENT: genai.Client | None = None
 _PAGE_EXPORT_PATTERN = re.compile(r"export\s+default\s+function\s+Page\b")
 _LAYOUT_EXPORT_PATTERN = re.compile(r"export\s+default\s+function\s+RootLayout\b")
 
@@ -51,52 +50,6 @@ def _read_example_file(path: Path, label: str) -> str:
         return ""
 
 
-def _get_genai_client() -> genai.Client:
-    global _GENAI_CLIENT
-    if _GENAI_CLIENT is None:
-        _GENAI_CLIENT = genai.Client()
-    return _GENAI_CLIENT
-
-
-def _messages_to_prompt(messages: List) -> str:
-    parts: List[str] = []
-    for message in messages:
-        content = getattr(message, "content", "")
-        if isinstance(content, str):
-            parts.append(content.strip())
-        elif isinstance(content, list):
-            parts.append("\n".join(str(item) for item in content))
-        else:
-            parts.append(str(content))
-    return "\n\n".join(part for part in parts if part).strip()
-
-
-async def _invoke_gemini_structured(
-    messages: List, schema: Type[BaseModel], label: str
-) -> BaseModel:
-    prompt = _messages_to_prompt(messages)
-    if not prompt:
-        raise ValueError(f"Gemini prompt for {label} was empty.")
-
-    client = _get_genai_client()
-
-    def _call() -> BaseModel:
-        response = client.models.generate_content(
-            model="gemini-3-pro-preview",
-            contents=prompt,
-            config={
-                "response_mime_type": "application/json",
-                "response_json_schema": schema.model_json_schema(),
-            },
-        )
-        raw_text = getattr(response, "text", "") or ""
-        if not raw_text.strip():
-            raise ValueError(f"Gemini returned empty response text for {label}.")
-        return schema.model_validate_json(raw_text)
-
-    return await asyncio.to_thread(_call)
-
-
 def _validate_default_export(code: str, pattern: re.Pattern[str], label: str) -> None:
     if not code or not pattern.search(code):
         raise ValueError(
@@ -219,8 +172,8 @@ def _build_page_messages(
     generated_sections: List[Dict[str, Any]],
     init_payload: Dict[str, Any],
 ) -> List:
-    guideline_text = encode(design_guidelines)
-    payload_text = encode(init_payload)
+    guideline_text = encode_fragment(design_guidelines)
+    payload_text = encode_fragment(init_payload)
     page_example_code = _read_example_file(PAGE_EXAMPLE_PATH, "page")
 
     sections_payload: List[Dict[str, str]] = []
@@ -235,7 +188,7 @@ def _build_page_messages(
                 }
             )
 
-    sections_text = encode(sections_payload)
+    sections_text = encode_fragment(sections_payload)
 
     human_content = (
         "You must assemble the landing page component using the generated sections.\n\n"
@@ -248,7 +201,7 @@ def _build_page_messages(
     )
 
     if page_example_code:
-        example_payload = encode(
+        example_payload = encode_fragment(
             {
                 "reference_filename": str(
                     PAGE_EXAMPLE_PATH.relative_to(EXAMPLES_BASE_DIR)
@@ -280,9 +233,9 @@ def _build_layout_messages(
     generated_sections: List[Dict[str, Any]],
     init_payload: Dict[str, Any],
 ) -> List:
-    guideline_text = encode(design_guidelines)
-    payload_text = encode(init_payload)
-    sections_text = encode(generated_sections)
+    guideline_text = encode_fragment(design_guidelines)
+    payload_text = encode_fragment(init_payload)
+    sections_text = encode_fragment(generated_sections)
     layout_example_code = _read_example_file(LAYOUT_EXAMPLE_PATH, "layout")
 
     human_content = (
@@ -296,7 +249,7 @@ def _build_layout_messages(
     )
 
     if layout_example_code:
-        example_payload = encode(
+        example_payload = encode_fragment(
             {
                 "reference_filename": str(
                     LAYOUT_EXAMPLE_PATH.relative_to(EXAMPLES_BASE_DIR)
@@ -333,15 +286,15 @@ async def _generate_page_code(
     init_payload: Dict[str, Any],
 ) -> PageCodeOutput:
     messages = _build_page_messages(design_guidelines, generated_sections, init_payload)
-    fallback_model = ChatOpenAI(
-        model="gpt-5", reasoning_effort="low"
-    ).with_structured_output(PageCodeOutput)
+    fallback_model = get_structured_model(
+        "openai", "gpt-5", PageCodeOutput, reasoning_effort="low"
+    )
 
     last_exc: Exception | None = None
 
     for attempt in range(1, 4):
         try:
-            result = await _invoke_gemini_structured(
+            result = await generate_gemini_structured(
                 messages, PageCodeOutput, f"page generation (attempt {attempt})"
             )
             _validate_default_export(result.code, _PAGE_EXPORT_PATTERN, "Page")
@@ -386,15 +339,15 @@ async def _generate_layout_code(
     messages = _build_layout_messages(
         design_guidelines, generated_sections, init_payload
     )
-    fallback_model = ChatOpenAI(
-        model="gpt-5", reasoning_effort="low"
-    ).with_structured_output(LayoutCodeOutput)
+    fallback_model = get_structured_model(
+        "openai", "gpt-5", LayoutCodeOutput, reasoning_effort="low"
+    )
 
     last_exc: Exception | None = None
 
     for attempt in range(1, 4):
         try:
-            result = await _invoke_gemini_structured(
+            result = await generate_gemini_structured(
                 messages, LayoutCodeOutput, f"layout generation (attempt {attempt})"
             )
             _validate_default_export(result.code, _LAYOUT_EXPORT_PATTERN, "Layout")
@@ -434,7 +387,7 @@ async def _generate_layout_code(
     )
 
 
-def codegen(state: BuilderState) -> BuilderState:
+async def codegen(state: BuilderState) -> BuilderState:
     log_job_event(
         state.job_id,
         node="codegen",
@@ -467,29 +420,18 @@ def codegen(state: BuilderState) -> BuilderState:
             page_task = asyncio.create_task(
                 _generate_page_code(design_guidelines, generated_sections, init_payload)
             )
-            await asyncio.sleep(1)
+            track_job_task(state.job_id, page_task)
             layout_task = asyncio.create_task(
                 _generate_layout_code(
                     design_guidelines, generated_sections, init_payload
                 )
             )
+            track_job_task(state.job_id, layout_task)
             page_result, layout_result = await asyncio.gather(page_task, layout_task)
             return page_result, layout_result
 
-        def execute_workers() -> Tuple[PageCodeOutput, LayoutCodeOutput]:
-            try:
-                return asyncio.run(run_workers())
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                try:
-                    asyncio.set_event_loop(loop)
-                    return loop.run_until_complete(run_workers())
-                finally:
-                    asyncio.set_event_loop(None)
-                    loop.close()
-
         try:
-            page_result, layout_result = execute_workers()
+            page_result, layout_result = await run_workers()
         except Exception as worker_exc:
             print(
                 f"[CODEGEN] Page/layout workers failed ({worker_exc}); using deterministic fallback."
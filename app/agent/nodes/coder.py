@@ -3,12 +3,11 @@ from errno import EL2HLT
 from langchain_core.messages import SystemMessage, HumanMessage
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 
-from toon import encode
+from app.agent.prompt_fragments import encode_fragment
 
 
+from app.agent.llm import get_tool_model
 from app.agent.prompts.coder import (
     CODER_DESIGN_BOOSTER,
     CODER_SYSTEM_PROMPT,
@@ -78,11 +77,11 @@ def coder(state: BuilderState) -> BuilderState:
         "DEFAULT" if not state.is_followup else "FOLLOW-UP",
     )
 
-    _coder_llm_ = ChatGoogleGenerativeAI(
-        model="models/gemini-3-pro-preview",
-    ).bind_tools(
+    _coder_llm_ = get_tool_model(
+        "google",
+        "models/gemini-3-pro-preview",
         tools,
-        parallel_tool_calls=True,
+        bind={"parallel_tool_calls": True},
     )
 
     # Build design context from structured guidelines if available
@@ -90,7 +89,7 @@ def coder(state: BuilderState) -> BuilderState:
     design_guidelines = state.design_guidelines
 
     if design_guidelines and state.design_planner_run:
-        design_context_section = encode(design_guidelines)
+        design_context_section = encode_fragment(design_guidelines)
     else:
         design_context_section = (
             "\n### Design blueprint missing:\n"
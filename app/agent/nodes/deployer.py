@@ -1,11 +1,14 @@
 """Deployer node that handles deployment to Vercel after code changes."""
 
 import subprocess
+import time
 from pathlib import Path
 from app.agent.state import BuilderState
 from app.models.landing_page import LandingPageStatus
+from app.utils.job_cancellation import track_job_process
 from app.utils.jobs import log_job_event
 from app.utils.landing_pages import update_landing_page_status
+from app.utils.metrics import SUBPROCESS_SECONDS
 
 # Resolve repository root (three levels up: /repo/app/agent/nodes/deployer.py → /repo)
 REPO_ROOT = Path(__file__).resolve().parents[3]
@@ -13,10 +16,13 @@ SCRIPTS_DIR = REPO_ROOT / "scripts"
 
 
 def _run_with_live_logs(
-    cmd: list[str], label: str, timeout: int = 300
+    cmd: list[str], label: str, timeout: int = 300, job_id: str | None = None
 ) -> subprocess.CompletedProcess:
     """Run a shell command streaming stdout lines immediately.
 
+    The command runs in its own process group so cancelling `job_id` can kill
+    the script and everything it spawned.
+
     Returns a CompletedProcess surrogate with aggregated stdout for downstream parsing.
     """
     print(f"[{label}] EXEC: {' '.join(cmd)} (cwd={REPO_ROOT})")
@@ -28,28 +34,38 @@ def _run_with_live_logs(
             stderr=subprocess.STDOUT,
             text=True,
             bufsize=1,
+            start_new_session=True,
         )
     except Exception as e:
         print(f"[{label}] ERROR: Failed to start process: {e}")
         raise
 
     lines: list[str] = []
-    try:
-        for line in process.stdout:  # type: ignore[attr-defined]
-            if line is None:
-                break
-            lines.append(line)
-            clean = line.rstrip("\n")
-            if clean:
-                print(f"[{label}] {clean}")
-        ret_code = process.wait(timeout=timeout)
-    except subprocess.TimeoutExpired:
-        process.kill()
-        print(f"[{label}] ERROR: Timeout after {timeout}s; process killed")
-        ret_code = -1
-    except Exception as e:
-        print(f"[{label}] ERROR: Exception while streaming: {e}")
-        ret_code = -1
+    started = time.perf_counter()
+    outcome = "ok"
+    with track_job_process(job_id, process):
+        try:
+            for line in process.stdout:  # type: ignore[attr-defined]
+                if line is None:
+                    break
+                lines.append(line)
+                clean = line.rstrip("\n")
+                if clean:
+                    print(f"[{label}] {clean}")
+            ret_code = process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            print(f"[{label}] ERROR: Timeout after {timeout}s; process killed")
+            ret_code = -1
+            outcome = "timeout"
+        except Exception as e:
+            print(f"[{label}] ERROR: Exception while streaming: {e}")
+            ret_code = -1
+    if outcome == "ok" and ret_code != 0:
+        outcome = "error"
+    SUBPROCESS_SECONDS.observe(
+        time.perf_counter() - started, command=label, outcome=outcome
+    )
 
     stdout_all = "".join(lines)
     return subprocess.CompletedProcess(cmd, ret_code, stdout_all, None)
@@ -87,6 +103,7 @@ def deployer(state: BuilderState) -> BuilderState:
             ["bash", str(SCRIPTS_DIR / "deploy_to_vercel.sh"), session_id],
             label="deployer",
             timeout=300,  # 5 minutes timeout for deployment
+            job_id=job_id,
         )
 
         output = result.stdout or ""
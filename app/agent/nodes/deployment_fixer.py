@@ -3,8 +3,7 @@
 from __future__ import annotations
 from langchain_core.messages import SystemMessage
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
+from app.agent.llm import get_tool_model
 from app.agent.prompts.deployment_fixer import (
     DEPLOYMENT_FIXER_PROMPT_PASS_0,
     DEPLOYMENT_FIXER_PROMPT_PASS_1,
@@ -44,7 +43,7 @@ ALL_TOOLS = [
 ]
 
 
-def deployment_fixer(state: BuilderState) -> BuilderState:
+async def deployment_fixer(state: BuilderState) -> BuilderState:
     """
     Specialized node for fixing deployment errors with a forced 3-pass workflow:
 
@@ -111,17 +110,18 @@ def deployment_fixer(state: BuilderState) -> BuilderState:
         )
 
         # Create LLM with appropriate tool binding
-        _deployment_fixer_llm_ = ChatOpenAI(model="gpt-5").bind_tools(
+        _deployment_fixer_llm_ = get_tool_model(
+            "openai",
+            "gpt-5",
             tools,
-            tool_choice=tool_choice,
-            parallel_tool_calls=True,
+            bind={"tool_choice": tool_choice, "parallel_tool_calls": True},
         )
 
         SYS = SystemMessage(content=prompt_with_context)
         messages = [SYS, *state.messages]
 
         print(f"[DEPLOYMENT_FIXER] Invoking LLM with tool_choice={tool_choice}...")
-        response = _deployment_fixer_llm_.invoke(messages)
+        response = await _deployment_fixer_llm_.ainvoke(messages)
 
         print(f"\n\n[DEPLOYMENT_FIXER] Response: {response}")
 
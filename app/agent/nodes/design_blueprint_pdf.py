@@ -1,13 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime
 from pathlib import Path
 from typing import Any
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 
+from app.agent.llm import get_chat_model
 from app.agent.prompts.design_blueprint_pdf import DESIGN_BLUEPRINT_PDF_PROMPT
 from app.agent.state import BuilderState
 from app.agent.utils.pdf import markdown_to_pdf
@@ -15,16 +15,16 @@ from app.agent.utils.storage import upload_file_to_gcs
 from app.config import Config
 from app.utils.landing_pages import update_landing_page_status
 from app.utils.jobs import log_job_event
-from toon import encode
+from app.agent.prompt_fragments import encode_fragment
 
 
-_documentation_llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-preview-09-2025")
+_documentation_llm = get_chat_model("google", "gemini-2.5-flash-preview-09-2025")
 
 
 def _serialize_payload(data: dict[str, Any] | None) -> str:
     if not data:
         return "Not provided."
-    return encode(data)
+    return encode_fragment(data)
 
 
 def _write_markdown(markdown_text: str, destination: Path) -> None:
@@ -32,7 +32,7 @@ def _write_markdown(markdown_text: str, destination: Path) -> None:
     destination.write_text(markdown_text, encoding="utf-8")
 
 
-def design_blueprint_pdf(state: BuilderState) -> BuilderState:
+async def design_blueprint_pdf(state: BuilderState) -> BuilderState:
     job_id = state.job_id
     log_job_event(
         job_id,
@@ -52,7 +52,7 @@ def design_blueprint_pdf(state: BuilderState) -> BuilderState:
 
     system = SystemMessage(content=DESIGN_BLUEPRINT_PDF_PROMPT)
     init_payload = state.init_payload or {}
-    company_payload = encode(init_payload)
+    company_payload = encode_fragment(init_payload)
     filtered_guidelines: dict[str, Any] = {}
     design_guidelines = state.design_guidelines or {}
     for key, value in design_guidelines.items():
@@ -71,11 +71,11 @@ def design_blueprint_pdf(state: BuilderState) -> BuilderState:
             continue
         filtered_guidelines[key] = value
 
+    guidelines_payload = encode_fragment(filtered_guidelines)
     print(
         "[DESIGN_BLUEPRINT_PDF] Filtered design guidelines (encoded):",
-        encode(filtered_guidelines),
+        guidelines_payload,
     )
-    guidelines_payload = encode(filtered_guidelines)
 
     product_name = ""
     campaign = init_payload.get("campaign") if isinstance(init_payload, dict) else None
@@ -103,7 +103,7 @@ def design_blueprint_pdf(state: BuilderState) -> BuilderState:
     data_sections: list[str] = []
     if state.data_insights:
         data_sections.append(
-            "### Data Signals (JSON)\n" + encode(state.data_insights)
+            "### Data Signals (JSON)\n" + encode_fragment(state.data_insights)
         )
     if state.campaign_data_digest:
         data_sections.append(
@@ -121,7 +121,7 @@ def design_blueprint_pdf(state: BuilderState) -> BuilderState:
     human = HumanMessage(content=context_block)
 
     try:
-        llm_response = _documentation_llm.invoke([system, human])
+        llm_response = await _documentation_llm.ainvoke([system, human])
         markdown_text = (
             llm_response.content
             if isinstance(llm_response.content, str)
@@ -136,11 +136,16 @@ def design_blueprint_pdf(state: BuilderState) -> BuilderState:
         markdown_path = output_dir / f"{base_name}.md"
         pdf_path = output_dir / f"{base_name}.pdf"
 
+        # PDF rendering and the GCS upload are blocking; keep them off the event loop
         _write_markdown(markdown_text, markdown_path)
-        markdown_to_pdf(markdown_text, pdf_path, header_title=header_title)
+        await asyncio.to_thread(
+            markdown_to_pdf, markdown_text, pdf_path, header_title=header_title
+        )
 
         destination_blob = f"design_blueprints/{state.session_id}/{base_name}.pdf"
-        pdf_url = upload_file_to_gcs(pdf_path, destination_blob=destination_blob)
+        pdf_url = await asyncio.to_thread(
+            upload_file_to_gcs, pdf_path, destination_blob=destination_blob
+        )
 
         if pdf_url is None:
             pdf_url = pdf_path.resolve().as_posix()
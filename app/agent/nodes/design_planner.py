@@ -1,8 +1,14 @@
 import re
+from functools import lru_cache
 from typing import Any, Dict, List
 
 from langchain_core.messages import SystemMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
+from app.agent.history import compact_history
+from app.agent.llm import (
+    generate_gemini_structured,
+    get_structured_model,
+    is_cached_content_conflict,
+)
 from app.agent.state import BuilderState
 from app.agent.models.design_guidelines import DesignGuidelines
 from app.utils.jobs import log_job_event
@@ -14,6 +20,7 @@ from app.agent.prompts.design_planner import (
     CANONICAL_SECTION_LIBRARY,
     CANONICAL_SECTION_ALIASES,
 )
+from app.agent.prompt_fragments import encode_fragment
 from toon import encode
 from app.utils.landing_pages import (
     get_landing_page_by_session_id,
@@ -22,7 +29,7 @@ from app.utils.landing_pages import (
 from app.models.landing_page import LandingPageUpdate
 
 
-_design_planner_llm_ = ChatGoogleGenerativeAI(model="gemini-2.5-flash-preview-09-2025")
+_DESIGN_PLANNER_MODEL = "gemini-2.5-flash-preview-09-2025"
 
 _CANONICAL_REGISTRY: Dict[str, Dict[str, str]] = {
     entry["section_id"]: entry for entry in CANONICAL_SECTION_LIBRARY
@@ -133,7 +140,27 @@ def _canonicalize_section_blueprints(guidelines: Dict[str, Any]) -> None:
             section["ordering_index"] = section.get("ordering_index") or f"{idx:02d}"
 
 
-def design_planner(state: BuilderState) -> BuilderState:
+@lru_cache(maxsize=1)
+def _planner_system_prompt() -> str:
+    """The planner prompt with its static inspiration and section tables injected."""
+    hero_insp_str = "\n".join([f"- {item}" for item in HERO_CONCEPTS])
+    features_insp_str = "\n".join([f"- {item}" for item in FEATURES_LAYOUT_OPTIONS])
+    nav_insp_str = "\n".join([f"- {item}" for item in NAV_STYLE_INSPIRATION])
+
+    canonical_sections_str = "\n".join(
+        f"- {entry['section_name']} → component `{entry['component_name']}` | id `{entry['section_id']}` | file `{entry['section_file_name_tsx']}`"
+        for entry in CANONICAL_SECTION_LIBRARY
+    )
+
+    prompt = DESIGN_PLANNER_PROMPT_TEMPLATE.replace(
+        "**_hero_inspiration_**", hero_insp_str
+    )
+    prompt = prompt.replace("**_features_inspiration_**", features_insp_str)
+    prompt = prompt.replace("**_nav_inspiration_**", nav_insp_str)
+    return prompt.replace("**_canonical_sections_table_**", canonical_sections_str)
+
+
+async def design_planner(state: BuilderState) -> BuilderState:
     """
     Design Planner Node - Generates the full creative blueprint consumed directly by the coder.
 
@@ -166,7 +193,7 @@ def design_planner(state: BuilderState) -> BuilderState:
         )
     if state.data_insights:
         data_context_parts.append(
-            "### Structured Data Signals (JSON)\n" + encode(state.data_insights)
+            "### Structured Data Signals (JSON)\n" + encode_fragment(state.data_insights)
         )
     if state.data_warnings:
         warning_block = "\n".join(f"- {warning}" for warning in state.data_warnings)
@@ -174,34 +201,34 @@ def design_planner(state: BuilderState) -> BuilderState:
     if data_context_parts:
         init_payload_text = init_payload_text + "\n\n" + "\n\n".join(data_context_parts)
 
-    # Inject inspiration into prompt
-    hero_insp_str = "\n".join([f"- {item}" for item in HERO_CONCEPTS])
-    features_insp_str = "\n".join([f"- {item}" for item in FEATURES_LAYOUT_OPTIONS])
-    nav_insp_str = "\n".join([f"- {item}" for item in NAV_STYLE_INSPIRATION])
-
-    canonical_sections_str = "\n".join(
-        f"- {entry['section_name']} → component `{entry['component_name']}` | id `{entry['section_id']}` | file `{entry['section_file_name_tsx']}`"
-        for entry in CANONICAL_SECTION_LIBRARY
-    )
-
-    prompt = DESIGN_PLANNER_PROMPT_TEMPLATE.replace(
-        "**_hero_inspiration_**", hero_insp_str
-    )
-    prompt = prompt.replace("**_features_inspiration_**", features_insp_str)
-    prompt = prompt.replace("**_nav_inspiration_**", nav_insp_str)
-    prompt = prompt.replace("**_canonical_sections_table_**", canonical_sections_str)
-
-    system_message = SystemMessage(content=prompt + init_payload_text)
-    messages = [system_message, *state.messages]
+    # The static prompt leads on its own so Gemini can serve it from a
+    # context cache; Gemini merges the following system message into it
+    messages = [
+        SystemMessage(content=_planner_system_prompt()),
+        SystemMessage(content=init_payload_text),
+        *compact_history(state.messages, node="design_planner"),
+    ]
 
     try:
         # Generate structured design guidelines
         print("[DESIGN_PLANNER] Invoking LLM with structured output...")
-        design_guidelines: DesignGuidelines = (
-            _design_planner_llm_.with_structured_output(DesignGuidelines).invoke(
-                messages
+        try:
+            design_guidelines: DesignGuidelines = await generate_gemini_structured(
+                messages,
+                DesignGuidelines,
+                label="design guidelines",
+                model=_DESIGN_PLANNER_MODEL,
+                cache_prefix=True,
             )
-        )
+        except Exception as sdk_exc:
+            if not is_cached_content_conflict(sdk_exc):
+                raise
+            print(
+                f"[DESIGN_PLANNER] Gemini SDK call failed ({sdk_exc}); retrying via LangChain"
+            )
+            design_guidelines = await get_structured_model(
+                "google", _DESIGN_PLANNER_MODEL, DesignGuidelines
+            ).ainvoke(messages)
 
         print(f"✅ [DESIGN_PLANNER] Generated design guidelines:")
 
@@ -216,7 +243,17 @@ def design_planner(state: BuilderState) -> BuilderState:
             node="design_planner",
             message="Design planner generated comprehensive design guidelines.",
             event_type="node_completed",
-            data=guidelines_dict,
+            # The full blueprint is persisted on the landing page; keep the
+            # event small since it is re-read on every poll.
+            data={
+                "theme": guidelines_dict.get("theme"),
+                "page_title": guidelines_dict.get("page_title"),
+                "sections": [
+                    section.get("section_id")
+                    for section in guidelines_dict.get("sections") or []
+                    if isinstance(section, dict)
+                ],
+            },
         )
 
         # Persist design guidelines to the landing page record
@@ -3,9 +3,8 @@ import random
 
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
+from app.agent.llm import get_structured_model
 from app.agent.prompts.designer import (
     DESIGNER_SYSTEM_PROMPT,
     FOLLOWUP_DESIGNER_SYSTEM_PROMPT,
@@ -13,7 +12,7 @@ from app.agent.prompts.designer import (
 )
 from app.agent.state import BuilderState
 from app.agent.tools.commands import lint_project
-from toon import encode
+from app.agent.prompt_fragments import encode_fragment
 from app.utils.jobs import log_job_event
 from app.agent.tools.files import (
     # Batch operations
@@ -57,7 +56,7 @@ class DesignerOutput(BaseModel):
     )
 
 
-_designer_llm_ = ChatOpenAI(model="gpt-5", reasoning_effort="low")
+_DESIGNER_MODEL = "gpt-5"
 
 
 def designer(state: BuilderState) -> BuilderState:
@@ -79,7 +78,7 @@ def designer(state: BuilderState) -> BuilderState:
         else:
             SYS = SystemMessage(
                 content=DESIGNER_SYSTEM_PROMPT.replace(
-                    "{guidelines}", encode(design_guidelines)
+                    "{guidelines}", encode_fragment(design_guidelines)
                 )
                 + f"\n\nThe following files exist in the session: {files}"
             )
@@ -92,9 +91,9 @@ def designer(state: BuilderState) -> BuilderState:
     print(f"[DESIGNER] Prompt: {SYS.content}")
 
     messages = [SYS, *state.messages]
-    designer_response = _designer_llm_.with_structured_output(DesignerOutput).invoke(
-        messages
-    )
+    designer_response = get_structured_model(
+        "openai", _DESIGNER_MODEL, DesignerOutput, reasoning_effort="low"
+    ).invoke(messages)
 
     try:
         batch_create_files_internal(
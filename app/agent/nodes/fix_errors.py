@@ -4,9 +4,9 @@ from __future__ import annotations
 
 from langchain_core.messages import SystemMessage
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
 
+from app.agent.history import compact_history
+from app.agent.llm import get_tool_model
 from app.agent.prompts.fix_errors import FIX_ERRORS_PROMPT
 from app.agent.state import BuilderState
 from app.agent.tools.files import (
@@ -34,7 +34,7 @@ tools = [
 ]
 
 
-def fix_errors(state: BuilderState) -> BuilderState:
+async def fix_errors(state: BuilderState) -> BuilderState:
     """Specialized node dedicated to fixing lint/type errors surfaced by linting."""
     response = None
     try:
@@ -71,15 +71,18 @@ def fix_errors(state: BuilderState) -> BuilderState:
                 "or batch_create_files, then run lint_project. Reading again without edits is not allowed."
             )
 
-        fix_errors_llm = ChatOpenAI(model="gpt-4.1").bind_tools(
-            tools, parallel_tool_calls=True
+        fix_errors_llm = get_tool_model(
+            "openai", "gpt-4.1", tools, bind={"parallel_tool_calls": True}
         )
 
         system_message = SystemMessage(content=prompt_with_context)
-        messages = [system_message, *state.messages]
+        messages = [
+            system_message,
+            *compact_history(state.messages, node="fix_errors"),
+        ]
 
         print("[FIX_ERRORS] Reviewing lint output and determining fixes...")
-        response = fix_errors_llm.invoke(messages)
+        response = await fix_errors_llm.ainvoke(messages)
 
         print(f"\n\n[FIX_ERRORS] Response: {response}")
 
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 
-from toon import encode
+from app.agent.prompt_fragments import encode_fragment
 
+from app.agent.history import compact_history
+from app.agent.llm import get_tool_model
 from app.agent.prompts.coder import FOLLOWUP_CODER_SYSTEM_PROMPT
 from app.agent.state import BuilderState
 from app.agent.tools.files import (
@@ -29,7 +30,7 @@ FOLLOWUP_TOOLS = [
 ]
 
 
-def followup_codegen(state: BuilderState) -> BuilderState:
+async def followup_codegen(state: BuilderState) -> BuilderState:
     """LLM node that handles follow-up coding requests with full tool access."""
 
     log_job_event(
@@ -41,7 +42,7 @@ def followup_codegen(state: BuilderState) -> BuilderState:
 
     design_guidelines = state.design_guidelines or {}
     design_context = (
-        encode(design_guidelines)
+        encode_fragment(design_guidelines)
         if design_guidelines and state.design_planner_run
         else "Design blueprint not available in structured form."
     )
@@ -59,13 +60,20 @@ def followup_codegen(state: BuilderState) -> BuilderState:
     )
 
     system_message = SystemMessage(content=system_content)
-    messages = [system_message, *state.messages]
-
-    llm = ChatGoogleGenerativeAI(
-        model="models/gemini-3-pro-preview", temperature=0.1
-    ).bind_tools(FOLLOWUP_TOOLS, parallel_tool_calls=True)
+    messages = [
+        system_message,
+        *compact_history(state.messages, node="followup_codegen"),
+    ]
+
+    llm = get_tool_model(
+        "google",
+        "models/gemini-3-pro-preview",
+        FOLLOWUP_TOOLS,
+        bind={"parallel_tool_calls": True},
+        temperature=0.1,
+    )
 
-    response = llm.invoke(messages)
+    response = await llm.ainvoke(messages)
 
     # If the LLM requests tool calls, hand control to the tool execution node
     if getattr(response, "tool_calls", None):
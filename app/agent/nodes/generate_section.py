@@ -1,16 +1,25 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import re
+import time
 from pathlib import Path
 from typing import Any, Dict, List
 
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from app.agent.llm import (
+    DEFAULT_GEMINI_MODEL,
+    generate_gemini_structured,
+    get_structured_model,
+)
+from app.agent.retry import LLM_LATENCY, RetryPolicy, hedged, retry_async
 from app.agent.state import BuilderState
 from app.agent.tools.files import get_session_dir
+from app.config import Config
+from app.utils.job_cancellation import track_job_task
 from app.utils.jobs import log_job_event
 from app.utils.landing_pages import (
     get_landing_page_by_session_id,
@@ -18,8 +27,7 @@ from app.utils.landing_pages import (
 )
 from app.models.landing_page import LandingPageUpdate
 from app.agent.prompts.generate_section import SECTION_GENERATOR_PROMPT
-from toon import encode
-from google import genai
+from app.agent.prompt_fragments import encode_fragment
 
 
 class SectionGenerationOutput(BaseModel):
@@ -40,7 +48,6 @@ class SectionGenerationOutput(BaseModel):
 EXAMPLES_BASE_DIR = Path(__file__).resolve().parent.parent / "examples"
 SECTION_EXAMPLES_DIR = EXAMPLES_BASE_DIR / "components" / "sections"
 _SECTION_EXAMPLES_CACHE: Dict[str, Dict[str, str]] | None = None
-_GENAI_CLIENT: genai.Client | None = None
 
 
 def _normalize_section_key(value: str | None) -> str:
@@ -74,13 +81,6 @@ def _load_section_examples() -> Dict[str, Dict[str, str]]:
     return examples
 
 
-def _get_genai_client() -> genai.Client:
-    global _GENAI_CLIENT
-    if _GENAI_CLIENT is None:
-        _GENAI_CLIENT = genai.Client()
-    return _GENAI_CLIENT
-
-
 def _resolve_section_example(
     section_blueprint: Dict[str, Any],
 ) -> Dict[str, str] | None:
@@ -126,9 +126,14 @@ def _build_section_prompt(
     section_blueprint: Dict[str, Any],
     init_payload: Dict[str, Any],
 ) -> List:
-    guideline_text = encode(design_guidelines)
-    blueprint_text = encode(section_blueprint)
-    payload_text = encode(init_payload)
+    """
+    Build the section prompt. The SystemMessage holds only what is stable
+    across pages (generator prompt + the section type's reference example) so
+    Gemini can serve it from a context cache; page data goes in the HumanMessage.
+    """
+    guideline_text = encode_fragment(design_guidelines)
+    blueprint_text = encode_fragment(section_blueprint)
+    payload_text = encode_fragment(init_payload)
     example_entry = _resolve_section_example(section_blueprint)
 
     human_content = (
@@ -139,73 +144,66 @@ def _build_section_prompt(
         f"{blueprint_text}\n\n"
         "### Initialization Payload (JSON encoded)\n"
         f"{payload_text}\n"
+        "\nAlways stay as close as possible to the reference syntax and structure so the generated component feels like a sibling to the example.\n"
+        "Return only the JSON object matching the schema."
     )
 
+    system_content = SECTION_GENERATOR_PROMPT.strip()
     if example_entry:
-        example_payload = encode(
+        example_payload = encode_fragment(
             {
                 "reference_filename": example_entry["relative_path"],
                 "reference_code": example_entry["code"],
             }
         )
-        human_content += (
-            "\n### Section Reference Example (JSON encoded)\n"
+        system_content += (
+            "\n\n### Section Reference Example (JSON encoded)\n"
             f"{example_payload}\n"
             "Use this reference as the structural template: mirror its import order, React component shell, props typing patterns, FEAAS registration shape, motion setup, and helper constant organization. Only change names, defaults, and content where the blueprint requires it."
         )
     else:
-        human_content += (
-            "\n### Section Reference Example\n"
+        system_content += (
+            "\n\n### Section Reference Example\n"
             "No direct example available; follow the guardrails and business context precisely.\n"
         )
 
-    human_content += (
-        "\nAlways stay as close as possible to the reference syntax and structure so the generated component feels like a sibling to the example.\n"
-        "Return only the JSON object matching the schema."
-    )
-
     return [
-        SystemMessage(content=SECTION_GENERATOR_PROMPT.strip()),
+        SystemMessage(content=system_content),
         HumanMessage(content=human_content),
     ]
 
 
-def _messages_to_prompt(messages: List) -> str:
-    chunks: List[str] = []
-    for message in messages:
-        content = getattr(message, "content", "")
-        if isinstance(content, str):
-            chunks.append(content.strip())
-        elif isinstance(content, list):
-            chunks.append("\n".join(str(item) for item in content))
-        else:
-            chunks.append(str(content))
-    prompt = "\n\n".join(chunk for chunk in chunks if chunk)
-    return prompt.strip()
-
-
-async def _invoke_gemini_structured(messages: List) -> SectionGenerationOutput:
-    prompt = _messages_to_prompt(messages)
-    if not prompt:
-        raise ValueError("Gemini prompt was empty.")
-
-    client = _get_genai_client()
-
-    def _call() -> SectionGenerationOutput:
-        response = client.models.generate_content(
-            model="gemini-3-pro-preview",
-            contents=prompt,
-            config={
-                "response_mime_type": "application/json",
-                "response_json_schema": SectionGenerationOutput.model_json_schema(),
-            },
-        )
-        raw_text = getattr(response, "text", "") or ""
-        if not raw_text.strip():
-            raise ValueError("Gemini returned empty response text.")
-        return SectionGenerationOutput.model_validate_json(raw_text)
+# Cap on the code preview carried by each section_progress event
+_PREVIEW_MAX_CHARS = 1000
+_CODE_FIELD_START = re.compile(r'"code"\s*:\s*"')
 
-    return await asyncio.to_thread(_call)
+
+def _partial_code(raw_json: str) -> str:
+    """Decoded value of the "code" field of a possibly truncated JSON response."""
+    match = _CODE_FIELD_START.search(raw_json)
+    if not match:
+        return ""
+    body = '"' + raw_json[match.end() :]
+    try:
+        return json.JSONDecoder().raw_decode(body)[0]
+    except ValueError:
+        pass
+    # Truncated mid-string: drop a dangling escape sequence (at most "\uXXX")
+    for trim in range(6):
+        try:
+            return json.loads(body[: len(body) - trim] + '"')
+        except ValueError:
+            continue
+    return ""
+
+
+def _retry_policy(attempts: int) -> RetryPolicy:
+    return RetryPolicy(
+        attempts=attempts,
+        base_delay=Config.LLM_RETRY_BASE_SECONDS,
+        max_delay=Config.LLM_RETRY_MAX_SECONDS,
+        attempt_timeout=Config.SECTION_ATTEMPT_TIMEOUT_SECONDS,
+    )
 
 
 async def _generate_single_section(
@@ -237,11 +235,9 @@ async def _generate_single_section(
         )
     print(f"[GENERATE_SECTION] Launching worker for section: {section_name}")
 
-    fallback_model = ChatOpenAI(
-        model="gpt-5", reasoning_effort="low"
-    ).with_structured_output(SectionGenerationOutput)
-
-    last_exc: Exception | None = None
+    fallback_model = get_structured_model(
+        "openai", "gpt-5", SectionGenerationOutput, reasoning_effort="low"
+    )
 
     def _validate_export(result: SectionGenerationOutput) -> None:
         """Validate that the generated code contains a named export matching the component name."""
@@ -258,85 +254,115 @@ async def _generate_single_section(
                 f"Generated code is missing 'export function {component_name}' or 'export const {component_name}'"
             )
 
-    # Primary attempts with Gemini
-    for attempt in range(1, 4):
-        try:
-            result = await _invoke_gemini_structured(messages)
-            print(
-                f"[GENERATE_SECTION] (Gemini) Worker completed for: {section_name} (attempt {attempt})"
-            )
-            print(f"[GENERATE_SECTION] Result: {result}")
-            if result is None:
-                print(
-                    f"[GENERATE_SECTION] Result is None for {section_name} using Gemini, retrying..."
-                )
-                continue
-            _validate_export(result)
-            # Log successful section generation
-            if job_id:
-                log_job_event(
-                    job_id,
-                    node="generate_section",
-                    message=f"Generated {section_name}",
-                    event_type="node",
-                    data={
-                        "section_name": section_name,
-                        "component_name": component_name,
-                        "filename": result.filename,
-                        "model": "gemini-3-pro-preview",
-                        "attempt": attempt,
-                    },
-                )
-            return result
-        except Exception as exc:  # pragma: no cover - logging
-            last_exc = exc
-            print(
-                f"[GENERATE_SECTION] (Gemini) Attempt {attempt} failed for {section_name}: {exc}"
+    def _log_generated(result: SectionGenerationOutput, model: str, attempt: int):
+        if job_id:
+            log_job_event(
+                job_id,
+                node="generate_section",
+                message=f"Generated {section_name}",
+                event_type="node",
+                data={
+                    "section_name": section_name,
+                    "component_name": component_name,
+                    "filename": result.filename,
+                    "model": model,
+                    "attempt": attempt,
+                },
             )
 
-    print(
-        f"[GENERATE_SECTION] Switching to GPT-5 fallback for section: {section_name} after 3 Gemini failures."
-    )
-
-    # Fallback attempts with GPT-5
-    for attempt in range(4, 10):
-        try:
-            result = await fallback_model.ainvoke(messages)
-            print(
-                f"[GENERATE_SECTION] (GPT-5) Worker completed for: {section_name} (attempt {attempt - 3})"
-            )
-            print(f"[GENERATE_SECTION] Result: {result}")
-            if result is None:
-                print(
-                    f"[GENERATE_SECTION] Result is None for {section_name} using GPT-5, retrying..."
-                )
-                continue
-            _validate_export(result)
-            # Log successful section generation
-            if job_id:
-                log_job_event(
-                    job_id,
-                    node="generate_section",
-                    message=f"Generated {section_name}",
-                    event_type="node",
-                    data={
-                        "section_name": section_name,
-                        "component_name": component_name,
-                        "filename": result.filename,
-                        "model": "gpt-5",
-                        "attempt": attempt - 3,
-                    },
-                )
-            return result
-        except Exception as exc:  # pragma: no cover - logging
-            last_exc = exc
-            print(
-                f"[GENERATE_SECTION] (GPT-5) Attempt {attempt - 3} failed for {section_name}: {exc}"
+    def _progress_reporter(attempt: int):
+        """Emits throttled section_progress events while Gemini streams code."""
+        last_emitted = 0.0
+
+        def on_text(raw_json: str) -> None:
+            nonlocal last_emitted
+            now = time.monotonic()
+            if now - last_emitted < Config.SECTION_PROGRESS_INTERVAL_SECONDS:
+                return
+            last_emitted = now
+            code = _partial_code(raw_json)
+            lines = code.splitlines()
+            log_job_event(
+                job_id,
+                node="generate_section",
+                message=f"Generating {section_name}: {len(lines)} lines so far",
+                event_type="section_progress",
+                data={
+                    "section_name": section_name,
+                    "component_name": component_name,
+                    "model": DEFAULT_GEMINI_MODEL,
+                    "attempt": attempt,
+                    "chars": len(code),
+                    "lines": len(lines),
+                    "preview": "\n".join(
+                        lines[-Config.SECTION_PROGRESS_PREVIEW_LINES :]
+                    )[-_PREVIEW_MAX_CHARS:],
+                },
             )
 
-    raise RuntimeError(
-        f"Section generation failed for {section_name} after exhausting Gemini and GPT-5 attempts."
-    ) from last_exc
+        return on_text
+
+    async def _gemini_attempt(attempt: int) -> SectionGenerationOutput:
+        result = await generate_gemini_structured(
+            messages,
+            SectionGenerationOutput,
+            label=f"section {section_name}",
+            cache_prefix=True,
+            on_text=(
+                _progress_reporter(attempt)
+                if job_id and Config.SECTION_STREAMING_ENABLED
+                else None
+            ),
+        )
+        print(
+            f"[GENERATE_SECTION] (Gemini) Worker completed for: {section_name} (attempt {attempt})"
+        )
+        print(f"[GENERATE_SECTION] Result: {result}")
+        if result is None:
+            raise ValueError(f"Gemini returned no result for {section_name}")
+        _validate_export(result)
+        _log_generated(result, DEFAULT_GEMINI_MODEL, attempt)
+        return result
+
+    async def _fallback_attempt(attempt: int) -> SectionGenerationOutput:
+        result = await fallback_model.ainvoke(messages)
+        print(
+            f"[GENERATE_SECTION] (GPT-5) Worker completed for: {section_name} (attempt {attempt})"
+        )
+        print(f"[GENERATE_SECTION] Result: {result}")
+        if result is None:
+            raise ValueError(f"GPT-5 returned no result for {section_name}")
+        _validate_export(result)
+        _log_generated(result, "gpt-5", attempt)
+        return result
+
+    hedge_after = None
+    if Config.SECTION_HEDGE_ENABLED:
+        hedge_after = LLM_LATENCY.percentile(
+            DEFAULT_GEMINI_MODEL,
+            Config.SECTION_HEDGE_QUANTILE,
+            min_samples=Config.SECTION_HEDGE_MIN_SAMPLES,
+        )
+
+    try:
+        return await hedged(
+            lambda: retry_async(
+                _gemini_attempt,
+                _retry_policy(Config.SECTION_PRIMARY_ATTEMPTS),
+                label=f"section {section_name} (Gemini)",
+            ),
+            lambda: retry_async(
+                _fallback_attempt,
+                _retry_policy(Config.SECTION_FALLBACK_ATTEMPTS),
+                label=f"section {section_name} (GPT-5)",
+            ),
+            hedge_after=hedge_after,
+            label=f"section {section_name}",
+        )
+    except Exception as exc:
+        raise RuntimeError(
+            f"Section generation failed for {section_name} after exhausting Gemini and GPT-5 attempts."
+        ) from exc
 
 
 def _sanitize_section_filename(filename: str) -> str:
@@ -431,7 +457,7 @@ def _write_sections_index(
     (sections_dir / "index.ts").write_text(export_content, encoding="utf-8")
 
 
-def generate_section(state: BuilderState) -> BuilderState:
+async def generate_section(state: BuilderState) -> BuilderState:
     log_job_event(
         state.job_id,
         node="generate_section",
@@ -464,34 +490,19 @@ def generate_section(state: BuilderState) -> BuilderState:
         for section in sections:
             if not isinstance(section, dict):
                 continue
-            if tasks:
-                await asyncio.sleep(1)
             task = asyncio.create_task(
                 _generate_single_section(
                     section, design_guidelines, init_payload, job_id
                 )
             )
+            track_job_task(job_id, task)
             tasks.append(task)
         if not tasks:
             return []
         return await asyncio.gather(*tasks)
 
-    try:
-        results = asyncio.run(run_workers())
-        print(
-            f"[GENERATE_SECTION] Async workers completed for session {state.session_id}"
-        )
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        try:
-            asyncio.set_event_loop(loop)
-            results = loop.run_until_complete(run_workers())
-        finally:
-            asyncio.set_event_loop(None)
-            loop.close()
-        print(
-            f"[GENERATE_SECTION] Async workers completed using dedicated loop for session {state.session_id}"
-        )
+    results = await run_workers()
+    print(f"[GENERATE_SECTION] Async workers completed for session {state.session_id}")
 
     sanitized_results: List[SectionGenerationOutput] = results
 
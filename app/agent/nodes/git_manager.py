@@ -1,8 +1,8 @@
 from __future__ import annotations
 
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_openai import ChatOpenAI
 
+from app.agent.llm import get_tool_model
 from app.agent.prompts_new import GIT_MANAGER_SYSTEM_PROMPT
 from app.agent.state import BuilderState
 from app.agent.tools.commands import run_git_command
@@ -10,11 +10,13 @@ from app.agent.tools.commands import run_git_command
 
 tools = [run_git_command]
 
-_git_llm_ = ChatOpenAI(
-    model="gpt-4.1-mini-2025-04-14",
+_git_llm_ = get_tool_model(
+    "openai",
+    "gpt-4.1-mini-2025-04-14",
+    tools,
     # Force the model to produce a tool call first
     tool_choice="required",
-).bind_tools(tools)
+)
 
 
 def git_manager(state: BuilderState) -> BuilderState:
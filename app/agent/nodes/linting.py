@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import subprocess
+import time
 from pathlib import Path
 
 from app.agent.state import BuilderState
 from app.models.landing_page import LandingPageStatus
+from app.utils.job_cancellation import track_job_process
 from app.utils.jobs import log_job_event
 from app.utils.landing_pages import update_landing_page_status
+from app.utils.metrics import SUBPROCESS_SECONDS
 
 
 REPO_ROOT = Path(__file__).resolve().parents[3]
@@ -28,14 +31,25 @@ def linting(state: BuilderState) -> BuilderState:
         session_id,
     ]
 
-    process = subprocess.run(
+    # Own process group so a job cancel can kill the whole lint script tree
+    process = subprocess.Popen(
         cmd,
         cwd=str(REPO_ROOT),
-        capture_output=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
         text=True,
+        start_new_session=True,
+    )
+    started = time.perf_counter()
+    with track_job_process(state.job_id, process):
+        stdout, stderr = process.communicate()
+    SUBPROCESS_SECONDS.observe(
+        time.perf_counter() - started,
+        command="linting",
+        outcome="ok" if process.returncode == 0 else "error",
     )
 
-    output = (process.stdout or "") + (process.stderr or "")
+    output = (stdout or "") + (stderr or "")
     lint_failed = process.returncode != 0
 
     print("[LINTING] ---------------- LINT OUTPUT START ----------------")
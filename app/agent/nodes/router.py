@@ -1,12 +1,21 @@
 from __future__ import annotations
 from typing import Literal
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
+from app.agent.history import compact_history, stale_tool_stubs
+from app.agent.llm import get_structured_model
 from app.agent.prompts_new import ROUTER_SYSTEM_PROMPT
+from app.agent.routing_rules import (
+    ROUTER_DECISIONS,
+    RouteDecision,
+    decide_without_llm,
+    latest_user_request,
+    remember_decision,
+)
 from app.agent.state import BuilderState
+from app.config import Config
 from app.models.landing_page import LandingPageStatus
+from app.utils.jobs import log_job_event
 from app.utils.landing_pages import update_landing_page_status
 
 load_dotenv()
@@ -28,7 +37,7 @@ If a user's request starts with : 'Deploy the landing page', route to `deploy`.
 Respond using the structured schema: pick `next_node` (`design`, `code`, `clarify`, or `deploy`), set `is_followup` appropriately, and include brief reasoning.
 """
 
-_router_llm_ = ChatGoogleGenerativeAI(model="gemini-2.5-flash-preview-09-2025")
+_ROUTER_MODEL = "gemini-2.5-flash-preview-09-2025"
 
 # Structured Output
 from pydantic import BaseModel
@@ -40,7 +49,40 @@ class RouterResponse(BaseModel):
     reasoning: str
 
 
-def router(state: BuilderState) -> BuilderState:
+def _apply_decision(state: BuilderState, decision: RouteDecision) -> BuilderState:
+    """Record the decision with its source and turn it into a state update."""
+    print(
+        f"[ROUTER] Decision ({decision.source}): {decision.next_node}, "
+        f"followup={decision.is_followup} - {decision.reasoning}"
+    )
+    ROUTER_DECISIONS.inc(source=decision.source, next_node=decision.next_node)
+    log_job_event(
+        state.job_id,
+        node="router",
+        message=f"Routed to {decision.next_node} ({decision.source})",
+        event_type="router_decision",
+        data={
+            "next_node": decision.next_node,
+            "is_followup": decision.is_followup,
+            "source": decision.source,
+            "reasoning": decision.reasoning,
+        },
+    )
+    updates = {
+        "user_intent": decision.next_node,
+        "is_followup": decision.is_followup,
+        "router_decision_source": decision.source,
+    }
+    # Every run starts here: shrink tool results of earlier turns in the
+    # checkpoint before the rest of the graph reads the history
+    stubs = stale_tool_stubs(state.messages)
+    if stubs:
+        print(f"[ROUTER] Stubbed {len(stubs)} stale tool results in the history")
+        updates["messages"] = stubs
+    return updates
+
+
+async def router(state: BuilderState) -> BuilderState:
 
     status_lines = [
         f"Design blueprint ready: {'yes' if state.design_planner_run else 'no'}",
@@ -62,25 +104,32 @@ def router(state: BuilderState) -> BuilderState:
                 f"[ROUTER] Landing page status updated to 'generating' for session {session_id}"
             )
 
-        return {
-            "user_intent": "design",
-            "is_followup": False,
-        }
+        return _apply_decision(
+            state,
+            RouteDecision("design", False, "No design blueprint yet.", "state"),
+        )
+
+    request_text = latest_user_request(state.messages)
+    if Config.ROUTER_FAST_PATH_ENABLED:
+        decision = decide_without_llm(state.session_id, request_text)
+        if decision is not None:
+            return _apply_decision(state, decision)
 
     SYS = SystemMessage(content=ROUTER_SYSTEM_PROMPT + "\n\n" + context_section)
 
-    messages = [SYS, *state.messages]
+    messages = [SYS, *compact_history(state.messages, node="router")]
 
     # print("Router Invoked with messages:\n", messages)
 
-    router_response = _router_llm_.with_structured_output(RouterResponse).invoke(
-        messages
-    )
-
-    print("\n\n[ROUTER] Decision:", router_response)
+    router_response = await get_structured_model(
+        "google", _ROUTER_MODEL, RouterResponse
+    ).ainvoke(messages)
 
-    next_node = router_response.next_node
-    return {
-        "user_intent": next_node,
-        "is_followup": router_response.is_followup,
-    }
+    decision = RouteDecision(
+        router_response.next_node,
+        router_response.is_followup,
+        router_response.reasoning,
+        "llm",
+    )
+    remember_decision(state.session_id, request_text, decision)
+    return _apply_decision(state, decision)
@@ -1,8 +1,7 @@
 from __future__ import annotations
 from langchain_core.messages import SystemMessage, AIMessage
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
+from app.agent.llm import get_structured_model
 from app.agent.state import BuilderState
 
 
@@ -26,7 +25,7 @@ REQUIREMENTS:
 - Do NOT invent external URLs; use placeholders (e.g., ./public/brand/logo.svg) when necessary.
 """
 
-_structurer_llm_ = ChatGoogleGenerativeAI(model="gemini-2.5-flash")
+_STRUCTURER_MODEL = "gemini-2.5-flash"
 
 
 # Models
@@ -64,8 +63,8 @@ def structurer(state: BuilderState) -> BuilderState:
         + str(designer_payload)
     )
     messages = [SYS, *state.messages]
-    structurer_response = _structurer_llm_.with_structured_output(
-        DesignerStructuredOutput
+    structurer_response = get_structured_model(
+        "google", _STRUCTURER_MODEL, DesignerStructuredOutput
     ).invoke(messages)
     print(f"[STRUCTURER] Response: {structurer_response}")
     return {
@@ -0,0 +1,75 @@
+"""Per-job memo of toon-encoded prompt fragments.
+
+Design guidelines, the init payload and reference examples are encoded into
+every section prompt of a page, every follow-up tool-loop iteration and the
+page/layout prompts. encode_fragment encodes each distinct value once per job
+(keyed by a hash of its canonical JSON) and hands the same text to every
+section worker of the fan-out. The job is taken from the graph run's config,
+so prompt builders need no extra argument.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from typing import Any, Optional
+
+from toon import encode
+
+from app.config import Config
+from app.utils.llm_usage import current_run_context
+from app.utils.metrics import counter
+from app.utils.ttl_cache import TTLCache
+
+PROMPT_FRAGMENT_REQUESTS = counter(
+    "agent_prompt_fragment_requests_total",
+    "Prompt fragment encodings served from the per-job memo (hit) or computed (miss).",
+    ("result",),
+)
+
+# job id -> {content hash: encoded text}
+_FRAGMENTS: TTLCache[str, dict[str, str]] = TTLCache(
+    max_entries=Config.PROMPT_FRAGMENT_CACHE_JOBS,
+    ttl_seconds=Config.PROMPT_FRAGMENT_CACHE_TTL_SECONDS,
+)
+_FRAGMENTS_LOCK = threading.Lock()
+
+
+def _content_hash(value: Any) -> str:
+    canonical = json.dumps(
+        value, sort_keys=True, default=str, ensure_ascii=False, separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def encode_fragment(value: Any, *, job_id: Optional[str] = None) -> str:
+    """toon `encode(value)`, computed once per job and content.
+
+    Outside a job nothing would ever forget the memo, so the value is encoded
+    directly.
+    """
+    if job_id is None:
+        job_id, _ = current_run_context()
+    if not job_id:
+        return encode(value)
+    with _FRAGMENTS_LOCK:
+        fragments = _FRAGMENTS.get(job_id)
+        if fragments is None:
+            fragments = {}
+            _FRAGMENTS.set(job_id, fragments)
+    digest = _content_hash(value)
+    text = fragments.get(digest)
+    if text is not None:
+        PROMPT_FRAGMENT_REQUESTS.inc(result="hit")
+        return text
+    PROMPT_FRAGMENT_REQUESTS.inc(result="miss")
+    text = encode(value)
+    if len(fragments) < Config.PROMPT_FRAGMENT_CACHE_MAX_PER_JOB:
+        fragments[digest] = text
+    return text
+
+
+def forget_job(job_id: str) -> None:
+    """Drop the fragments of a finished job."""
+    _FRAGMENTS.pop(job_id)
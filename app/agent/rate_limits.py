@@ -0,0 +1,351 @@
+"""Rate limiting of LLM calls per provider and model.
+
+Each (provider, model) gets a limiter enforcing requests per minute, tokens
+per minute and a maximum number of requests in flight (see
+Config.LLM_RATE_LIMITS). Calls wait only while the model is out of capacity,
+so fan-outs such as section generation launch at once when there is room
+and back off together when concurrent jobs share a model.
+
+Requests and tokens are token buckets refilled continuously in this process.
+With LLM_RATE_LIMIT_SCOPE=cluster, rpm/tpm are additionally counted in
+one-minute windows shared through MongoDB so every worker draws from the
+same quota; in-flight limits always apply per process.
+
+Token use is estimated from the prompt before the call and corrected with
+the provider's reported usage afterwards when it is available.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from app.config import Config
+from app.db import get_llm_rate_collection
+from app.utils.metrics import histogram
+
+try:
+    from pymongo import ReturnDocument  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    ReturnDocument = None  # type: ignore
+
+RATE_LIMIT_WAIT_SECONDS = histogram(
+    "agent_llm_rate_limit_wait_seconds",
+    "Time LLM calls waited for rate-limit capacity.",
+    ("model",),
+)
+
+# Rough prompt-size heuristic used until the provider reports usage
+_CHARS_PER_TOKEN = 4
+# Longest single sleep while waiting, so freed capacity is noticed quickly
+_MAX_POLL_SECONDS = 0.25
+_MIN_POLL_SECONDS = 0.01
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    rpm: int = 0  # 0 = unlimited
+    tpm: int = 0
+    max_in_flight: int = 0
+
+
+def _parse_limits(spec: str) -> RateLimits:
+    values: dict[str, int] = {}
+    for part in spec.split(","):
+        name, _, value = part.partition(":")
+        try:
+            values[name.strip().lower()] = max(int(value), 0)
+        except ValueError:
+            continue
+    return RateLimits(
+        rpm=values.get("rpm", 0),
+        tpm=values.get("tpm", 0),
+        max_in_flight=values.get("inflight", Config.LLM_DEFAULT_MAX_IN_FLIGHT),
+    )
+
+
+def get_rate_limit_rules() -> dict[str, RateLimits]:
+    """Parse Config.LLM_RATE_LIMITS ("provider/model=rpm:N,tpm:N,inflight:N;...")."""
+    rules: dict[str, RateLimits] = {}
+    for entry in Config.LLM_RATE_LIMITS.split(";"):
+        key, _, spec = entry.partition("=")
+        if key.strip() and spec.strip():
+            rules[key.strip()] = _parse_limits(spec)
+    return rules
+
+
+def limits_for(provider: str, model: str) -> RateLimits:
+    rules = get_rate_limit_rules()
+    model = model.removeprefix("models/")
+    for key in (f"{provider}/{model}", f"{provider}/*", "*/*"):
+        if key in rules:
+            return rules[key]
+    return RateLimits(max_in_flight=Config.LLM_DEFAULT_MAX_IN_FLIGHT)
+
+
+def estimate_tokens(messages: Any) -> int:
+    """Approximate prompt tokens of a prompt string or message list."""
+    if isinstance(messages, str):
+        return max(len(messages) // _CHARS_PER_TOKEN, 1)
+    total = 0
+    for message in messages if isinstance(messages, Sequence) else [messages]:
+        content = getattr(message, "content", message)
+        total += len(content if isinstance(content, str) else str(content))
+    return max(total // _CHARS_PER_TOKEN, 1)
+
+
+class _TokenBucket:
+    """`capacity` units refilled at `capacity` per minute."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = float(capacity)
+        self.rate = capacity / 60.0
+        self.level = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        # A request larger than the whole bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class _ClusterWindow:
+    """rpm/tpm counted per minute in MongoDB, shared by every worker."""
+
+    def __init__(self, collection, key: str, limits: RateLimits) -> None:
+        self.collection = collection
+        self.key = key
+        self.limits = limits
+
+    def try_take(self, tokens: int) -> tuple[Optional[str], float]:
+        """
+        Count one request of `tokens` in the current window.
+
+        Returns:
+            (window_id, 0) when admitted, (None, seconds to wait) otherwise.
+        """
+        now = time.time()
+        window_start = math.floor(now / 60) * 60
+        window_id = f"{self.key}:{int(window_start)}"
+        doc = self.collection.find_one_and_update(
+            {"_id": window_id},
+            {
+                "$inc": {"requests": 1, "tokens": tokens},
+                "$setOnInsert": {
+                    "expires_at": datetime.utcnow() + timedelta(minutes=5)
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        over_rpm = self.limits.rpm and doc["requests"] > self.limits.rpm
+        # The first request of a window is always admitted, even if large
+        over_tpm = (
+            self.limits.tpm and doc["requests"] > 1 and doc["tokens"] > self.limits.tpm
+        )
+        if not (over_rpm or over_tpm):
+            return window_id, 0.0
+        self.collection.update_one(
+            {"_id": window_id}, {"$inc": {"requests": -1, "tokens": -tokens}}
+        )
+        # Spread retries so waiting workers don't stampede the next window
+        return None, window_start + 60 - now + random.uniform(0, 1)
+
+    def adjust(self, window_id: str, delta_tokens: int) -> None:
+        if delta_tokens:
+            self.collection.update_one(
+                {"_id": window_id}, {"$inc": {"tokens": delta_tokens}}
+            )
+
+
+class Reservation:
+    """Capacity held by one LLM call; set `tokens_used` once usage is known."""
+
+    def __init__(self, limiter: "RateLimiter", estimated_tokens: int) -> None:
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.tokens_used: Optional[int] = None
+        self.window_id: Optional[str] = None
+
+
+class RateLimiter:
+    """Requests/min, tokens/min and in-flight limits of one provider model."""
+
+    def __init__(self, key: str, limits: RateLimits, cluster=None) -> None:
+        self.key = key
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._requests = _TokenBucket(limits.rpm) if limits.rpm else None
+        self._tokens = _TokenBucket(limits.tpm) if limits.tpm else None
+        self._in_flight = 0
+        self._cluster: Optional[_ClusterWindow] = (
+            _ClusterWindow(cluster, key, limits)
+            if cluster is not None and (limits.rpm or limits.tpm)
+            else None
+        )
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take capacity for one call; returns 0 or the seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            waits = [0.0]
+            if (
+                self.limits.max_in_flight
+                and self._in_flight >= self.limits.max_in_flight
+            ):
+                waits.append(_MAX_POLL_SECONDS)
+            if self._requests is not None:
+                self._requests.refill(now)
+                waits.append(self._requests.wait_for(1))
+            if self._tokens is not None:
+                self._tokens.refill(now)
+                waits.append(self._tokens.wait_for(tokens))
+            wait = max(waits)
+            if wait > 0:
+                return wait
+            if self._requests is not None:
+                self._requests.level -= 1
+            if self._tokens is not None:
+                self._tokens.level -= min(tokens, self._tokens.capacity)
+            self._in_flight += 1
+            return 0.0
+
+    def _take_cluster(self, reservation: Reservation) -> float:
+        if self._cluster is None:
+            return 0.0
+        window_id, wait = self._cluster.try_take(reservation.estimated_tokens)
+        reservation.window_id = window_id
+        return wait
+
+    def _undo_local(self, tokens: int) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if self._requests is not None:
+                self._requests.level += 1
+            if self._tokens is not None:
+                self._tokens.level += min(tokens, self._tokens.capacity)
+
+    def _release(self, reservation: Reservation) -> None:
+        delta = 0
+        if reservation.tokens_used is not None:
+            delta = reservation.tokens_used - reservation.estimated_tokens
+        with self._lock:
+            self._in_flight -= 1
+            if self._tokens is not None:
+                # Going negative is fine: later calls wait off the debt
+                self._tokens.level -= delta
+        if self._cluster is not None and reservation.window_id:
+            try:
+                self._cluster.adjust(reservation.window_id, delta)
+            except Exception as e:
+                print(f"[LLM_RATE] Warning: failed to record token usage: {e}")
+
+    def _acquire_step(self, reservation: Reservation) -> float:
+        """One attempt to take capacity; returns 0 or how long to sleep."""
+        wait = self._try_acquire(reservation.estimated_tokens)
+        if wait > 0:
+            # Local capacity frees up as calls finish; re-check often
+            return min(max(wait, _MIN_POLL_SECONDS), _MAX_POLL_SECONDS)
+        try:
+            wait = self._take_cluster(reservation)
+        except Exception as e:
+            # A Mongo hiccup shouldn't stop LLM calls; fall back to local limits
+            print(f"[LLM_RATE] Warning: cluster rate window unavailable: {e}")
+            wait = 0.0
+        if wait > 0:
+            self._undo_local(reservation.estimated_tokens)
+        return wait
+
+    async def _acquire_step_in_thread(self, reservation: Reservation) -> float:
+        step = asyncio.ensure_future(asyncio.to_thread(self._acquire_step, reservation))
+        try:
+            return await asyncio.shield(step)
+        except asyncio.CancelledError:
+            # The step still completes in its thread; give back what it took
+            def _release_taken(done: asyncio.Future) -> None:
+                if not done.cancelled() and done.exception() is None:
+                    if done.result() <= 0:
+                        self._release(reservation)
+
+            step.add_done_callback(_release_taken)
+            raise
+
+    async def acquire(self, estimated_tokens: int) -> Reservation:
+        reservation = Reservation(self, estimated_tokens)
+        started = time.perf_counter()
+        while True:
+            if self._cluster is not None:
+                wait = await self._acquire_step_in_thread(reservation)
+            else:
+                wait = self._acquire_step(reservation)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(time.perf_counter() - started, model=self.key)
+        return reservation
+
+    def acquire_sync(self, estimated_tokens: int) -> Reservation:
+        reservation = Reservation(self, estimated_tokens)
+        started = time.perf_counter()
+        while True:
+            wait = self._acquire_step(reservation)
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(time.perf_counter() - started, model=self.key)
+        return reservation
+
+    def release(self, reservation: Reservation) -> None:
+        self._release(reservation)
+
+    @asynccontextmanager
+    async def limit(self, estimated_tokens: int) -> AsyncIterator[Reservation]:
+        """Hold capacity for one call for the duration of the block."""
+        reservation = await self.acquire(estimated_tokens)
+        try:
+            yield reservation
+        finally:
+            self.release(reservation)
+
+    @contextmanager
+    def limit_sync(self, estimated_tokens: int) -> Iterator[Reservation]:
+        reservation = self.acquire_sync(estimated_tokens)
+        try:
+            yield reservation
+        finally:
+            self.release(reservation)
+
+
+_LIMITERS: dict[str, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """Process-wide limiter for `provider`/`model`."""
+    key = f"{provider}/{model.removeprefix('models/')}"
+    limiter = _LIMITERS.get(key)
+    if limiter is not None:
+        return limiter
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(key)
+        if limiter is None:
+            cluster = None
+            if Config.LLM_RATE_LIMIT_SCOPE == "cluster" and ReturnDocument is not None:
+                cluster = get_llm_rate_collection()
+            limiter = RateLimiter(key, limits_for(provider, model), cluster)
+            _LIMITERS[key] = limiter
+    return limiter
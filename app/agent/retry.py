@@ -0,0 +1,144 @@
+"""Retry, timeout and hedging helpers for LLM calls.
+
+- RetryPolicy / retry_async: bounded attempts with a per-attempt timeout and
+  exponential backoff with full jitter between attempts.
+- LatencyTracker: rolling latency samples per model, used to find the p95.
+  LLM_LATENCY is fed with Gemini provider request times by app/agent/llm.py.
+- hedged: run a primary call and, if it is still running after a hedge
+  delay (typically the primary's p95), start a fallback and take whichever
+  succeeds first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int
+    base_delay: float = 1.0
+    max_delay: float = 20.0
+    # Seconds one attempt may take before it is abandoned (0 = no limit)
+    attempt_timeout: float = 0.0
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retrying after failed attempt `attempt`."""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, max(ceiling, 0.0))
+
+
+async def retry_async(
+    call: Callable[[int], Awaitable[T]],
+    policy: RetryPolicy,
+    *,
+    label: str,
+) -> T:
+    """
+    Run `call(attempt)` until it succeeds or the policy's attempts run out.
+
+    Raises:
+        The last attempt's exception (asyncio.TimeoutError for a timeout).
+    """
+    last_exc: Optional[BaseException] = None
+    for attempt in range(1, max(policy.attempts, 1) + 1):
+        try:
+            if policy.attempt_timeout > 0:
+                return await asyncio.wait_for(call(attempt), policy.attempt_timeout)
+            return await call(attempt)
+        except asyncio.TimeoutError as exc:
+            last_exc = exc
+            print(
+                f"[RETRY] {label}: attempt {attempt} timed out after "
+                f"{policy.attempt_timeout:g}s"
+            )
+        except Exception as exc:
+            last_exc = exc
+            print(f"[RETRY] {label}: attempt {attempt} failed: {exc}")
+        if attempt < policy.attempts:
+            await asyncio.sleep(policy.backoff(attempt))
+    assert last_exc is not None
+    raise last_exc
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per key."""
+
+    def __init__(self, window: int = 200) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.setdefault(key, deque(maxlen=self.window))
+            samples.append(seconds)
+
+    def percentile(
+        self, key: str, quantile: float, *, min_samples: int = 1
+    ) -> Optional[float]:
+        """Nearest-rank percentile, or None with fewer than `min_samples`."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        rank = max(math.ceil(quantile * len(samples)) - 1, 0)
+        return samples[rank]
+
+
+LLM_LATENCY = LatencyTracker()
+
+
+async def hedged(
+    primary: Callable[[], Awaitable[T]],
+    fallback: Callable[[], Awaitable[T]],
+    *,
+    hedge_after: Optional[float],
+    label: str,
+) -> T:
+    """
+    Return the first successful result of `primary` and a hedged `fallback`.
+
+    The fallback starts when the primary fails, or when it is still running
+    after `hedge_after` seconds (None = only on failure). The loser is
+    cancelled.
+
+    Raises:
+        The fallback's exception when both fail.
+    """
+    primary_task = asyncio.ensure_future(primary())
+    fallback_task: Optional[asyncio.Future] = None
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=hedge_after)
+        if done and not primary_task.exception():
+            return primary_task.result()
+        if not done:
+            print(
+                f"[HEDGE] {label}: primary still running after {hedge_after:.1f}s; "
+                "starting fallback"
+            )
+        fallback_task = asyncio.ensure_future(fallback())
+
+        pending = {fallback_task} if done else {primary_task, fallback_task}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if not task.exception():
+                    return task.result()
+        # Both failed: surface the fallback's error (the primary's is logged)
+        print(f"[HEDGE] {label}: primary failed: {primary_task.exception()}")
+        raise fallback_task.exception()  # type: ignore[misc]
+    finally:
+        for task in (primary_task, fallback_task):
+            if task is not None and not task.done():
+                task.cancel()
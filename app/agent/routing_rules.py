@@ -0,0 +1,176 @@
+"""Deterministic routing tier that runs before the router's LLM call.
+
+Follow-up messages are matched against, in order:
+
+1. rules   - explicit commands the router prompt already routes by rule
+             ("Deploy the landing page" -> deploy) and declarative bug
+             reports ("the form is broken" -> code);
+2. heuristics - plain edit instructions ("make the hero darker", "could you
+             add a FAQ") -> code as a follow-up;
+3. cache   - the decision the LLM made for the same message earlier in the
+             session.
+
+Questions ("how does the pricing work?", "what happens if the payment
+fails?") never match a rule or heuristic: they may only need an answer, so
+they are left to the cache and the LLM. Only messages none of these settle go
+to the LLM. Every decision carries its source so it can be logged and counted.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+
+from app.config import Config
+from app.utils.metrics import counter
+from app.utils.ttl_cache import TTLCache
+
+ROUTER_DECISIONS = counter(
+    "agent_router_decisions_total",
+    "Router decisions by source (state, rule, heuristic, cache, llm).",
+    ("source", "next_node"),
+)
+
+# Prepended to follow-up messages by the chat endpoints
+_FOLLOWUP_PREFIX = re.compile(
+    r"^\s*this is a follow-up request:\s*user prompt:\s*", re.IGNORECASE
+)
+_DEPLOY_COMMAND = re.compile(
+    r"^(please\s+)?(deploy|redeploy|re-deploy|publish)\b"
+    r"(\s+(it|this|the|my|landing|page|site|website|now|again|please|to|vercel|production|prod))*"
+    r"\s*[.!]*$"
+)
+_ERROR_REPORT = re.compile(
+    r"\b(error|errors|bug|bugs|broken|crash|crashes|crashed|exception|traceback"
+    r"|stack trace|not working|doesn'?t work|does not work|isn'?t working"
+    r"|fails|failing|failed to|blank page|white screen|typeerror|referenceerror"
+    r"|syntaxerror|module not found|cannot find module|is not defined)\b"
+)
+_QUESTION_START = re.compile(
+    r"^(what|why|how|when|where|who|which|whose|is|are|am|was|were|do|does|did"
+    r"|can i|can we|should|shall|would it|will it|what if|if|in case)\b"
+)
+_POLITE_PREFIX = re.compile(
+    r"^((please|pls|ok|okay|now|also|and|then|great|thanks|thank you)[,!.]?\s+"
+    r"|(can|could|would|will) you\s+(please\s+)?"
+    r"|i(?:'d| would) like (you )?to\s+|i want (you )?to\s+|let'?s\s+)+"
+)
+_EDIT_VERBS = {
+    "add",
+    "adjust",
+    "align",
+    "center",
+    "change",
+    "delete",
+    "drop",
+    "enlarge",
+    "fix",
+    "hide",
+    "include",
+    "increase",
+    "decrease",
+    "insert",
+    "make",
+    "move",
+    "put",
+    "reduce",
+    "remove",
+    "rename",
+    "reorder",
+    "replace",
+    "resize",
+    "rewrite",
+    "set",
+    "shorten",
+    "swap",
+    "switch",
+    "tweak",
+    "update",
+}
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    next_node: str
+    is_followup: bool
+    reasoning: str
+    source: str  # "state", "rule", "heuristic", "cache" or "llm"
+
+
+_DECISIONS: TTLCache[str, RouteDecision] = TTLCache(
+    max_entries=Config.ROUTER_DECISION_CACHE_SIZE,
+    ttl_seconds=Config.ROUTER_DECISION_CACHE_TTL_SECONDS,
+)
+
+
+def latest_user_request(messages: Sequence[Any]) -> str:
+    """Text of the newest human message, without the follow-up preamble."""
+    for message in reversed(messages):
+        if getattr(message, "type", None) != "human":
+            continue
+        content = getattr(message, "content", "")
+        if isinstance(content, list):
+            content = " ".join(
+                part.get("text", "") if isinstance(part, dict) else str(part)
+                for part in content
+            )
+        return _FOLLOWUP_PREFIX.sub("", str(content)).strip()
+    return ""
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def _cache_key(session_id: str, text: str) -> str:
+    digest = hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+    return f"{session_id}:{digest}"
+
+
+def _is_question(normalized: str) -> bool:
+    return normalized.endswith("?") or bool(_QUESTION_START.match(normalized))
+
+
+def is_deploy_command(text: str) -> bool:
+    """True when the message only asks to (re)deploy the current site."""
+    normalized = _normalize(_FOLLOWUP_PREFIX.sub("", text))
+    return normalized.startswith("deploy the landing page") or bool(
+        _DEPLOY_COMMAND.match(normalized)
+    )
+
+
+def decide_without_llm(session_id: str, text: str) -> Optional[RouteDecision]:
+    """Decision from rules, heuristics or the session cache; None if ambiguous."""
+    normalized = _normalize(text)
+    if not normalized:
+        return None
+
+    if is_deploy_command(normalized):
+        return RouteDecision("deploy", False, "Explicit deploy command.", "rule")
+    if not _is_question(normalized):
+        if _ERROR_REPORT.search(normalized):
+            return RouteDecision(
+                "code", True, "Message reports an error or bug.", "rule"
+            )
+
+        command = _POLITE_PREFIX.sub("", normalized)
+        first_word = re.split(r"[\s,.:;!?]+", command, maxsplit=1)[0]
+        if first_word in _EDIT_VERBS:
+            return RouteDecision(
+                "code", True, f"Edit instruction ('{first_word} ...').", "heuristic"
+            )
+
+    cached = _DECISIONS.get(_cache_key(session_id, text))
+    if cached is not None:
+        return RouteDecision(
+            cached.next_node, cached.is_followup, cached.reasoning, "cache"
+        )
+    return None
+
+
+def remember_decision(session_id: str, text: str, decision: RouteDecision) -> None:
+    """Cache an LLM decision for repeats of `text` in the session."""
+    if text.strip():
+        _DECISIONS.set(_cache_key(session_id, text), decision)
@@ -33,6 +33,10 @@ class BuilderState(BaseModel):
         default=False,
         description="Indicates whether the latest user message is a follow-up request.",
     )
+    router_decision_source: Annotated[str, replace] = Field(
+        default="",
+        description="How the router decided: state, rule, heuristic, cache or llm.",
+    )
 
     # 🧰 Diff / change tracking (used by Coder Agent)
     lines_added: Annotated[int, replace]
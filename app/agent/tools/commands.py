@@ -6,6 +6,7 @@ to stream logs line-by-line for better observability.
 """
 
 import subprocess
+import time
 from pathlib import Path
 import os
 from typing import Annotated, Sequence
@@ -13,6 +14,8 @@ from typing import Annotated, Sequence
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import InjectedToolArg, tool
 
+from app.utils.metrics import SUBPROCESS_SECONDS
+
 
 def _get_session_from_config(config: RunnableConfig) -> str:
     """Extract session_id from config."""
@@ -47,6 +50,8 @@ def _run_with_live_logs(
         print(f"[{label}] ERROR: Failed to start process: {e}")
         raise
     lines: list[str] = []
+    started = time.perf_counter()
+    outcome = "ok"
     try:
         for line in process.stdout:  # type: ignore[attr-defined]
             if line is None:
@@ -60,9 +65,15 @@ def _run_with_live_logs(
         process.kill()
         print(f"[{label}] ERROR: Timeout after {timeout}s; process killed")
         ret_code = -1
+        outcome = "timeout"
     except Exception as e:
         print(f"[{label}] ERROR: Exception while streaming: {e}")
         ret_code = -1
+    if outcome == "ok" and ret_code != 0:
+        outcome = "error"
+    SUBPROCESS_SECONDS.observe(
+        time.perf_counter() - started, command=label, outcome=outcome
+    )
     stdout_all = "".join(lines)
     return subprocess.CompletedProcess(cmd, ret_code, stdout_all, None)
 
@@ -45,6 +45,9 @@ class Config:
         "MONGODB_LANDING_PAGES_COLLECTION", "landing_pages"
     )
     MONGODB_JOBS_COLLECTION = os.getenv("MONGODB_JOBS_COLLECTION", "jobs")
+    MONGODB_JOB_EVENTS_COLLECTION = os.getenv(
+        "MONGODB_JOB_EVENTS_COLLECTION", "job_events"
+    )
 
     # JWT settings
     JWT_SECRET_KEY = os.getenv(
@@ -55,3 +58,219 @@ class Config:
     JWT_REFRESH_TOKEN_EXPIRE_DAYS = int(
         os.getenv("JWT_REFRESH_TOKEN_EXPIRE_DAYS", "45")
     )
+
+    # Job queue / worker settings
+    # Backend for the durable job queue: "mongo", "sqlite", "memory" or "" (auto:
+    # Mongo when reachable, otherwise in-memory).
+    JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "").lower()
+    MONGODB_JOB_QUEUE_COLLECTION = os.getenv(
+        "MONGODB_JOB_QUEUE_COLLECTION", "job_queue"
+    )
+    JOB_QUEUE_SQLITE_PATH = os.getenv(
+        "JOB_QUEUE_SQLITE_PATH", os.path.join(OUTPUT_PATH, "job_queue.sqlite3")
+    )
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+    JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+    # A RUNNING job whose heartbeat is older than this is treated as orphaned
+    # and resumed from its checkpoint by the startup reconciler.
+    JOB_STALE_HEARTBEAT_SECONDS = int(
+        os.getenv("JOB_STALE_HEARTBEAT_SECONDS", str(JOB_LEASE_SECONDS))
+    )
+    JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+    JOB_WORKER_POLL_SECONDS = float(os.getenv("JOB_WORKER_POLL_SECONDS", "1.0"))
+    # Weighted-fair shares of worker capacity per priority class
+    # (interactive chat, init builds, deploys, background regeneration).
+    JOB_PRIORITY_WEIGHTS = os.getenv(
+        "JOB_PRIORITY_WEIGHTS", "interactive=8,init=3,deploy=2"
+    )
+    # Starvation protection: a job waiting longer than this is claimed next
+    # whatever its class (0 disables aging).
+    JOB_PRIORITY_MAX_WAIT_SECONDS = int(
+        os.getenv("JOB_PRIORITY_MAX_WAIT_SECONDS", "120")
+    )
+    # Run a worker loop inside the API process (needed for the in-memory backend).
+    JOB_WORKER_EMBEDDED = os.getenv(
+        "JOB_WORKER_EMBEDDED", "1" if ENV == "local" else "0"
+    ).lower() in {"1", "true", "yes"}
+
+    # Per-session execution lease (one graph run per session at a time)
+    MONGODB_SESSION_LEASES_COLLECTION = os.getenv(
+        "MONGODB_SESSION_LEASES_COLLECTION", "session_leases"
+    )
+    # What /chat and /init do when the session already has an active job:
+    # "queue" (wait behind it) or "reject" (HTTP 409 with the active job id).
+    SESSION_CONFLICT_POLICY = os.getenv("SESSION_CONFLICT_POLICY", "queue").lower()
+    SESSION_BUSY_RETRY_SECONDS = float(os.getenv("SESSION_BUSY_RETRY_SECONDS", "5"))
+
+    # Admission control: graph runs allowed at once across every worker
+    # (0 = only the per-worker JOB_WORKER_CONCURRENCY limit applies).
+    JOB_MAX_ACTIVE_RUNS = int(os.getenv("JOB_MAX_ACTIVE_RUNS", "8"))
+    MONGODB_RUN_SLOTS_COLLECTION = os.getenv(
+        "MONGODB_RUN_SLOTS_COLLECTION", "run_slots"
+    )
+    # Fallback run time used for queue ETAs until enough jobs have finished
+    JOB_ESTIMATED_RUN_SECONDS = int(os.getenv("JOB_ESTIMATED_RUN_SECONDS", "180"))
+
+    # Buffered job-event writes: flush after this many events or seconds
+    JOB_EVENT_FLUSH_SIZE = int(os.getenv("JOB_EVENT_FLUSH_SIZE", "50"))
+    JOB_EVENT_FLUSH_SECONDS = float(os.getenv("JOB_EVENT_FLUSH_SECONDS", "0.5"))
+    JOB_EVENT_BUFFER_MAX = int(os.getenv("JOB_EVENT_BUFFER_MAX", "10000"))
+
+    # Final agent message per job: in-process cache bounds (the job document
+    # holds the shared copy)
+    LAST_AGENT_MESSAGE_CACHE_SIZE = int(
+        os.getenv("LAST_AGENT_MESSAGE_CACHE_SIZE", "1000")
+    )
+    LAST_AGENT_MESSAGE_TTL_SECONDS = float(
+        os.getenv("LAST_AGENT_MESSAGE_TTL_SECONDS", "3600")
+    )
+
+    # Port for the standalone worker's /metrics endpoint (0 disables it; the
+    # API serves /metrics itself)
+    WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+    # LLM clients (app/agent/llm.py): per-request timeout in seconds (0 = SDK
+    # default) and SDK-level retries (unset = SDK default)
+    LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "600"))
+    LLM_MAX_RETRIES = (
+        int(os.getenv("LLM_MAX_RETRIES")) if os.getenv("LLM_MAX_RETRIES") else None
+    )
+
+    # LLM rate limits per provider/model:
+    # "google/gemini-3-pro-preview=rpm:60,tpm:2000000,inflight:8;openai/*=rpm:500"
+    # Unlisted limits are unlimited except in-flight (LLM_DEFAULT_MAX_IN_FLIGHT).
+    LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+    LLM_DEFAULT_MAX_IN_FLIGHT = int(os.getenv("LLM_DEFAULT_MAX_IN_FLIGHT", "16"))
+    # "process" or "cluster" (rpm/tpm shared through MongoDB; in-flight stays
+    # per process)
+    LLM_RATE_LIMIT_SCOPE = os.getenv("LLM_RATE_LIMIT_SCOPE", "process").lower()
+    MONGODB_LLM_RATE_COLLECTION = os.getenv(
+        "MONGODB_LLM_RATE_COLLECTION", "llm_rate_windows"
+    )
+
+    # Offline LLM provider for benchmarks: "live", "record" (also write
+    # responses to fixtures) or "replay" (fixtures only, no network), with a
+    # synthetic latency of "recorded", "none", "fixed:S", "uniform:A,B" or
+    # "lognormal:MEDIAN,SIGMA" seconds
+    LLM_PROVIDER_MODE = os.getenv("LLM_PROVIDER_MODE", "live").lower()
+    LLM_FIXTURES_DIR = os.getenv("LLM_FIXTURES_DIR", "fixtures/llm")
+    LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "recorded").lower()
+    LLM_REPLAY_LATENCY_SCALE = float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0"))
+    LLM_REPLAY_SEED = int(os.getenv("LLM_REPLAY_SEED", "0"))
+
+    # Structured LLM response cache: mode "off", "on" or "replay" (read only,
+    # misses raise); backend "memory", "disk" or "mongo"; nodes whose calls are
+    # cached ("*" = all); entry TTL in seconds (0 = never expires)
+    LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off").lower()
+    LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+    LLM_CACHE_NODES = os.getenv(
+        "LLM_CACHE_NODES", "router,design_planner,generate_section"
+    )
+    LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "604800"))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+    LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+    MONGODB_LLM_CACHE_COLLECTION = os.getenv(
+        "MONGODB_LLM_CACHE_COLLECTION", "llm_cache"
+    )
+
+    # Gemini context caching of static prompt prefixes (section generator and
+    # design planner prompts); prefixes below the minimum size are sent inline
+    GEMINI_CONTEXT_CACHE_ENABLED = os.getenv(
+        "GEMINI_CONTEXT_CACHE_ENABLED", "1"
+    ).lower() in {"1", "true", "yes"}
+    GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(
+        os.getenv("GEMINI_CONTEXT_CACHE_TTL_SECONDS", "3600")
+    )
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(
+        os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096")
+    )
+
+    # LLM prices for job cost accounting, USD per million tokens:
+    # "gemini-3-pro-preview=in:2,out:12,cached:0.2;gpt-5=in:1.25,out:10"
+    LLM_PRICING = os.getenv("LLM_PRICING", "")
+
+    # Router: settle clear follow-ups (deploy commands, bug reports, edit
+    # instructions, repeats) without an LLM call; LLM decisions are cached per
+    # session and message
+    ROUTER_FAST_PATH_ENABLED = os.getenv(
+        "ROUTER_FAST_PATH_ENABLED", "1"
+    ).lower() in {"1", "true", "yes"}
+    ROUTER_DECISION_CACHE_SIZE = int(os.getenv("ROUTER_DECISION_CACHE_SIZE", "2000"))
+    ROUTER_DECISION_CACHE_TTL_SECONDS = float(
+        os.getenv("ROUTER_DECISION_CACHE_TTL_SECONDS", "3600")
+    )
+
+    # Conversation history sent to the LLM nodes: per-node token budgets
+    # ("node=tokens,..."; others use the default). Older turns beyond the
+    # budget are summarized, and tool results of earlier turns of at least
+    # HISTORY_STUB_MIN_CHARS are replaced by stubs, also in the checkpoint.
+    HISTORY_COMPACTION_ENABLED = os.getenv(
+        "HISTORY_COMPACTION_ENABLED", "1"
+    ).lower() in {"1", "true", "yes"}
+    HISTORY_TOKEN_BUDGETS = os.getenv(
+        "HISTORY_TOKEN_BUDGETS",
+        "router=4000,clarify=16000,design_planner=16000,"
+        "followup_codegen=48000,fix_errors=32000",
+    )
+    HISTORY_DEFAULT_TOKEN_BUDGET = int(
+        os.getenv("HISTORY_DEFAULT_TOKEN_BUDGET", "32000")
+    )
+    HISTORY_STUB_MIN_CHARS = int(os.getenv("HISTORY_STUB_MIN_CHARS", "800"))
+
+    # Per-job memo of toon-encoded prompt fragments (guidelines, payload,
+    # reference examples) shared by the section fan-out
+    PROMPT_FRAGMENT_CACHE_JOBS = int(os.getenv("PROMPT_FRAGMENT_CACHE_JOBS", "200"))
+    PROMPT_FRAGMENT_CACHE_MAX_PER_JOB = int(
+        os.getenv("PROMPT_FRAGMENT_CACHE_MAX_PER_JOB", "256")
+    )
+    PROMPT_FRAGMENT_CACHE_TTL_SECONDS = float(
+        os.getenv("PROMPT_FRAGMENT_CACHE_TTL_SECONDS", "3600")
+    )
+
+    # Section generation: attempts per model, backoff between attempts,
+    # per-attempt timeout (0 = none) and hedging of slow Gemini calls with the
+    # GPT-5 fallback once they exceed Gemini's observed p95 latency.
+    SECTION_PRIMARY_ATTEMPTS = int(os.getenv("SECTION_PRIMARY_ATTEMPTS", "3"))
+    SECTION_FALLBACK_ATTEMPTS = int(os.getenv("SECTION_FALLBACK_ATTEMPTS", "6"))
+    SECTION_ATTEMPT_TIMEOUT_SECONDS = float(
+        os.getenv("SECTION_ATTEMPT_TIMEOUT_SECONDS", "300")
+    )
+    # Stream Gemini section code and emit section_progress job events (at
+    # most one per section per interval, with the last lines as a preview)
+    SECTION_STREAMING_ENABLED = os.getenv(
+        "SECTION_STREAMING_ENABLED", "1"
+    ).lower() in {"1", "true", "yes"}
+    SECTION_PROGRESS_INTERVAL_SECONDS = float(
+        os.getenv("SECTION_PROGRESS_INTERVAL_SECONDS", "3")
+    )
+    SECTION_PROGRESS_PREVIEW_LINES = int(
+        os.getenv("SECTION_PROGRESS_PREVIEW_LINES", "12")
+    )
+    LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1.0"))
+    LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "20"))
+    SECTION_HEDGE_ENABLED = os.getenv("SECTION_HEDGE_ENABLED", "1").lower() in {
+        "1",
+        "true",
+        "yes",
+    }
+    SECTION_HEDGE_QUANTILE = float(os.getenv("SECTION_HEDGE_QUANTILE", "0.95"))
+    # Samples needed before hedging kicks in (until then only failures hedge)
+    SECTION_HEDGE_MIN_SAMPLES = int(os.getenv("SECTION_HEDGE_MIN_SAMPLES", "5"))
+
+    # Job progress SSE: catch-up poll interval when Mongo change streams are
+    # unavailable, and keepalive interval for idle streams.
+    JOB_STREAM_POLL_SECONDS = float(os.getenv("JOB_STREAM_POLL_SECONDS", "1.0"))
+    JOB_STREAM_KEEPALIVE_SECONDS = float(
+        os.getenv("JOB_STREAM_KEEPALIVE_SECONDS", "15")
+    )
+    JOB_STREAM_CHANGE_STREAMS = os.getenv(
+        "JOB_STREAM_CHANGE_STREAMS", "1"
+    ).lower() in {"1", "true", "yes"}
+
+    # How often a worker checks Mongo for cancel requests on the jobs it runs
+    JOB_CANCEL_POLL_SECONDS = float(os.getenv("JOB_CANCEL_POLL_SECONDS", "2"))
+    # Grace period between SIGTERM and SIGKILL for a cancelled job's subprocesses
+    JOB_CANCEL_KILL_GRACE_SECONDS = float(
+        os.getenv("JOB_CANCEL_KILL_GRACE_SECONDS", "5")
+    )
@@ -6,6 +6,8 @@ from typing import Optional
 
 from langgraph.checkpoint.memory import MemorySaver
 
+from app.utils.metrics import MongoCommandMetrics
+
 try:
     from pymongo import MongoClient  # type: ignore
     from langgraph.checkpoint.mongodb import MongoDBSaver  # type: ignore
@@ -40,6 +42,9 @@ def get_mongo_client() -> Optional["MongoClient"]:
             serverSelectionTimeoutMS=int(
                 os.getenv("MONGODB_SELECT_TIMEOUT_MS", "3000")
             ),
+            event_listeners=(
+                [MongoCommandMetrics()] if MongoCommandMetrics is not None else []
+            ),
         )
         # Optional connectivity check (can be disabled)
         if (
@@ -162,3 +167,81 @@ def get_jobs_collection():
     if db is None:
         return None
     return db[Config.MONGODB_JOBS_COLLECTION]
+
+
+def get_job_events_collection():
+    """
+    Get the append-only job events collection from MongoDB.
+    Returns None if MongoDB is not available.
+    """
+    from app.config import Config
+
+    db = get_database()
+    if db is None:
+        return None
+    return db[Config.MONGODB_JOB_EVENTS_COLLECTION]
+
+
+def get_job_queue_collection():
+    """
+    Get the durable job queue collection from MongoDB.
+    Returns None if MongoDB is not available.
+    """
+    from app.config import Config
+
+    db = get_database()
+    if db is None:
+        return None
+    return db[Config.MONGODB_JOB_QUEUE_COLLECTION]
+
+
+def get_session_leases_collection():
+    """
+    Get the per-session execution lease collection from MongoDB.
+    Returns None if MongoDB is not available.
+    """
+    from app.config import Config
+
+    db = get_database()
+    if db is None:
+        return None
+    return db[Config.MONGODB_SESSION_LEASES_COLLECTION]
+
+
+def get_run_slots_collection():
+    """
+    Get the cluster-wide graph run slot collection from MongoDB.
+    Returns None if MongoDB is not available.
+    """
+    from app.config import Config
+
+    db = get_database()
+    if db is None:
+        return None
+    return db[Config.MONGODB_RUN_SLOTS_COLLECTION]
+
+
+def get_llm_cache_collection():
+    """
+    Get the LLM response cache collection from MongoDB.
+    Returns None if MongoDB is not available.
+    """
+    from app.config import Config
+
+    db = get_database()
+    if db is None:
+        return None
+    return db[Config.MONGODB_LLM_CACHE_COLLECTION]
+
+
+def get_llm_rate_collection():
+    """
+    Get the shared LLM rate-limit window collection from MongoDB.
+    Returns None if MongoDB is not available.
+    """
+    from app.config import Config
+
+    db = get_database()
+    if db is None:
+        return None
+    return db[Config.MONGODB_LLM_RATE_COLLECTION]
@@ -1,6 +1,6 @@
 import logging
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from app.routers import agent as agent_router
 from app.routers import uploads as uploads_router
 from app.routers import files as files_router
@@ -69,9 +69,96 @@ async def startup_event():
         except Exception as e:
             logger.warning(f"⚠️ Failed to create landing pages indexes: {e}")
 
+    # Create MongoDB indexes for the jobs collection
+    from app.db import get_jobs_collection
+
+    jobs_collection = get_jobs_collection()
+    if jobs_collection is not None:
+        try:
+            # Serves the per-user job list sorted newest first (keyset on _id)
+            jobs_collection.create_index(
+                [("user_id", 1), ("created_at", -1), ("_id", -1)]
+            )
+            logger.info("✅ Jobs collection indexes created")
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to create jobs indexes: {e}")
+
+    # Create MongoDB indexes for the append-only job events collection
+    from app.db import get_job_events_collection
+
+    job_events_collection = get_job_events_collection()
+    if job_events_collection is not None:
+        try:
+            # Events are read per job in seq order (and after a given seq)
+            job_events_collection.create_index(
+                [("job_id", 1), ("seq", 1)], unique=True
+            )
+            logger.info("✅ Job events collection indexes created")
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to create job events indexes: {e}")
+
+    # Shared LLM rate-limit windows expire once they are a few minutes old
+    from app.db import get_llm_rate_collection
+
+    llm_rate_collection = get_llm_rate_collection()
+    if llm_rate_collection is not None:
+        try:
+            llm_rate_collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to create LLM rate window indexes: {e}")
+
+    # Cached LLM responses are dropped once they pass their expiry
+    from app.db import get_llm_cache_collection
+
+    llm_cache_collection = get_llm_cache_collection()
+    if llm_cache_collection is not None:
+        try:
+            llm_cache_collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to create LLM cache indexes: {e}")
+
+    # Prepare the durable job queue and, if configured, an in-process worker
+    from app.config import Config
+    from app.utils.job_queue import get_job_queue
+    from app.utils.metrics import JOB_QUEUE_DEPTH
+
+    job_queue = get_job_queue()
+    try:
+        job_queue.ensure_indexes()
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to create job queue indexes: {e}")
+    JOB_QUEUE_DEPTH.set_function(job_queue.depth)
+
+    if Config.JOB_WORKER_EMBEDDED:
+        from app.worker import start_embedded_worker
+
+        app.state.job_worker = start_embedded_worker()
+        logger.info("✅ Embedded job worker started")
+    elif job_queue.backend == "memory":
+        logger.warning(
+            "⚠️ In-memory job queue without an embedded worker; jobs will not run. "
+            "Set JOB_WORKER_EMBEDDED=1 or configure a shared queue backend."
+        )
+
     logger.info("✨ Application startup complete")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the embedded job worker (running jobs are drained)."""
+    worker = getattr(app.state, "job_worker", None)
+    if worker is not None:
+        worker.stop()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (values are per worker process)."""
+    from app.utils.metrics import CONTENT_TYPE, render_metrics
+
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
 app.include_router(auth_router.router, prefix="/v1/auth")
 app.include_router(landing_pages_router.router, prefix="/v1/landing-pages")
 app.include_router(agent_router.router, prefix="/v1/agent")
@@ -24,10 +24,30 @@ class JobType(str, Enum):
     CHAT = "chat"
 
 
+class JobPriority(str, Enum):
+    """Scheduling class of a queued job; each class gets a weighted share."""
+
+    INTERACTIVE = "interactive"
+    INIT = "init"
+    DEPLOY = "deploy"
+
+
+class JobQueueStatus(str, Enum):
+    """Lifecycle of a job entry inside the durable job queue."""
+
+    QUEUED = "queued"
+    LEASED = "leased"
+    DONE = "done"
+    FAILED = "failed"
+
+
 class JobEvent(BaseModel):
     """Single node execution event within a job."""
 
     id: str = Field(..., description="Unique event identifier (UUID).")
+    seq: Optional[int] = Field(
+        None, description="Position of the event within its job (1-based, increasing)."
+    )
     node: str = Field(..., description="Name of the graph node that produced this event.")
     timestamp: datetime = Field(..., description="When this event was recorded (UTC).")
     event_type: str = Field(
@@ -42,6 +62,54 @@ class JobEvent(BaseModel):
     )
 
 
+class LLMUsage(BaseModel):
+    """Token, latency and cost totals of a set of LLM calls."""
+
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    cached_tokens: int = Field(0, description="Input tokens served from a prompt cache.")
+    seconds: float = Field(0.0, description="Summed call latency.")
+    cost_usd: Optional[float] = Field(
+        None, description="Estimated cost; null when no model involved has a price."
+    )
+
+
+class LLMUsageEntry(LLMUsage):
+    """LLM usage of one graph node with one model."""
+
+    node: str
+    model: str
+
+
+class JobUsage(BaseModel):
+    """LLM usage of a job, in total and per node and model."""
+
+    totals: LLMUsage = Field(default_factory=LLMUsage)
+    by_node: List[LLMUsageEntry] = Field(default_factory=list)
+
+
+class ModelUsageSummary(BaseModel):
+    """Aggregated usage of one model across recent jobs."""
+
+    model: str
+    jobs: int
+    calls: int
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+    cached_tokens: int
+    avg_seconds: float
+    avg_total_tokens: float
+    cost_usd: Optional[float] = None
+
+
+class ModelUsageSummaryList(BaseModel):
+    items: List[ModelUsageSummary]
+    hours: float
+
+
 class JobBase(BaseModel):
     """Base schema with fields common to all jobs."""
 
@@ -74,6 +142,7 @@ class JobInDB(JobBase):
     created_at: datetime
     updated_at: datetime
     error_message: Optional[str] = None
+    usage: Optional[JobUsage] = None
 
     model_config = ConfigDict(populate_by_name=True)
 
@@ -86,10 +155,28 @@ class Job(JobBase):
     created_at: datetime
     updated_at: datetime
     error_message: Optional[str] = None
+    queue_position: Optional[int] = Field(
+        None, description="1-based position in the job queue while pending."
+    )
+    estimated_start_at: Optional[datetime] = Field(
+        None, description="Rough start time (UTC) while pending."
+    )
+    usage: Optional[JobUsage] = Field(
+        None, description="LLM tokens, latency and cost so far, per node and model."
+    )
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class JobEventList(BaseModel):
+    """Events of a job recorded after a given sequence number."""
+
+    items: List[JobEvent]
+    last_seq: int = Field(
+        0, description="Highest seq returned (pass it back as `after` to poll)."
+    )
+
+
 class JobList(BaseModel):
     """Schema for paginated job list responses."""
 
@@ -100,3 +187,39 @@ class JobList(BaseModel):
     total_pages: int
 
 
+class JobSummary(JobBase):
+    """Job list entry without events, for sidebars and overviews."""
+
+    id: str
+    created_at: datetime
+    updated_at: datetime
+    error_message: Optional[str] = None
+
+
+class JobSummaryList(BaseModel):
+    """Keyset-paginated list of job summaries, newest first."""
+
+    items: List[JobSummary]
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as `cursor` to fetch the next page; null on the last page."
+    )
+    total: Optional[int] = Field(
+        None, description="Total number of jobs (only when include_total=true)."
+    )
+
+
+class QueuedJob(BaseModel):
+    """A job entry claimed from the durable job queue by a worker."""
+
+    job_id: str
+    type: JobType
+    payload: dict[str, Any] = Field(
+        default_factory=dict,
+        description="Keyword arguments forwarded to the job runner.",
+    )
+    priority: JobPriority = JobPriority.INIT
+    status: JobQueueStatus = JobQueueStatus.QUEUED
+    attempts: int = 0
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    enqueued_at: Optional[datetime] = None
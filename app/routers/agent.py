@@ -4,7 +4,6 @@ from fastapi import (
     Request,
     HTTPException,
     UploadFile,
-    BackgroundTasks,
 )
 from fastapi.responses import StreamingResponse, Response, FileResponse
 from pydantic import BaseModel
@@ -12,25 +11,41 @@ from app.deps import get_session_id, get_current_user
 from app.models.user import User
 from app.models.landing_page import LandingPageCreate, LandingPageStatus
 from app.utils.landing_pages import create_landing_page, get_landing_page_by_session_id
-from app.models.job import Job, JobCreate, JobType, JobStatus
+from app.models.job import Job, JobCreate, JobPriority, JobType, JobStatus
 from app.utils.jobs import (
     create_job,
     append_job_event,
     update_job_status,
     log_job_event,
+    get_active_job_id_for_session,
+    list_active_job_ids_for_session,
 )
-from app.agent.job_runner import run_chat_job, run_init_job
+from app.utils.job_cancellation import cancel_job
+from app.utils.job_queue import enqueue_job
+from app.utils.llm_usage import usage_callbacks
+from app.utils.metrics import SUBPROCESS_SECONDS, metrics_callbacks
+from app.utils.session_leases import (
+    acquire_session_lease,
+    get_session_lease_holder,
+    release_session_lease,
+    renew_session_lease,
+)
+from app.config import Config
 from langchain_core.messages import HumanMessage
 from app.agent.graph import agent
+from app.agent.routing_rules import is_deploy_command
 from app.agent.tools.files import get_session_dir, clear_session_dir
 from pathlib import Path
 from toon import encode
 from app.utils.data_analysis import prepare_data_enrichment
+import asyncio
 import os
 import json
 import subprocess
 import re
-from typing import Any, Dict, Sequence
+import time
+import uuid
+from typing import Any, Dict, Literal, Sequence
 
 WORKSPACE_ROOT = Path(__file__).resolve().parents[2]
 # Repository root (backend code lives here)
@@ -223,6 +238,8 @@ def _run_with_live_logs(
         raise
 
     lines: list[str] = []
+    started = time.perf_counter()
+    outcome = "ok"
     try:
         for line in process.stdout:  # type: ignore
             if line is None:
@@ -236,9 +253,15 @@ def _run_with_live_logs(
         process.kill()
         print(f"[{label}] ERROR: Timeout after {timeout}s; process killed")
         ret_code = -1
+        outcome = "timeout"
     except Exception as e:
         print(f"[{label}] ERROR: Exception while streaming logs: {e}")
         ret_code = -1
+    if outcome == "ok" and ret_code != 0:
+        outcome = "error"
+    SUBPROCESS_SECONDS.observe(
+        time.perf_counter() - started, command=label, outcome=outcome
+    )
 
     stdout_all = "".join(lines)
     # Build a CompletedProcess surrogate
@@ -265,16 +288,50 @@ def _copy_static_project(session_id: str, label: str) -> bool:
         return False
 
 
+def _resolve_session_conflict(session_id: str, on_conflict: str | None) -> str | None:
+    """Return the id of a job already queued or running on this session.
+
+    Raises 409 (carrying the active job id) when the caller asked to reject
+    conflicting runs instead of queueing behind them.
+    """
+    active_job_id = get_session_lease_holder(
+        session_id
+    ) or get_active_job_id_for_session(session_id)
+    policy = (on_conflict or Config.SESSION_CONFLICT_POLICY).lower()
+    if active_job_id and policy == "reject":
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "message": "Session already has an active job",
+                "active_job_id": active_job_id,
+            },
+        )
+    return active_job_id
+
+
+def _log_queued_behind(job_id: str | None, active_job_id: str | None) -> None:
+    if job_id and active_job_id:
+        log_job_event(
+            job_id,
+            node="job_queue",
+            message="Waiting for the active job on this session to finish.",
+            event_type="queued",
+            data={"active_job_id": active_job_id},
+        )
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     req: ChatRequest,
-    background_tasks: BackgroundTasks,
     session_id: str = Depends(get_session_id),
     current_user: User = Depends(get_current_user),
+    on_conflict: Literal["queue", "reject"] | None = None,
 ):
+    active_job_id = _resolve_session_conflict(session_id, on_conflict)
+
     # Check if this is the first message - clear session directory
     try:
-        state_snapshot = agent.get_state(
+        state_snapshot = await agent.aget_state(
             config={"configurable": {"thread_id": session_id, "recursion_limit": 100}}
         )
         is_first_message = not state_snapshot.values.get("messages", [])
@@ -283,7 +340,8 @@ async def chat(
 
     app_ready = not is_first_message
 
-    if is_first_message:
+    # Never reset the workspace under a job that still owns the session
+    if is_first_message and not active_job_id:
         print(f"[CHAT] First message detected for session: {session_id}")
         clear_session_dir(session_id)
         print(f"[CHAT] Copying static project template for session {session_id}")
@@ -305,9 +363,22 @@ async def chat(
     )
     job_id = job.id if job else None
 
-    # Kick off background execution of the graph job
-    if job_id:
-        background_tasks.add_task(run_chat_job, job_id, session_id, req.message)
+    # Hand the graph run to the durable queue; a worker process executes it
+    # A bare redeploy runs no LLM work, so it gets the deploy class
+    priority = JobPriority.DEPLOY if is_deploy_command(req.message) else None
+    if job_id and not enqueue_job(
+        job_id,
+        JobType.CHAT,
+        {"session_id": session_id, "message": req.message},
+        priority,
+    ):
+        update_job_status(
+            job_id,
+            status=JobStatus.FAILED,
+            error_message="Failed to enqueue chat job",
+        )
+        raise HTTPException(status_code=503, detail="Job queue unavailable")
+    _log_queued_behind(job_id, active_job_id)
 
     # Asynchronous architecture: reply is not the final graph output anymore.
     # Frontend should poll /v1/jobs/{job_id} for status and events.
@@ -319,11 +390,48 @@ async def chat(
     )
 
 
+async def _renew_stream_lease(session_id: str, lease_id: str) -> None:
+    """Keep an inline stream's session lease alive until cancelled."""
+    while True:
+        await asyncio.sleep(Config.JOB_HEARTBEAT_SECONDS)
+        try:
+            renewed = await asyncio.to_thread(
+                renew_session_lease, session_id, lease_id, Config.JOB_LEASE_SECONDS
+            )
+        except Exception as e:
+            print(f"[STREAM] Warning: failed to renew lease for {session_id}: {e}")
+            continue
+        if not renewed:
+            print(f"[STREAM] Lost session lease for {session_id}")
+
+
 @router.post("/chat/stream")
 async def chat_stream(req: ChatRequest, session_id: str = Depends(get_session_id)):
+    def sse(data: dict) -> str:
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    # Inline runs take the same session lease as queued jobs
+    lease_id = f"stream-{uuid.uuid4()}"
+    active_job_id = acquire_session_lease(
+        session_id, lease_id, Config.JOB_LEASE_SECONDS
+    )
+    if active_job_id is not None:
+
+        async def busy_gen():
+            yield sse(
+                {
+                    "type": "error",
+                    "error": "Session already has an active job",
+                    "active_job_id": active_job_id,
+                }
+            )
+            yield sse({"type": "done"})
+
+        return StreamingResponse(busy_gen(), media_type="text/event-stream")
+
     # Check if this is the first message - clear session directory
     try:
-        state_snapshot = agent.get_state(
+        state_snapshot = await agent.aget_state(
             config={"configurable": {"thread_id": session_id}}
         )
         is_first_message = not state_snapshot.values.get("messages", [])
@@ -341,9 +449,6 @@ async def chat_stream(req: ChatRequest, session_id: str = Depends(get_session_id
         print(f"[STREAM] Continuing session: {session_id}")
     # No dev server management in static mode
 
-    def sse(data: dict) -> str:
-        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-
     def format_tool_summary(msg) -> str | None:
         """Generate a user-friendly progressive summary for tool executions."""
         tool_name = getattr(msg, "name", None)
@@ -402,12 +507,15 @@ async def chat_stream(req: ChatRequest, session_id: str = Depends(get_session_id
         else:
             return "Running tool..."
 
-    def event_gen():
+    async def event_gen():
         # Track tool calls to extract arguments for summaries
         tool_calls_map = {}
+        # Renewed on a timer, not between graph events: one long node must not
+        # let the lease lapse while the run still owns the session
+        lease_renewer = asyncio.create_task(_renew_stream_lease(session_id, lease_id))
 
         try:
-            for event in agent.stream(
+            async for event in agent.astream(
                 {
                     "messages": [
                         HumanMessage(
@@ -423,6 +531,7 @@ async def chat_stream(req: ChatRequest, session_id: str = Depends(get_session_id
                         "session_id": session_id,  # Pass session_id to tools
                     },
                     "recursion_limit": 30,
+                    "callbacks": [*metrics_callbacks(), *usage_callbacks()],
                 },
             ):
                 for node, update in event.items():
@@ -590,6 +699,8 @@ async def chat_stream(req: ChatRequest, session_id: str = Depends(get_session_id
         except Exception as e:
             yield sse({"type": "error", "error": str(e)})
         finally:
+            lease_renewer.cancel()
+            release_session_lease(session_id, lease_id)
             yield sse({"type": "done"})
 
     return StreamingResponse(event_gen(), media_type="text/event-stream")
@@ -598,7 +709,9 @@ async def chat_stream(req: ChatRequest, session_id: str = Depends(get_session_id
 @router.get("/chat/history", response_model=ChatHistoryResponse)
 async def chat_history(session_id: str = Depends(get_session_id)):
     try:
-        state = agent.get_state(config={"configurable": {"thread_id": session_id}})
+        state = await agent.aget_state(
+            config={"configurable": {"thread_id": session_id}}
+        )
         values = getattr(state, "values", None) or state  # state may already be a dict
         raw = (values.get("messages") if isinstance(values, dict) else []) or []
     except Exception:
@@ -747,15 +860,16 @@ class InitJobResponse(BaseModel):
 @router.post("/init", response_model=InitJobResponse)
 async def init_job(
     request: Request,
-    background_tasks: BackgroundTasks,
     session_id: str = Depends(get_session_id),
     current_user: User = Depends(get_current_user),
+    on_conflict: Literal["queue", "reject"] | None = None,
 ):
     """Initialization endpoint (asynchronous).
 
     - Accepts JSON or multipart/form-data like the previous /init/stream
     - Creates a landing page record for the session
-    - Enqueues a graph execution job and returns immediately with a job_id
+    - Enqueues a graph execution job on the durable queue and returns immediately
+      with a job_id; a worker process claims and runs it
 
     Frontend should poll `/v1/jobs/{job_id}` for progress and node outputs.
     """
@@ -864,6 +978,8 @@ async def init_job(
     if session_override:
         session_id = session_override
 
+    active_job_id = _resolve_session_conflict(session_id, on_conflict)
+
     # Build InitPayload pydantic model
     try:
         req_payload = InitPayload(**raw_json)
@@ -872,7 +988,7 @@ async def init_job(
 
     # First message detection
     try:
-        state_snapshot = agent.get_state(
+        state_snapshot = await agent.aget_state(
             config={"configurable": {"thread_id": session_id}}
         )
         is_first_message = not state_snapshot.values.get("messages", [])
@@ -889,7 +1005,7 @@ async def init_job(
         data_warnings,
     ) = _prepare_init_payload(req_payload, session_id=session_id)
 
-    if is_first_message:
+    if is_first_message and not active_job_id:
         clear_session_dir(session_id)
         print(f"[INIT] Copying static project template for session {session_id}")
         app_ready = _copy_static_project(session_id, "INIT")
@@ -931,15 +1047,24 @@ async def init_job(
             status_code=500, detail="Failed to create job for init execution"
         )
 
-    # Run the graph in the background
-    background_tasks.add_task(
-        run_init_job,
+    # Hand the graph run to the durable queue; a worker process executes it
+    if not enqueue_job(
         job.id,
-        session_id,
-        enriched_payload_dict,
-        payload_text,
-        state_overrides,
-    )
+        JobType.INIT,
+        {
+            "session_id": session_id,
+            "init_payload": enriched_payload_dict,
+            "init_payload_text": payload_text,
+            "state_overrides": state_overrides,
+        },
+    ):
+        update_job_status(
+            job.id,
+            status=JobStatus.FAILED,
+            error_message="Failed to enqueue init job",
+        )
+        raise HTTPException(status_code=503, detail="Job queue unavailable")
+    _log_queued_behind(job.id, active_job_id)
 
     if job and (state_overrides.get("data_insights") or data_warnings):
         log_job_event(
@@ -981,6 +1106,7 @@ async def kill_session(
     Kill/terminate a session and clean up all associated resources.
 
     This endpoint will:
+    - Cancel any pending or running job on the session
     - Clear all session files
     - Update landing page status to 'failed'
     - Clear LangGraph checkpoints
@@ -1006,6 +1132,11 @@ async def kill_session(
         )
 
     try:
+        # 0. Stop any graph run still working on this session
+        for active_job_id in list_active_job_ids_for_session(session_id):
+            cancel_job(active_job_id)
+            print(f"[KILL_SESSION] Requested cancel of job {active_job_id}")
+
         # 1. Clear session files
         session_dir = get_session_dir(session_id)
         if session_dir.exists():
@@ -1,10 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app.deps import get_current_user
 from app.models.user import User
-from app.models.job import Job, JobList
-from app.utils.jobs import get_job, list_jobs_for_user
+from app.models.job import (
+    Job,
+    JobEventList,
+    JobList,
+    JobStatus,
+    JobSummaryList,
+    ModelUsageSummary,
+    ModelUsageSummaryList,
+)
+from app.utils.job_cancellation import cancel_job
+from app.utils.job_event_stream import stream_job_events
+from app.utils.job_queue import estimate_queue_wait
+from app.utils.llm_usage import summarize_model_usage
+from app.utils.jobs import (
+    get_job,
+    list_job_events,
+    list_job_summaries_for_user,
+    list_jobs_for_user,
+    user_owns_job,
+)
 
 
 router = APIRouter()
@@ -14,13 +33,61 @@ class JobResponse(BaseModel):
     job: Job
 
 
+class CancelJobResponse(BaseModel):
+    job_id: str
+    status: JobStatus
+    message: str
+
+
+@router.get("/jobs/summary", response_model=JobSummaryList)
+async def list_job_summaries(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(
+        None, description="`next_cursor` of the previous page"
+    ),
+    include_total: bool = Query(False),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Lightweight job list for the current user, newest first.
+
+    Jobs are returned without events. Follow `next_cursor` to page; the total
+    count is only computed when `include_total=true`.
+    """
+    try:
+        items, next_cursor, total = list_job_summaries_for_user(
+            current_user.id,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return JobSummaryList(items=items, next_cursor=next_cursor, total=total)
+
+
+@router.get("/jobs/usage/models", response_model=ModelUsageSummaryList)
+async def get_model_usage(
+    hours: float = Query(24, gt=0, le=24 * 30),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Per-model LLM calls, tokens, average latency and cost across the current
+    user's jobs created in the last `hours`.
+    """
+    rows = summarize_model_usage(current_user.id, hours=hours)
+    items = [ModelUsageSummary(**row) for row in rows]
+    return ModelUsageSummaryList(items=items, hours=hours)
+
+
 @router.get("/jobs/{job_id}", response_model=JobResponse)
 async def get_job_detail(job_id: str, current_user: User = Depends(get_current_user)):
     """
     Fetch a single job (graph execution) by id for the current user.
 
     The job contains overall status and the full event history for each node
-    that has run so far.
+    that has run so far. Pending jobs also carry their queue position and an
+    estimated start time.
     """
     job_in_db = get_job(job_id, user_id=current_user.id)
     if not job_in_db:
@@ -39,10 +106,106 @@ async def get_job_detail(job_id: str, current_user: User = Depends(get_current_u
         created_at=job_in_db.created_at,
         updated_at=job_in_db.updated_at,
         error_message=job_in_db.error_message,
+        usage=job_in_db.usage,
     )
+    if job.status == JobStatus.PENDING:
+        job.queue_position, job.estimated_start_at = estimate_queue_wait(job.id)
     return JobResponse(job=job)
 
 
+@router.get("/jobs/{job_id}/events", response_model=JobEventList)
+async def get_job_events(
+    job_id: str,
+    after: int = Query(0, ge=0, description="Only return events with seq > after"),
+    limit: int = Query(200, ge=1, le=1000),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Incremental event feed for a job.
+
+    Poll with `after` set to the `last_seq` of the previous response to fetch
+    only events recorded since then.
+    """
+    if not user_owns_job(job_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    events = list_job_events(job_id, after_seq=after, limit=limit)
+    last_seq = events[-1].seq if events else after
+    return JobEventList(items=events, last_seq=last_seq or after)
+
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_job(
+    job_id: str,
+    after: int | None = Query(
+        None, ge=0, description="Only stream events with seq > after"
+    ),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Server-sent event stream of a job's events.
+
+    Each `job_event` message carries one JobEvent with its seq as the SSE id,
+    so browsers resume from the last delivered event on reconnect via the
+    `Last-Event-ID` header. The stream closes with an `end` message once the
+    job is completed, failed or cancelled.
+    """
+    if not user_owns_job(job_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    after_seq = after or 0
+    if last_event_id:
+        try:
+            after_seq = max(after_seq, int(last_event_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    return StreamingResponse(
+        stream_job_events(job_id, after_seq=after_seq),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=CancelJobResponse)
+async def cancel_job_endpoint(
+    job_id: str, current_user: User = Depends(get_current_user)
+):
+    """
+    Cancel a pending or running job.
+
+    Pending jobs are cancelled immediately. Running jobs stop at the next
+    graph superstep: in-flight section generation tasks are cancelled and any
+    lint/deploy subprocess is killed. The job ends with status `cancelled`.
+    """
+    job_in_db = get_job(job_id, user_id=current_user.id)
+    if not job_in_db:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job_in_db.status == JobStatus.CANCELLED:
+        return CancelJobResponse(
+            job_id=job_id, status=JobStatus.CANCELLED, message="Job already cancelled"
+        )
+    if job_in_db.status in (JobStatus.COMPLETED, JobStatus.FAILED):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Job already finished with status '{job_in_db.status.value}'",
+        )
+
+    status = cancel_job(job_id)
+    if status is None:
+        # Finished between the read above and the cancel request
+        raise HTTPException(status_code=409, detail="Job is no longer active")
+
+    message = (
+        "Job cancelled"
+        if status == JobStatus.CANCELLED
+        else "Cancellation requested; the job stops after the current step"
+    )
+    return CancelJobResponse(job_id=job_id, status=status, message=message)
+
+
 @router.get("/jobs", response_model=JobList)
 async def list_jobs(
     page: int = Query(1, ge=1),
@@ -0,0 +1,212 @@
+"""Cooperative cancellation for running graph jobs.
+
+Each job executed by a runner registers a CancelToken for the lifetime of the
+graph run. Cancelling the token:
+
+- makes the runner stop the graph at the next superstep boundary,
+- cancels asyncio tasks registered by nodes (e.g. generate_section workers),
+- terminates the process group of any lint/deploy subprocess the job started.
+
+Tokens are process-local; workers poll MongoDB for cancel requests made from
+other processes (see JobWorker._cancel_watch_loop) and trigger them here.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.config import Config
+from app.models.job import JobStatus
+from app.utils.jobs import request_job_cancel
+
+
+# CancelToken.reason values
+CANCEL_REQUESTED = "requested"
+LEASE_LOST = "lease_lost"  # another worker may now run the job
+
+
+class JobCancelled(Exception):
+    """Raised inside a job run once its cancellation has been requested."""
+
+
+class CancelToken:
+    """Cancellation state and cancellable resources of one job run."""
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self.reason: Optional[str] = None
+        self._tasks: set[tuple[asyncio.AbstractEventLoop, asyncio.Task]] = set()
+        self._processes: set[subprocess.Popen] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise JobCancelled(f"Job {self.job_id} was cancelled")
+
+    def cancel(self, reason: str = CANCEL_REQUESTED) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            tasks = list(self._tasks)
+            processes = list(self._processes)
+        for loop, task in tasks:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                # Loop already closed; the task is gone with it.
+                pass
+        for process in processes:
+            _terminate_process_group(process)
+
+    def add_task(self, task: asyncio.Task) -> None:
+        entry = (task.get_loop(), task)
+        with self._lock:
+            cancelled = self._event.is_set()
+            if not cancelled:
+                self._tasks.add(entry)
+        if cancelled:
+            task.cancel()
+            return
+        task.add_done_callback(lambda _t: self._discard_task(entry))
+
+    def _discard_task(self, entry) -> None:
+        with self._lock:
+            self._tasks.discard(entry)
+
+    def add_process(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            cancelled = self._event.is_set()
+            if not cancelled:
+                self._processes.add(process)
+        if cancelled:
+            _terminate_process_group(process)
+
+    def discard_process(self, process: subprocess.Popen) -> None:
+        with self._lock:
+            self._processes.discard(process)
+
+
+def _terminate_process_group(process: subprocess.Popen) -> None:
+    """SIGTERM the process group, escalating to SIGKILL after a grace period."""
+    if process.poll() is not None:
+        return
+    try:
+        pgid = os.getpgid(process.pid)
+    except Exception:
+        pgid = None
+
+    def _signal(sig: int) -> None:
+        try:
+            if pgid is not None:
+                os.killpg(pgid, sig)
+            else:
+                process.send_signal(sig)
+        except ProcessLookupError:
+            pass
+        except Exception as e:
+            print(f"[JOB_CANCEL] Warning: failed to signal pid {process.pid}: {e}")
+
+    _signal(signal.SIGTERM)
+
+    def _escalate() -> None:
+        if process.poll() is None:
+            _signal(signal.SIGKILL)
+
+    timer = threading.Timer(Config.JOB_CANCEL_KILL_GRACE_SECONDS, _escalate)
+    timer.daemon = True
+    timer.start()
+
+
+_TOKENS: dict[str, CancelToken] = {}
+_TOKENS_LOCK = threading.Lock()
+
+
+def register_job(job_id: str) -> CancelToken:
+    """Create (or return) the cancel token for a job run in this process."""
+    with _TOKENS_LOCK:
+        token = _TOKENS.get(job_id)
+        if token is None:
+            token = CancelToken(job_id)
+            _TOKENS[job_id] = token
+        return token
+
+
+def unregister_job(job_id: str) -> None:
+    with _TOKENS_LOCK:
+        _TOKENS.pop(job_id, None)
+
+
+def get_cancel_token(job_id: str | None) -> Optional[CancelToken]:
+    if not job_id:
+        return None
+    with _TOKENS_LOCK:
+        return _TOKENS.get(job_id)
+
+
+def is_job_cancelled(job_id: str | None) -> bool:
+    token = get_cancel_token(job_id)
+    return bool(token and token.cancelled)
+
+
+def track_job_task(job_id: str | None, task: asyncio.Task) -> None:
+    """Cancel `task` together with the job (no-op outside a job run)."""
+    token = get_cancel_token(job_id)
+    if token is not None:
+        token.add_task(task)
+
+
+@contextmanager
+def track_job_process(
+    job_id: str | None, process: subprocess.Popen
+) -> Iterator[subprocess.Popen]:
+    """
+    Kill `process` (and its process group) if the job is cancelled while the
+    block runs. Start the process with `start_new_session=True` so the whole
+    script tree can be signalled.
+    """
+    token = get_cancel_token(job_id)
+    if token is not None:
+        token.add_process(process)
+    try:
+        yield process
+    finally:
+        if token is not None:
+            token.discard_process(process)
+
+
+def cancel_local_job(job_id: str, reason: str = CANCEL_REQUESTED) -> bool:
+    """Trigger cancellation of a job running in this process, if any."""
+    token = get_cancel_token(job_id)
+    if token is None or token.cancelled:
+        return False
+    token.cancel(reason)
+    return True
+
+
+def cancel_job(job_id: str) -> Optional[JobStatus]:
+    """
+    Request cancellation of a job.
+
+    Records the request in MongoDB so the worker running the job picks it up,
+    and cancels it immediately when it runs in this process.
+
+    Returns:
+        The job status after the request, or None if the job is not active.
+    """
+    status = request_job_cancel(job_id)
+    if cancel_local_job(job_id) and status is None:
+        status = JobStatus.RUNNING
+    return status
@@ -0,0 +1,232 @@
+"""Buffered writer for job events.
+
+log_job_event used to do one MongoDB write per event, putting a round trip
+inside every graph node that reports progress. Events are now appended to an
+in-process buffer and written by a background flusher thread in bulk.
+
+Events live in the append-only `job_events` collection keyed by
+(job_id, seq). Each flush reserves a contiguous seq range per job with one
+atomic `$inc` of `event_seq` on the job document, then inserts every buffered
+event with a single `insert_many`. Event `_id`s are the event UUIDs, so a
+retried flush never duplicates events.
+
+A flush happens when the buffer reaches Config.JOB_EVENT_FLUSH_SIZE events,
+every Config.JOB_EVENT_FLUSH_SECONDS, and explicitly whenever a job reaches a
+terminal status (see update_job_status) so readers never see a finished job
+with missing events.
+"""
+
+from __future__ import annotations
+
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from app.config import Config
+from app.db import get_job_events_collection, get_jobs_collection
+
+try:
+    from pymongo import ReturnDocument  # type: ignore
+    from pymongo.errors import BulkWriteError  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    ReturnDocument = None  # type: ignore
+    BulkWriteError = None  # type: ignore
+
+_DUPLICATE_KEY = 11000
+
+
+def _reserve_seqs(jobs_collection, job_id: str, events: list[dict[str, Any]]) -> None:
+    """Assign consecutive `seq` numbers to events that don't have one yet."""
+    unnumbered = [event for event in events if event.get("seq") is None]
+    if not unnumbered:
+        return
+    job = jobs_collection.find_one_and_update(
+        {"_id": job_id},
+        {
+            "$inc": {"event_seq": len(unnumbered)},
+            "$set": {"updated_at": unnumbered[-1]["timestamp"]},
+        },
+        projection={"event_seq": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None:
+        raise LookupError(f"job {job_id} not found")
+    first_seq = int(job["event_seq"]) - len(unnumbered) + 1
+    for offset, event in enumerate(unnumbered):
+        event["seq"] = first_seq + offset
+
+
+_FLUSH_LISTENERS: list[Callable[[str, list[dict[str, Any]]], None]] = []
+
+
+def add_flush_listener(listener: Callable[[str, list[dict[str, Any]]], None]) -> None:
+    """Call `listener(job_id, event_docs)` after each job's events are written."""
+    _FLUSH_LISTENERS.append(listener)
+
+
+def _notify_listeners(docs: list[dict[str, Any]]) -> None:
+    if not _FLUSH_LISTENERS:
+        return
+    by_job: dict[str, list[dict[str, Any]]] = {}
+    for doc in docs:
+        by_job.setdefault(doc["job_id"], []).append(doc)
+    for listener in _FLUSH_LISTENERS:
+        for job_id, job_docs in by_job.items():
+            try:
+                listener(job_id, job_docs)
+            except Exception as e:  # pragma: no cover - defensive logging
+                print(f"[JOB_EVENTS] Warning: flush listener failed: {e}")
+
+
+def _write_batch(batch: dict[str, list[dict[str, Any]]]) -> None:
+    jobs_collection = get_jobs_collection()
+    events_collection = get_job_events_collection()
+    if jobs_collection is None or events_collection is None:
+        return  # Nowhere to persist events (no Mongo)
+
+    docs: list[dict[str, Any]] = []
+    for job_id, events in batch.items():
+        try:
+            _reserve_seqs(jobs_collection, job_id, events)
+        except LookupError:
+            print(f"[JOB_EVENTS] Warning: dropping events for unknown job {job_id}")
+            continue
+        docs.extend(
+            {
+                "_id": event["id"],
+                "job_id": job_id,
+                "seq": event["seq"],
+                "node": event["node"],
+                "timestamp": event["timestamp"],
+                "event_type": event["event_type"],
+                "message": event["message"],
+                "data": event["data"],
+            }
+            for event in events
+        )
+    if not docs:
+        return
+    try:
+        events_collection.insert_many(docs, ordered=False)
+    except Exception as e:
+        # Events written by an earlier, partially failed flush are fine
+        errors = (getattr(e, "details", None) or {}).get("writeErrors") or []
+        if BulkWriteError is None or not isinstance(e, BulkWriteError):
+            raise
+        if any(error.get("code") != _DUPLICATE_KEY for error in errors):
+            raise
+    _notify_listeners(docs)
+
+
+class JobEventSink:
+    """Coalesces job events per job and flushes them in bulk."""
+
+    def __init__(
+        self,
+        *,
+        flush_size: int,
+        flush_seconds: float,
+        max_buffered: int,
+    ) -> None:
+        self.flush_size = max(flush_size, 1)
+        self.flush_seconds = max(flush_seconds, 0.05)
+        self.max_buffered = max(max_buffered, self.flush_size)
+        self._lock = threading.Lock()
+        # Serializes writers so batches for one job land in order
+        self._flush_lock = threading.Lock()
+        self._pending: "OrderedDict[str, list[dict[str, Any]]]" = OrderedDict()
+        self._count = 0
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="job-event-sink", daemon=True
+        )
+        self._thread.start()
+
+    def add(self, job_id: str, event_doc: dict[str, Any]) -> None:
+        with self._lock:
+            if self._count >= self.max_buffered:
+                print(
+                    f"[JOB_EVENTS] Warning: buffer full, dropping event for job {job_id}"
+                )
+                return
+            self._pending.setdefault(job_id, []).append(event_doc)
+            self._count += 1
+            should_wake = self._count >= self.flush_size
+            self._ensure_thread()
+        if should_wake:
+            self._wakeup.set()
+
+    def _take(self, job_id: Optional[str]) -> dict[str, list[dict[str, Any]]]:
+        with self._lock:
+            if job_id is None:
+                batch = dict(self._pending)
+                self._pending.clear()
+                self._count = 0
+            else:
+                events = self._pending.pop(job_id, None)
+                batch = {job_id: events} if events else {}
+                self._count -= len(events or [])
+        return batch
+
+    def _restore(self, batch: dict[str, list[dict[str, Any]]]) -> None:
+        """Put events from a failed write back in front of newer ones.
+
+        Events keep any seq already reserved for them so the retry reuses it.
+        """
+        with self._lock:
+            for job_id, events in batch.items():
+                self._pending[job_id] = events + self._pending.get(job_id, [])
+                self._pending.move_to_end(job_id, last=False)
+                self._count += len(events)
+
+    def flush(self, job_id: Optional[str] = None) -> bool:
+        """
+        Write buffered events (all jobs, or only `job_id`) to MongoDB.
+
+        Returns:
+            True if nothing is left buffered for the requested scope.
+        """
+        with self._flush_lock:
+            batch = self._take(job_id)
+            if not batch or ReturnDocument is None:
+                return True
+            try:
+                _write_batch(batch)
+                return True
+            except Exception as e:
+                print(f"[JOB_EVENTS] Warning: failed to flush job events: {e}")
+                self._restore(batch)
+                return False
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:  # pragma: no cover - defensive logging
+                print(f"[JOB_EVENTS] Warning: flusher error: {e}")
+
+
+_SINK = JobEventSink(
+    flush_size=Config.JOB_EVENT_FLUSH_SIZE,
+    flush_seconds=Config.JOB_EVENT_FLUSH_SECONDS,
+    max_buffered=Config.JOB_EVENT_BUFFER_MAX,
+)
+atexit.register(_SINK.flush)
+
+
+def buffer_job_event(job_id: str, event_doc: dict[str, Any]) -> None:
+    """Queue an event document for the job; written asynchronously."""
+    _SINK.add(job_id, event_doc)
+
+
+def flush_job_events(job_id: Optional[str] = None) -> bool:
+    """Synchronously write buffered events (for one job or all jobs)."""
+    return _SINK.flush(job_id)
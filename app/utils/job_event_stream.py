@@ -0,0 +1,221 @@
+"""Live fan-out of job events to SSE subscribers.
+
+Events written by the job event sink in this process are published straight
+to local subscribers. Events written by other workers reach this process
+through a MongoDB change stream on `job_events`; when change streams are not
+available (standalone mongod) streams fall back to polling the collection
+every Config.JOB_STREAM_POLL_SECONDS.
+
+Every stream starts by replaying stored events after the client's last seen
+seq, so reconnecting with `Last-Event-ID` never loses events, and events that
+arrive over both paths are de-duplicated by seq.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Optional
+
+from app.config import Config
+from app.db import get_job_events_collection
+from app.models.job import JobEvent, JobStatus
+from app.utils.job_event_sink import add_flush_listener
+from app.utils.jobs import (
+    get_job_status,
+    is_terminal_status,
+    job_event_from_doc,
+    list_job_events,
+)
+
+try:
+    from pymongo.errors import OperationFailure  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    OperationFailure = None  # type: ignore
+
+# "The $changeStream stage is only supported on replica sets"
+_CHANGE_STREAM_UNSUPPORTED = 40573
+_WATCH_RETRY_SECONDS = 5.0
+
+
+class _Subscriber:
+    def __init__(self, job_id: str, loop: asyncio.AbstractEventLoop) -> None:
+        self.job_id = job_id
+        self.loop = loop
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    def push(self, doc: dict[str, Any]) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, doc)
+        except RuntimeError:
+            # Subscriber's loop is closed; it unsubscribes on its way out.
+            pass
+
+
+class JobEventBroker:
+    """In-process pub/sub of job event documents keyed by job id."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set[_Subscriber]] = {}
+        self._watch_thread: Optional[threading.Thread] = None
+        self.change_streams_active = False
+
+    def subscribe(self, job_id: str) -> _Subscriber:
+        subscriber = _Subscriber(job_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(subscriber)
+        self._ensure_watcher()
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.job_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(subscriber.job_id, None)
+
+    def has_subscribers(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._subscribers
+
+    def publish(self, job_id: str, docs: list[dict[str, Any]]) -> None:
+        """Deliver event documents to this process's subscribers of `job_id`."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for subscriber in subscribers:
+            for doc in docs:
+                subscriber.push(doc)
+
+    def _ensure_watcher(self) -> None:
+        if not Config.JOB_STREAM_CHANGE_STREAMS:
+            return
+        with self._lock:
+            if self._watch_thread is not None:
+                return
+            self._watch_thread = threading.Thread(
+                target=self._watch, name="job-event-watch", daemon=True
+            )
+            self._watch_thread.start()
+
+    def _watch(self) -> None:
+        """Forward inserts into `job_events` from any worker to subscribers."""
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            collection = get_job_events_collection()
+            if collection is None:
+                return
+            try:
+                with collection.watch(pipeline) as stream:
+                    self.change_streams_active = True
+                    print("[JOB_STREAM] Watching job_events change stream")
+                    for change in stream:
+                        doc = change.get("fullDocument") or {}
+                        job_id = doc.get("job_id")
+                        if job_id and self.has_subscribers(job_id):
+                            self.publish(job_id, [doc])
+            except Exception as e:
+                self.change_streams_active = False
+                if (
+                    OperationFailure is not None
+                    and isinstance(e, OperationFailure)
+                    and e.code == _CHANGE_STREAM_UNSUPPORTED
+                ):
+                    print(
+                        "[JOB_STREAM] Change streams unavailable; "
+                        "job streams fall back to polling"
+                    )
+                    return
+                print(f"[JOB_STREAM] Warning: change stream error: {e}")
+            time.sleep(_WATCH_RETRY_SECONDS)
+
+
+_BROKER = JobEventBroker()
+add_flush_listener(_BROKER.publish)
+
+
+def _sse(event: str, data: str, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n"
+
+
+def _event_frame(event: JobEvent) -> str:
+    return _sse("job_event", event.model_dump_json(), event.seq)
+
+
+def _end_frame(status: Optional[JobStatus], last_seq: int) -> str:
+    payload = {"status": status.value if status else None, "last_seq": last_seq}
+    return _sse("end", json.dumps(payload))
+
+
+async def stream_job_events(job_id: str, *, after_seq: int = 0) -> AsyncIterator[str]:
+    """
+    Yield SSE frames for a job's events with seq > `after_seq`.
+
+    Emits stored events first, then live ones as they are recorded, and ends
+    with an `end` event once the job reaches a terminal status.
+    """
+    # Subscribe before reading the backlog so nothing lands in between
+    subscriber = _BROKER.subscribe(job_id)
+    last_seq = after_seq
+    last_sent_at = time.monotonic()
+
+    async def _catch_up() -> list[str]:
+        nonlocal last_seq
+        events = await asyncio.to_thread(list_job_events, job_id, after_seq=last_seq)
+        frames = []
+        for event in events:
+            if event.seq is None or event.seq <= last_seq:
+                continue
+            last_seq = event.seq
+            frames.append(_event_frame(event))
+        return frames
+
+    try:
+        for frame in await _catch_up():
+            yield frame
+
+        while True:
+            try:
+                doc = await asyncio.wait_for(
+                    subscriber.queue.get(), Config.JOB_STREAM_POLL_SECONDS
+                )
+            except asyncio.TimeoutError:
+                doc = None
+
+            frames: list[str] = []
+            if doc is not None:
+                seq = doc.get("seq")
+                if seq is None or seq <= last_seq:
+                    continue  # Already sent (backlog or the other delivery path)
+                if seq == last_seq + 1:
+                    last_seq = seq
+                    frames.append(_event_frame(job_event_from_doc(doc)))
+                else:
+                    # A gap means events were delivered out of order; read
+                    # them back from the collection in seq order
+                    frames.extend(await _catch_up())
+            else:
+                if not _BROKER.change_streams_active:
+                    frames.extend(await _catch_up())
+                status = await asyncio.to_thread(get_job_status, job_id)
+                if status is None or is_terminal_status(status):
+                    # Terminal status is set after the job's events are flushed
+                    for frame in await _catch_up():
+                        yield frame
+                    yield _end_frame(status, last_seq)
+                    return
+
+            for frame in frames:
+                yield frame
+            if frames:
+                last_sent_at = time.monotonic()
+            elif time.monotonic() - last_sent_at >= Config.JOB_STREAM_KEEPALIVE_SECONDS:
+                last_sent_at = time.monotonic()
+                yield ": ping\n\n"
+    finally:
+        _BROKER.unsubscribe(subscriber)
@@ -0,0 +1,986 @@
+"""Durable job queue for graph executions.
+
+The API enqueues init/chat jobs here and one or more worker processes claim
+them with a time-limited lease. Workers renew the lease with heartbeats while
+the graph runs; when a worker dies its lease expires and the job becomes
+claimable again.
+
+Backends:
+- MongoDB (default when reachable) – shared by every API pod and worker.
+- SQLite – single-host stand-in that still works across processes.
+- In-memory – local runs where the worker is embedded in the API process.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from app.config import Config
+from app.db import get_job_queue_collection
+from app.models.job import JobPriority, JobQueueStatus, JobType, QueuedJob
+from app.utils.jobs import get_average_job_run_seconds
+
+try:
+    from pymongo import ReturnDocument  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    ReturnDocument = None  # type: ignore
+
+
+def get_priority_weights() -> dict[JobPriority, int]:
+    """Parse Config.JOB_PRIORITY_WEIGHTS ("class=weight,...") into a mapping."""
+    weights = {priority: 1 for priority in JobPriority}
+    for part in Config.JOB_PRIORITY_WEIGHTS.split(","):
+        name, _, value = part.partition("=")
+        try:
+            weights[JobPriority(name.strip().lower())] = max(int(value), 1)
+        except ValueError:
+            continue
+    return weights
+
+
+def default_priority(job_type: JobType) -> JobPriority:
+    """Scheduling class used when the caller doesn't pick one."""
+    if job_type == JobType.CHAT:
+        return JobPriority.INTERACTIVE
+    return JobPriority.INIT
+
+
+def _classes_ahead(priority: Optional[str]) -> list[str]:
+    """Classes with a larger share than `priority` (served before it)."""
+    weights = get_priority_weights()
+    try:
+        own = weights[JobPriority(priority)]
+    except ValueError:
+        own = 0
+    return [cls.value for cls, weight in weights.items() if weight > own]
+
+
+class WeightedFairScheduler:
+    """Smooth weighted round-robin over priority classes.
+
+    `order()` gives the classes to try for the next claim, most deserving
+    first; `charge()` records which class was actually served. Classes with
+    nothing waiting are skipped, so capacity is never left idle.
+    """
+
+    def __init__(self, weights: Optional[dict[JobPriority, int]] = None) -> None:
+        self.weights = weights or get_priority_weights()
+        self._credit = {priority: 0 for priority in self.weights}
+
+    def order(self) -> list[JobPriority]:
+        return sorted(
+            self.weights,
+            key=lambda cls: self._credit[cls] + self.weights[cls],
+            reverse=True,
+        )
+
+    def charge(self, priority: JobPriority) -> None:
+        total = sum(self.weights.values())
+        for cls, weight in self.weights.items():
+            # Capped so a class that sat empty can't bank a burst of claims
+            self._credit[cls] = min(self._credit[cls] + weight, total)
+        self._credit[priority] = self._credit.get(priority, 0) - total
+
+
+class JobQueue(ABC):
+    """Interface shared by all queue backends."""
+
+    backend: str = "base"
+
+    @abstractmethod
+    def enqueue(
+        self,
+        job_id: str,
+        job_type: JobType,
+        payload: dict[str, Any],
+        priority: Optional[JobPriority] = None,
+    ) -> bool:
+        ...
+
+    @abstractmethod
+    def _claim_one(
+        self,
+        worker_id: str,
+        lease_seconds: int,
+        *,
+        priority: Optional[JobPriority] = None,
+        enqueued_before: Optional[datetime] = None,
+    ) -> Optional[QueuedJob]:
+        """Lease the oldest available job matching the filters (or one whose
+        lease expired)."""
+
+    def claim(
+        self,
+        worker_id: str,
+        lease_seconds: int,
+        priorities: Optional[list[JobPriority]] = None,
+    ) -> Optional[QueuedJob]:
+        """Lease the next job, trying priority classes in the given order.
+
+        Jobs that waited longer than Config.JOB_PRIORITY_MAX_WAIT_SECONDS are
+        served first regardless of class so low shares never starve.
+        """
+        if priorities and Config.JOB_PRIORITY_MAX_WAIT_SECONDS > 0:
+            cutoff = datetime.utcnow() - timedelta(
+                seconds=Config.JOB_PRIORITY_MAX_WAIT_SECONDS
+            )
+            entry = self._claim_one(worker_id, lease_seconds, enqueued_before=cutoff)
+            if entry is not None:
+                return entry
+        for priority in priorities or [None]:
+            entry = self._claim_one(worker_id, lease_seconds, priority=priority)
+            if entry is not None:
+                return entry
+        return None
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        """Extend a lease; returns False if the worker no longer owns it."""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str = "") -> bool:
+        ...
+
+    @abstractmethod
+    def release(
+        self,
+        job_id: str,
+        worker_id: str,
+        *,
+        delay_seconds: float = 0.0,
+        count_attempt: bool = False,
+    ) -> bool:
+        """Hand a leased job back to the queue, optionally after a delay."""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Number of jobs waiting to be claimed."""
+
+    @abstractmethod
+    def is_pending(self, job_id: str) -> bool:
+        """True while the job has a queued or leased entry."""
+
+    @abstractmethod
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position among waiting jobs, or None if not waiting."""
+
+    @abstractmethod
+    def older_session_job(
+        self, session_id: str, job_id: str, enqueued_at: Optional[datetime]
+    ) -> Optional[str]:
+        """Id of a queued or leased job of the session enqueued before `job_id`."""
+
+    def ensure_enqueued(
+        self,
+        job_id: str,
+        job_type: JobType,
+        payload: dict[str, Any],
+        priority: Optional[JobPriority] = None,
+    ) -> bool:
+        """Enqueue the job unless it already has a live entry.
+
+        Returns True when a new entry was written.
+        """
+        if self.is_pending(job_id):
+            return False
+        return self.enqueue(job_id, job_type, payload, priority)
+
+    def ensure_indexes(self) -> None:
+        return None
+
+
+def _to_queued_job(doc: dict[str, Any]) -> QueuedJob:
+    return QueuedJob(
+        job_id=str(doc.get("_id") or doc.get("job_id")),
+        type=JobType(doc.get("job_type")),
+        payload=doc.get("payload") or {},
+        priority=JobPriority(
+            doc.get("priority") or default_priority(JobType(doc.get("job_type"))).value
+        ),
+        status=JobQueueStatus(doc.get("status", JobQueueStatus.QUEUED.value)),
+        attempts=int(doc.get("attempts") or 0),
+        lease_owner=doc.get("lease_owner"),
+        lease_expires_at=doc.get("lease_expires_at"),
+        enqueued_at=doc.get("enqueued_at"),
+    )
+
+
+class MongoJobQueue(JobQueue):
+    """Queue backed by a MongoDB collection (one document per job)."""
+
+    backend = "mongo"
+
+    def __init__(self, collection) -> None:
+        self.collection = collection
+
+    def ensure_indexes(self) -> None:
+        self.collection.create_index([("status", 1), ("available_at", 1)])
+        self.collection.create_index(
+            [("status", 1), ("priority", 1), ("available_at", 1)]
+        )
+        self.collection.create_index([("status", 1), ("enqueued_at", 1)])
+        self.collection.create_index([("status", 1), ("lease_expires_at", 1)])
+        self.collection.create_index(
+            [("payload.session_id", 1), ("status", 1), ("enqueued_at", 1)]
+        )
+
+    def enqueue(
+        self,
+        job_id: str,
+        job_type: JobType,
+        payload: dict[str, Any],
+        priority: Optional[JobPriority] = None,
+    ) -> bool:
+        now = datetime.utcnow()
+        job_type = JobType(job_type)
+        doc = {
+            "_id": job_id,
+            "job_type": job_type.value,
+            "priority": (priority or default_priority(job_type)).value,
+            "payload": payload or {},
+            "status": JobQueueStatus.QUEUED.value,
+            "attempts": 0,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "enqueued_at": now,
+            "available_at": now,
+            "updated_at": now,
+        }
+        result = self.collection.replace_one({"_id": job_id}, doc, upsert=True)
+        return bool(result.upserted_id or result.modified_count)
+
+    def _claim_one(
+        self,
+        worker_id: str,
+        lease_seconds: int,
+        *,
+        priority: Optional[JobPriority] = None,
+        enqueued_before: Optional[datetime] = None,
+    ) -> Optional[QueuedJob]:
+        now = datetime.utcnow()
+        query: dict[str, Any] = {
+            "$or": [
+                {
+                    "status": JobQueueStatus.QUEUED.value,
+                    "available_at": {"$lte": now},
+                },
+                {
+                    "status": JobQueueStatus.LEASED.value,
+                    "lease_expires_at": {"$lt": now},
+                },
+            ]
+        }
+        if priority is not None:
+            query["priority"] = priority.value
+        if enqueued_before is not None:
+            query["enqueued_at"] = {"$lt": enqueued_before}
+        doc = self.collection.find_one_and_update(
+            query,
+            {
+                "$set": {
+                    "status": JobQueueStatus.LEASED.value,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                    "claimed_at": now,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("enqueued_at" if enqueued_before else "available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return _to_queued_job(doc) if doc else None
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        now = datetime.utcnow()
+        result = self.collection.update_one(
+            {
+                "_id": job_id,
+                "lease_owner": worker_id,
+                "status": JobQueueStatus.LEASED.value,
+            },
+            {
+                "$set": {
+                    "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                    "updated_at": now,
+                }
+            },
+        )
+        return result.matched_count == 1
+
+    def _finish(
+        self, job_id: str, worker_id: str, status: JobQueueStatus, error: str = ""
+    ) -> bool:
+        now = datetime.utcnow()
+        result = self.collection.update_one(
+            {"_id": job_id, "lease_owner": worker_id},
+            {
+                "$set": {
+                    "status": status.value,
+                    "lease_expires_at": None,
+                    "finished_at": now,
+                    "updated_at": now,
+                    "error": error or None,
+                }
+            },
+        )
+        return result.modified_count == 1
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        return self._finish(job_id, worker_id, JobQueueStatus.DONE)
+
+    def fail(self, job_id: str, worker_id: str, error: str = "") -> bool:
+        return self._finish(job_id, worker_id, JobQueueStatus.FAILED, error)
+
+    def release(
+        self,
+        job_id: str,
+        worker_id: str,
+        *,
+        delay_seconds: float = 0.0,
+        count_attempt: bool = False,
+    ) -> bool:
+        now = datetime.utcnow()
+        update: dict[str, Any] = {
+            "$set": {
+                "status": JobQueueStatus.QUEUED.value,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "available_at": now + timedelta(seconds=delay_seconds),
+                "updated_at": now,
+            }
+        }
+        if not count_attempt:
+            update["$inc"] = {"attempts": -1}
+        result = self.collection.update_one(
+            {"_id": job_id, "lease_owner": worker_id}, update
+        )
+        return result.modified_count == 1
+
+    def depth(self) -> int:
+        return self.collection.count_documents(
+            {"status": JobQueueStatus.QUEUED.value}
+        )
+
+    def is_pending(self, job_id: str) -> bool:
+        return (
+            self.collection.count_documents(
+                {
+                    "_id": job_id,
+                    "status": {
+                        "$in": [
+                            JobQueueStatus.QUEUED.value,
+                            JobQueueStatus.LEASED.value,
+                        ]
+                    },
+                },
+                limit=1,
+            )
+            > 0
+        )
+
+    def position(self, job_id: str) -> Optional[int]:
+        entry = self.collection.find_one(
+            {"_id": job_id, "status": JobQueueStatus.QUEUED.value},
+            projection={"available_at": 1, "priority": 1},
+        )
+        if not entry:
+            return None
+        ahead = self.collection.count_documents(
+            {
+                "status": JobQueueStatus.QUEUED.value,
+                "$or": [
+                    {"priority": {"$in": _classes_ahead(entry.get("priority"))}},
+                    {
+                        "priority": entry.get("priority"),
+                        "available_at": {"$lt": entry["available_at"]},
+                    },
+                ],
+            }
+        )
+        return ahead + 1
+
+    def older_session_job(
+        self, session_id: str, job_id: str, enqueued_at: Optional[datetime]
+    ) -> Optional[str]:
+        if not session_id or enqueued_at is None:
+            return None
+        doc = self.collection.find_one(
+            {
+                "payload.session_id": session_id,
+                "_id": {"$ne": job_id},
+                "status": {
+                    "$in": [JobQueueStatus.QUEUED.value, JobQueueStatus.LEASED.value]
+                },
+                "enqueued_at": {"$lt": enqueued_at},
+            },
+            projection={"_id": 1},
+            sort=[("enqueued_at", 1)],
+        )
+        return str(doc["_id"]) if doc else None
+
+
+class SQLiteJobQueue(JobQueue):
+    """Single-host queue stored in a SQLite file (safe across processes)."""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS job_queue (
+                    job_id TEXT PRIMARY KEY,
+                    job_type TEXT NOT NULL,
+                    priority TEXT NOT NULL DEFAULT 'init',
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    enqueued_at REAL NOT NULL,
+                    available_at REAL NOT NULL,
+                    finished_at REAL,
+                    error TEXT
+                )
+                """
+            )
+            columns = {
+                row["name"] for row in conn.execute("PRAGMA table_info(job_queue)")
+            }
+            if "priority" not in columns:
+                # Queue files created before priority classes existed
+                conn.execute(
+                    "ALTER TABLE job_queue "
+                    "ADD COLUMN priority TEXT NOT NULL DEFAULT 'init'"
+                )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_job_queue_status "
+                "ON job_queue (status, available_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_job_queue_priority "
+                "ON job_queue (status, priority, available_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_job_queue_session "
+                "ON job_queue (json_extract(payload, '$.session_id'), status, enqueued_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _ts(value: Optional[float]) -> Optional[datetime]:
+        return datetime.utcfromtimestamp(value) if value is not None else None
+
+    def _row_to_job(self, row: sqlite3.Row) -> QueuedJob:
+        return _to_queued_job(
+            {
+                "job_id": row["job_id"],
+                "job_type": row["job_type"],
+                "priority": row["priority"],
+                "payload": json.loads(row["payload"] or "{}"),
+                "status": row["status"],
+                "attempts": row["attempts"],
+                "lease_owner": row["lease_owner"],
+                "lease_expires_at": self._ts(row["lease_expires_at"]),
+                "enqueued_at": self._ts(row["enqueued_at"]),
+            }
+        )
+
+    def enqueue(
+        self,
+        job_id: str,
+        job_type: JobType,
+        payload: dict[str, Any],
+        priority: Optional[JobPriority] = None,
+    ) -> bool:
+        now = datetime.utcnow().timestamp()
+        job_type = JobType(job_type)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO job_queue
+                    (job_id, job_type, priority, payload, status, attempts,
+                     lease_owner, lease_expires_at, enqueued_at, available_at)
+                VALUES (?, ?, ?, ?, ?, 0, NULL, NULL, ?, ?)
+                """,
+                (
+                    job_id,
+                    job_type.value,
+                    (priority or default_priority(job_type)).value,
+                    json.dumps(payload or {}, default=str),
+                    JobQueueStatus.QUEUED.value,
+                    now,
+                    now,
+                ),
+            )
+        return True
+
+    def _claim_one(
+        self,
+        worker_id: str,
+        lease_seconds: int,
+        *,
+        priority: Optional[JobPriority] = None,
+        enqueued_before: Optional[datetime] = None,
+    ) -> Optional[QueuedJob]:
+        now = datetime.utcnow().timestamp()
+        filters = ""
+        params: list[Any] = [
+            JobQueueStatus.QUEUED.value,
+            now,
+            JobQueueStatus.LEASED.value,
+            now,
+        ]
+        if priority is not None:
+            filters += " AND priority = ?"
+            params.append(priority.value)
+        if enqueued_before is not None:
+            filters += " AND enqueued_at < ?"
+            params.append(enqueued_before.timestamp())
+        order = "enqueued_at" if enqueued_before is not None else "available_at"
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    f"""
+                    SELECT * FROM job_queue
+                    WHERE ((status = ? AND available_at <= ?)
+                       OR (status = ? AND lease_expires_at < ?)){filters}
+                    ORDER BY {order} ASC
+                    LIMIT 1
+                    """,
+                    params,
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    """
+                    UPDATE job_queue
+                    SET status = ?, lease_owner = ?, lease_expires_at = ?,
+                        attempts = attempts + 1
+                    WHERE job_id = ?
+                    """,
+                    (
+                        JobQueueStatus.LEASED.value,
+                        worker_id,
+                        now + lease_seconds,
+                        row["job_id"],
+                    ),
+                )
+                claimed = conn.execute(
+                    "SELECT * FROM job_queue WHERE job_id = ?", (row["job_id"],)
+                ).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._row_to_job(claimed)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        expires = datetime.utcnow().timestamp() + lease_seconds
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE job_queue SET lease_expires_at = ?
+                WHERE job_id = ? AND lease_owner = ? AND status = ?
+                """,
+                (expires, job_id, worker_id, JobQueueStatus.LEASED.value),
+            )
+        return cursor.rowcount == 1
+
+    def _finish(
+        self, job_id: str, worker_id: str, status: JobQueueStatus, error: str = ""
+    ) -> bool:
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE job_queue
+                SET status = ?, lease_expires_at = NULL, finished_at = ?, error = ?
+                WHERE job_id = ? AND lease_owner = ?
+                """,
+                (
+                    status.value,
+                    datetime.utcnow().timestamp(),
+                    error or None,
+                    job_id,
+                    worker_id,
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        return self._finish(job_id, worker_id, JobQueueStatus.DONE)
+
+    def fail(self, job_id: str, worker_id: str, error: str = "") -> bool:
+        return self._finish(job_id, worker_id, JobQueueStatus.FAILED, error)
+
+    def release(
+        self,
+        job_id: str,
+        worker_id: str,
+        *,
+        delay_seconds: float = 0.0,
+        count_attempt: bool = False,
+    ) -> bool:
+        available_at = datetime.utcnow().timestamp() + delay_seconds
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE job_queue
+                SET status = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    available_at = ?, attempts = attempts - ?
+                WHERE job_id = ? AND lease_owner = ?
+                """,
+                (
+                    JobQueueStatus.QUEUED.value,
+                    available_at,
+                    0 if count_attempt else 1,
+                    job_id,
+                    worker_id,
+                ),
+            )
+        return cursor.rowcount == 1
+
+    def depth(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM job_queue WHERE status = ?",
+                (JobQueueStatus.QUEUED.value,),
+            ).fetchone()
+        return int(row[0]) if row else 0
+
+    def is_pending(self, job_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM job_queue WHERE job_id = ? AND status IN (?, ?)",
+                (job_id, JobQueueStatus.QUEUED.value, JobQueueStatus.LEASED.value),
+            ).fetchone()
+        return row is not None
+
+    def position(self, job_id: str) -> Optional[int]:
+        with self._connect() as conn:
+            target = conn.execute(
+                "SELECT priority, available_at FROM job_queue "
+                "WHERE job_id = ? AND status = ?",
+                (job_id, JobQueueStatus.QUEUED.value),
+            ).fetchone()
+            if target is None:
+                return None
+            ahead_classes = _classes_ahead(target["priority"])
+            placeholders = ",".join("?" for _ in ahead_classes) or "NULL"
+            row = conn.execute(
+                f"""
+                SELECT COUNT(*) FROM job_queue
+                WHERE status = ?
+                  AND (priority IN ({placeholders})
+                       OR (priority = ? AND available_at < ?))
+                """,
+                (
+                    JobQueueStatus.QUEUED.value,
+                    *ahead_classes,
+                    target["priority"],
+                    target["available_at"],
+                ),
+            ).fetchone()
+        return int(row[0]) + 1
+
+    def older_session_job(
+        self, session_id: str, job_id: str, enqueued_at: Optional[datetime]
+    ) -> Optional[str]:
+        if not session_id or enqueued_at is None:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT job_id FROM job_queue
+                WHERE json_extract(payload, '$.session_id') = ?
+                  AND job_id != ? AND status IN (?, ?) AND enqueued_at < ?
+                ORDER BY enqueued_at ASC
+                LIMIT 1
+                """,
+                (
+                    session_id,
+                    job_id,
+                    JobQueueStatus.QUEUED.value,
+                    JobQueueStatus.LEASED.value,
+                    enqueued_at.timestamp(),
+                ),
+            ).fetchone()
+        return row["job_id"] if row else None
+
+
+class InMemoryJobQueue(JobQueue):
+    """Process-local queue; only usable with an embedded worker."""
+
+    backend = "memory"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = {}
+
+    def enqueue(
+        self,
+        job_id: str,
+        job_type: JobType,
+        payload: dict[str, Any],
+        priority: Optional[JobPriority] = None,
+    ) -> bool:
+        now = datetime.utcnow()
+        job_type = JobType(job_type)
+        with self._lock:
+            self._entries[job_id] = {
+                "_id": job_id,
+                "job_type": job_type.value,
+                "priority": (priority or default_priority(job_type)).value,
+                "payload": payload or {},
+                "status": JobQueueStatus.QUEUED.value,
+                "attempts": 0,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "enqueued_at": now,
+                "available_at": now,
+            }
+        return True
+
+    def _claim_one(
+        self,
+        worker_id: str,
+        lease_seconds: int,
+        *,
+        priority: Optional[JobPriority] = None,
+        enqueued_before: Optional[datetime] = None,
+    ) -> Optional[QueuedJob]:
+        now = datetime.utcnow()
+        with self._lock:
+            candidates = [
+                entry
+                for entry in self._entries.values()
+                if (
+                    (
+                        entry["status"] == JobQueueStatus.QUEUED.value
+                        and entry["available_at"] <= now
+                    )
+                    or (
+                        entry["status"] == JobQueueStatus.LEASED.value
+                        and entry["lease_expires_at"] is not None
+                        and entry["lease_expires_at"] < now
+                    )
+                )
+                and (priority is None or entry["priority"] == priority.value)
+                and (enqueued_before is None or entry["enqueued_at"] < enqueued_before)
+            ]
+            if not candidates:
+                return None
+            order = "enqueued_at" if enqueued_before is not None else "available_at"
+            entry = min(candidates, key=lambda item: item[order])
+            entry["status"] = JobQueueStatus.LEASED.value
+            entry["lease_owner"] = worker_id
+            entry["lease_expires_at"] = now + timedelta(seconds=lease_seconds)
+            entry["attempts"] += 1
+            return _to_queued_job(dict(entry))
+
+    def _owned(self, job_id: str, worker_id: str) -> Optional[dict[str, Any]]:
+        entry = self._entries.get(job_id)
+        if entry is None or entry["lease_owner"] != worker_id:
+            return None
+        return entry
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int) -> bool:
+        with self._lock:
+            entry = self._owned(job_id, worker_id)
+            if entry is None or entry["status"] != JobQueueStatus.LEASED.value:
+                return False
+            entry["lease_expires_at"] = datetime.utcnow() + timedelta(
+                seconds=lease_seconds
+            )
+            return True
+
+    def _finish(self, job_id: str, worker_id: str, status: JobQueueStatus) -> bool:
+        with self._lock:
+            entry = self._owned(job_id, worker_id)
+            if entry is None:
+                return False
+            # Finished entries are dropped so long-running API processes don't grow.
+            self._entries.pop(job_id, None)
+            return True
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        return self._finish(job_id, worker_id, JobQueueStatus.DONE)
+
+    def fail(self, job_id: str, worker_id: str, error: str = "") -> bool:
+        return self._finish(job_id, worker_id, JobQueueStatus.FAILED)
+
+    def release(
+        self,
+        job_id: str,
+        worker_id: str,
+        *,
+        delay_seconds: float = 0.0,
+        count_attempt: bool = False,
+    ) -> bool:
+        with self._lock:
+            entry = self._owned(job_id, worker_id)
+            if entry is None:
+                return False
+            entry["status"] = JobQueueStatus.QUEUED.value
+            entry["lease_owner"] = None
+            entry["lease_expires_at"] = None
+            entry["available_at"] = datetime.utcnow() + timedelta(
+                seconds=delay_seconds
+            )
+            if not count_attempt:
+                entry["attempts"] -= 1
+            return True
+
+    def depth(self) -> int:
+        with self._lock:
+            return sum(
+                1
+                for entry in self._entries.values()
+                if entry["status"] == JobQueueStatus.QUEUED.value
+            )
+
+    def is_pending(self, job_id: str) -> bool:
+        # Finished entries are dropped, so any entry left is queued or leased.
+        with self._lock:
+            return job_id in self._entries
+
+    def position(self, job_id: str) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is None or entry["status"] != JobQueueStatus.QUEUED.value:
+                return None
+            ahead_classes = set(_classes_ahead(entry["priority"]))
+            return 1 + sum(
+                1
+                for other in self._entries.values()
+                if other["status"] == JobQueueStatus.QUEUED.value
+                and (
+                    other["priority"] in ahead_classes
+                    or (
+                        other["priority"] == entry["priority"]
+                        and other["available_at"] < entry["available_at"]
+                    )
+                )
+            )
+
+    def older_session_job(
+        self, session_id: str, job_id: str, enqueued_at: Optional[datetime]
+    ) -> Optional[str]:
+        if not session_id or enqueued_at is None:
+            return None
+        # Finished entries are dropped, so any entry left is queued or leased.
+        with self._lock:
+            older = [
+                entry
+                for entry in self._entries.values()
+                if entry["_id"] != job_id
+                and entry["payload"].get("session_id") == session_id
+                and entry["enqueued_at"] < enqueued_at
+            ]
+        if not older:
+            return None
+        return min(older, key=lambda entry: entry["enqueued_at"])["_id"]
+
+
+_JOB_QUEUE: Optional[JobQueue] = None
+_JOB_QUEUE_LOCK = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Return the process-wide job queue, building it on first use.
+
+    Honors Config.JOB_QUEUE_BACKEND; in auto mode prefers MongoDB and falls
+    back to the in-memory queue when Mongo is unavailable.
+    """
+    global _JOB_QUEUE
+    if _JOB_QUEUE is not None:
+        return _JOB_QUEUE
+    with _JOB_QUEUE_LOCK:
+        if _JOB_QUEUE is not None:
+            return _JOB_QUEUE
+
+        backend = Config.JOB_QUEUE_BACKEND
+        queue: Optional[JobQueue] = None
+        if backend in {"", "mongo"}:
+            collection = get_job_queue_collection()
+            if collection is not None and ReturnDocument is not None:
+                queue = MongoJobQueue(collection)
+            elif backend == "mongo":
+                print("[JOB_QUEUE] Warning: Mongo unavailable; using in-memory queue")
+        elif backend == "sqlite":
+            queue = SQLiteJobQueue(Config.JOB_QUEUE_SQLITE_PATH)
+
+        _JOB_QUEUE = queue or InMemoryJobQueue()
+        print(f"[JOB_QUEUE] Using {_JOB_QUEUE.backend} job queue backend")
+        return _JOB_QUEUE
+
+
+def enqueue_job(
+    job_id: str,
+    job_type: JobType,
+    payload: dict[str, Any],
+    priority: Optional[JobPriority] = None,
+) -> bool:
+    """
+    Enqueue a job for a worker to pick up.
+
+    `priority` defaults to the job type's class (chat → interactive,
+    init → init); callers pass DEPLOY for deploy-only chat messages.
+
+    Returns:
+        True if the job was stored in the queue, False otherwise.
+    """
+    try:
+        return get_job_queue().enqueue(job_id, job_type, payload, priority)
+    except Exception as e:
+        print(f"[JOB_QUEUE] Error: failed to enqueue job {job_id}: {e}")
+        return False
+
+
+def estimate_queue_wait(job_id: str) -> tuple[Optional[int], Optional[datetime]]:
+    """
+    Queue position and a rough start time for a waiting job.
+
+    The estimate assumes jobs start in waves of the admission capacity and that
+    running jobs are on average half done.
+
+    Returns:
+        (position, estimated_start_at), both None if the job is not waiting.
+    """
+    try:
+        position = get_job_queue().position(job_id)
+    except Exception as e:
+        print(f"[JOB_QUEUE] Warning: failed to read position of {job_id}: {e}")
+        return None, None
+    if position is None:
+        return None, None
+
+    capacity = Config.JOB_MAX_ACTIVE_RUNS or Config.JOB_WORKER_CONCURRENCY
+    run_seconds = get_average_job_run_seconds() or Config.JOB_ESTIMATED_RUN_SECONDS
+    waves = math.ceil(position / max(capacity, 1))
+    wait_seconds = (waves - 0.5) * run_seconds
+    return position, datetime.utcnow() + timedelta(seconds=wait_seconds)
@@ -2,32 +2,86 @@
 
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, Any, Tuple, List
+import base64
 import uuid
 
-from app.db import get_jobs_collection
-from app.models.job import Job, JobInDB, JobCreate, JobEvent, JobStatus, JobType
-
-_LAST_AGENT_MESSAGES: dict[str, str] = {}
+from app.config import Config
+from app.db import get_job_events_collection, get_jobs_collection
+from app.utils.job_event_sink import (
+    add_flush_listener,
+    buffer_job_event,
+    flush_job_events,
+)
+from app.utils.llm_usage import job_usage_from_doc
+from app.utils.ttl_cache import TTLCache
+from app.models.job import (
+    Job,
+    JobInDB,
+    JobCreate,
+    JobEvent,
+    JobStatus,
+    JobSummary,
+    JobType,
+)
+
+# Local copy of each job's latest agent message; the job document's
+# `last_agent_message` is the shared copy any worker can read.
+_LAST_AGENT_MESSAGES: TTLCache[str, str] = TTLCache(
+    max_entries=Config.LAST_AGENT_MESSAGE_CACHE_SIZE,
+    ttl_seconds=Config.LAST_AGENT_MESSAGE_TTL_SECONDS,
+)
+
+_TERMINAL_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+def _is_agent_message(node: str, message: str, event_type: Optional[str]) -> bool:
+    return (
+        bool(message)
+        and event_type in {"node_completed", "node"}
+        and node in {"coder", "deployment_fixer", "clarify"}
+    )
 
 
 def _track_last_agent_message(
     job_id: str | None, *, node: str, message: str, event_type: Optional[str]
 ) -> None:
-    if not job_id:
-        return
-    if not message:
-        return
-    if event_type not in {"node_completed", "node"}:
-        return
-    if node not in {"coder", "deployment_fixer", "clarify"}:
-        return
-    _LAST_AGENT_MESSAGES[job_id] = message
+    # Memory only; the job document is updated when the events are flushed
+    if job_id and _is_agent_message(node, message, event_type):
+        _LAST_AGENT_MESSAGES.set(job_id, message)
+
+
+def _persist_last_agent_message(job_id: str, docs: list[dict[str, Any]]) -> None:
+    """Flush listener: store the newest agent message of a flushed batch."""
+    for doc in reversed(docs):
+        if _is_agent_message(doc["node"], doc["message"], doc["event_type"]):
+            collection = get_jobs_collection()
+            if collection is not None:
+                collection.update_one(
+                    {"_id": job_id}, {"$set": {"last_agent_message": doc["message"]}}
+                )
+            return
+
+
+add_flush_listener(_persist_last_agent_message)
 
 
 def pop_last_agent_message(job_id: str) -> Optional[str]:
-    return _LAST_AGENT_MESSAGES.pop(job_id, None)
+    """
+    Return the job's latest agent message and drop the local copy.
+
+    Falls back to the job document when this process didn't record it (e.g.
+    the job was resumed by another worker).
+    """
+    cached = _LAST_AGENT_MESSAGES.pop(job_id)
+    if cached:
+        return cached
+    collection = get_jobs_collection()
+    if collection is None:
+        return None
+    doc = collection.find_one({"_id": job_id}, projection={"last_agent_message": 1})
+    return (doc or {}).get("last_agent_message")
 
 
 def create_job(job_data: JobCreate) -> Optional[Job]:
@@ -49,13 +103,14 @@ def create_job(job_data: JobCreate) -> Optional[Job]:
         "type": (
             job_data.type.value if isinstance(job_data.type, JobType) else job_data.type
         ),
-        "status": JobStatus.RUNNING.value,
+        "status": JobStatus.PENDING.value,
         "session_id": job_data.session_id,
         "user_id": job_data.user_id,
         "title": job_data.title,
         "description": job_data.description,
         "initial_payload": job_data.initial_payload or {},
-        "events": [],
+        # Events live in the job_events collection; this counter hands out seqs
+        "event_seq": 0,
         "error_message": None,
         "created_at": now,
         "updated_at": now,
@@ -66,7 +121,7 @@ def create_job(job_data: JobCreate) -> Optional[Job]:
     return Job(
         id=job_id,
         type=JobType(doc["type"]),
-        status=JobStatus.RUNNING,
+        status=JobStatus.PENDING,
         session_id=doc["session_id"],
         user_id=doc["user_id"],
         title=doc["title"],
@@ -88,6 +143,22 @@ def _normalize_event_type(node: str, raw_event_type: str | None = None) -> str:
     return "node"
 
 
+def _build_event_doc(
+    node: str,
+    message: str = "",
+    event_type: Optional[str] = None,
+    data: Optional[dict[str, Any]] = None,
+) -> dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "node": node,
+        "timestamp": datetime.utcnow(),
+        "event_type": _normalize_event_type(node, event_type),
+        "message": message or "",
+        "data": data or {},
+    }
+
+
 def append_job_event(
     job_id: str,
     *,
@@ -97,36 +168,19 @@ def append_job_event(
     data: Optional[dict[str, Any]] = None,
 ) -> bool:
     """
-    Append a single event to a job's events array.
+    Append a single event to a job and write it immediately.
+
+    Prefer log_job_event, which buffers events off the caller's critical path.
 
     Returns:
-        True if the job was updated, False otherwise.
+        True if the event was written, False otherwise.
     """
-    collection = get_jobs_collection()
-    if collection is None:
+    if get_jobs_collection() is None:
         return False
 
-    event_id = str(uuid.uuid4())
-    now = datetime.utcnow()
-
-    event_doc = {
-        "id": event_id,
-        "node": node,
-        "timestamp": now,
-        "event_type": _normalize_event_type(node, event_type),
-        "message": message or "",
-        "data": data or {},
-    }
-
-    result = collection.update_one(
-        {"_id": job_id},
-        {
-            "$push": {"events": event_doc},
-            "$set": {"updated_at": now},
-        },
-    )
-
-    return result.modified_count == 1
+    # Goes through the sink so it lands after events already buffered
+    buffer_job_event(job_id, _build_event_doc(node, message, event_type, data))
+    return flush_job_events(job_id)
 
 
 def log_job_event(
@@ -141,17 +195,13 @@ def log_job_event(
     Convenience helper for logging a job event when you already have a job id.
 
     Safe to call from anywhere (nodes, runners); no-op if job_id is missing.
+    The event is buffered and written in bulk by the job event sink, so the
+    caller never waits on MongoDB.
     """
     if not job_id:
         return
     try:
-        append_job_event(
-            job_id,
-            node=node,
-            message=message,
-            event_type=event_type,
-            data=data or {},
-        )
+        buffer_job_event(job_id, _build_event_doc(node, message, event_type, data))
         _track_last_agent_message(
             job_id, node=node, message=message or "", event_type=event_type
         )
@@ -176,6 +226,10 @@ def update_job_status(
     if collection is None:
         return False
 
+    # A finished job must never be visible with events still buffered
+    if JobStatus(status) in _TERMINAL_STATUSES:
+        flush_job_events(job_id)
+
     now = datetime.utcnow()
     update_doc: dict[str, Any] = {
         "status": status.value if isinstance(status, JobStatus) else status,
@@ -191,6 +245,311 @@ def update_job_status(
     return result.modified_count == 1
 
 
+def mark_job_running(job_id: str, *, worker_id: str) -> bool:
+    """
+    Flag a job as running on the given worker and stamp its first heartbeat.
+    A job cancelled meanwhile is left cancelled.
+
+    Returns:
+        False if the job was cancelled (or no longer exists) and must not run,
+        True otherwise (including when there is no MongoDB to update).
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return True
+
+    now = datetime.utcnow()
+    result = collection.update_one(
+        {"_id": job_id, "status": {"$ne": JobStatus.CANCELLED.value}},
+        {
+            "$set": {
+                "status": JobStatus.RUNNING.value,
+                "worker_id": worker_id,
+                "started_at": now,
+                "heartbeat_at": now,
+                "updated_at": now,
+            }
+        },
+    )
+    return result.modified_count == 1
+
+
+def touch_job_heartbeat(job_id: str, *, worker_id: str) -> bool:
+    """
+    Record that the worker executing a job is still alive.
+
+    Returns:
+        True if the job was updated, False otherwise.
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return False
+
+    result = collection.update_one(
+        {"_id": job_id, "worker_id": worker_id},
+        {"$set": {"heartbeat_at": datetime.utcnow()}},
+    )
+    return result.modified_count == 1
+
+
+def get_active_job_id_for_session(session_id: str) -> Optional[str]:
+    """
+    Return the id of the newest pending or running job for a session, if any.
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return None
+
+    doc = collection.find_one(
+        {
+            "session_id": session_id,
+            "status": {"$in": [JobStatus.PENDING.value, JobStatus.RUNNING.value]},
+        },
+        projection={"_id": 1},
+        sort=[("created_at", -1)],
+    )
+    return str(doc["_id"]) if doc else None
+
+
+def claim_orphaned_running_jobs(stale_seconds: int) -> List[dict[str, Any]]:
+    """
+    Find RUNNING jobs whose worker stopped heartbeating and claim them for
+    recovery.
+
+    Each orphan is claimed atomically (its heartbeat is bumped) so concurrent
+    reconcilers don't recover the same job twice.
+
+    Returns:
+        Raw job documents (id, type, session_id, initial_payload) claimed.
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return []
+
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    stale_query: dict[str, Any] = {
+        "status": JobStatus.RUNNING.value,
+        "$or": [
+            {"heartbeat_at": {"$lt": cutoff}},
+            # Jobs started before heartbeats were recorded
+            {"heartbeat_at": None, "updated_at": {"$lt": cutoff}},
+        ],
+    }
+    projection = {"_id": 1, "type": 1, "session_id": 1, "initial_payload": 1}
+
+    claimed: List[dict[str, Any]] = []
+    for doc in collection.find(stale_query, projection=projection):
+        now = datetime.utcnow()
+        result = collection.update_one(
+            {"_id": doc["_id"], **stale_query},
+            {"$set": {"heartbeat_at": now, "recovered_at": now, "updated_at": now}},
+        )
+        if result.modified_count == 1:
+            claimed.append(doc)
+    return claimed
+
+
+_RUN_SECONDS_CACHE: dict[str, float] = {}
+_RUN_SECONDS_TTL = 60.0
+
+
+def get_average_job_run_seconds(*, sample_size: int = 20) -> Optional[float]:
+    """
+    Average wall-clock run time of recently completed jobs.
+
+    Cached for a minute since job polling calls it on every request.
+
+    Returns:
+        Seconds, or None when there is no history yet.
+    """
+    now_ts = datetime.utcnow().timestamp()
+    if now_ts - _RUN_SECONDS_CACHE.get("at", 0.0) < _RUN_SECONDS_TTL:
+        value = _RUN_SECONDS_CACHE.get("value")
+        return value if value and value > 0 else None
+
+    collection = get_jobs_collection()
+    if collection is None:
+        return None
+
+    durations: List[float] = []
+    cursor = (
+        collection.find(
+            {"status": JobStatus.COMPLETED.value, "started_at": {"$ne": None}},
+            projection={"started_at": 1, "updated_at": 1},
+        )
+        .sort("updated_at", -1)
+        .limit(sample_size)
+    )
+    for doc in cursor:
+        started_at, finished_at = doc.get("started_at"), doc.get("updated_at")
+        if started_at and finished_at and finished_at > started_at:
+            durations.append((finished_at - started_at).total_seconds())
+
+    average = sum(durations) / len(durations) if durations else 0.0
+    _RUN_SECONDS_CACHE.update({"at": now_ts, "value": average})
+    return average or None
+
+
+def list_active_job_ids_for_session(session_id: str) -> List[str]:
+    """
+    Return the ids of all pending or running jobs for a session.
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return []
+
+    cursor = collection.find(
+        {
+            "session_id": session_id,
+            "status": {"$in": [JobStatus.PENDING.value, JobStatus.RUNNING.value]},
+        },
+        projection={"_id": 1},
+    )
+    return [str(doc["_id"]) for doc in cursor]
+
+
+def request_job_cancel(job_id: str) -> Optional[JobStatus]:
+    """
+    Ask for a job to be cancelled.
+
+    Pending jobs are cancelled outright (the worker skips them when claimed).
+    Running jobs are only flagged with `cancel_requested_at`; the worker that
+    owns the job stops the graph and marks it cancelled.
+
+    Returns:
+        The job status after the request, or None if the job is not active.
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return None
+
+    now = datetime.utcnow()
+    result = collection.update_one(
+        {"_id": job_id, "status": JobStatus.PENDING.value},
+        {
+            "$set": {
+                "status": JobStatus.CANCELLED.value,
+                "cancel_requested_at": now,
+                "updated_at": now,
+            }
+        },
+    )
+    if result.modified_count == 1:
+        return JobStatus.CANCELLED
+
+    result = collection.update_one(
+        {"_id": job_id, "status": JobStatus.RUNNING.value},
+        {"$set": {"cancel_requested_at": now, "updated_at": now}},
+    )
+    if result.modified_count == 1:
+        return JobStatus.RUNNING
+    return None
+
+
+def is_job_cancel_requested(job_id: str) -> bool:
+    """
+    Return True if the job was cancelled or has a pending cancel request.
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return False
+
+    doc = collection.find_one(
+        {"_id": job_id}, projection={"status": 1, "cancel_requested_at": 1}
+    )
+    if not doc:
+        return False
+    return bool(
+        doc.get("cancel_requested_at")
+        or doc.get("status") == JobStatus.CANCELLED.value
+    )
+
+
+def get_cancel_requested_job_ids(job_ids: List[str]) -> List[str]:
+    """
+    Return the subset of `job_ids` that have a pending cancel request.
+    """
+    collection = get_jobs_collection()
+    if collection is None or not job_ids:
+        return []
+
+    cursor = collection.find(
+        {"_id": {"$in": job_ids}, "cancel_requested_at": {"$ne": None}},
+        projection={"_id": 1},
+    )
+    return [str(doc["_id"]) for doc in cursor]
+
+
+def job_event_from_doc(ev: dict[str, Any]) -> JobEvent:
+    return JobEvent(
+        id=str(ev.get("id") or ev.get("_id") or ""),
+        seq=ev.get("seq"),
+        node=ev.get("node", ""),
+        timestamp=ev.get("timestamp"),
+        event_type=ev.get("event_type", ""),
+        message=ev.get("message", ""),
+        data=ev.get("data", {}) or {},
+    )
+
+
+def list_job_events(
+    job_id: str, *, after_seq: int = 0, limit: Optional[int] = None
+) -> List[JobEvent]:
+    """
+    Return a job's events with `seq` greater than `after_seq`, oldest first.
+    """
+    collection = get_job_events_collection()
+    if collection is None:
+        return []
+
+    cursor = collection.find({"job_id": job_id, "seq": {"$gt": after_seq}}).sort(
+        "seq", 1
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+    return [job_event_from_doc(ev) for ev in cursor]
+
+
+def _events_by_job(job_ids: List[str]) -> dict[str, List[JobEvent]]:
+    """Fetch the events of several jobs with one query."""
+    collection = get_job_events_collection()
+    grouped: dict[str, List[JobEvent]] = {job_id: [] for job_id in job_ids}
+    if collection is None or not job_ids:
+        return grouped
+
+    cursor = collection.find({"job_id": {"$in": job_ids}}).sort(
+        [("job_id", 1), ("seq", 1)]
+    )
+    for ev in cursor:
+        grouped.setdefault(ev["job_id"], []).append(job_event_from_doc(ev))
+    return grouped
+
+
+def get_job_status(job_id: str) -> Optional[JobStatus]:
+    """
+    Read only a job's status (no events).
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return None
+    doc = collection.find_one({"_id": job_id}, projection={"status": 1})
+    return JobStatus(doc["status"]) if doc and doc.get("status") else None
+
+
+def is_terminal_status(status: Optional[JobStatus]) -> bool:
+    return status in _TERMINAL_STATUSES
+
+
+def user_owns_job(job_id: str, user_id: str) -> bool:
+    """
+    Cheap ownership check that doesn't load the job's events.
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return False
+    return collection.count_documents({"_id": job_id, "user_id": user_id}, limit=1) > 0
+
+
 def get_job(job_id: str, *, user_id: Optional[str] = None) -> Optional[JobInDB]:
     """
     Fetch a single job by id (and optional user ownership).
@@ -210,19 +569,9 @@ def get_job(job_id: str, *, user_id: Optional[str] = None) -> Optional[JobInDB]:
     if not doc:
         return None
 
-    # Normalize events into JobEvent models
-    events = []
-    for ev in doc.get("events", []):
-        events.append(
-            JobEvent(
-                id=ev.get("id", ""),
-                node=ev.get("node", ""),
-                timestamp=ev.get("timestamp"),
-                event_type=ev.get("event_type", ""),
-                message=ev.get("message", ""),
-                data=ev.get("data", {}) or {},
-            )
-        )
+    # Jobs created before the job_events collection keep an embedded array
+    events = [job_event_from_doc(ev) for ev in doc.get("events", [])]
+    events.extend(list_job_events(job_id))
 
     return JobInDB(
         _id=str(doc.get("_id")),
@@ -236,6 +585,7 @@ def get_job(job_id: str, *, user_id: Optional[str] = None) -> Optional[JobInDB]:
         created_at=doc.get("created_at"),
         updated_at=doc.get("updated_at"),
         error_message=doc.get("error_message"),
+        usage=job_usage_from_doc(doc),
     )
 
 
@@ -262,22 +612,20 @@ def list_jobs_for_user(
     query = {"user_id": user_id}
 
     total = collection.count_documents(query)
-    cursor = collection.find(query).sort("created_at", -1).skip(skip).limit(page_size)
+    cursor = (
+        collection.find(query)
+        .sort([("created_at", -1), ("_id", -1)])
+        .skip(skip)
+        .limit(page_size)
+    )
+
+    docs = list(cursor)
+    events_by_job = _events_by_job([str(doc.get("_id")) for doc in docs])
 
     items: List[JobInDB] = []
-    for doc in cursor:
-        events = []
-        for ev in doc.get("events", []):
-            events.append(
-                JobEvent(
-                    id=ev.get("id", ""),
-                    node=ev.get("node", ""),
-                    timestamp=ev.get("timestamp"),
-                    event_type=ev.get("event_type", ""),
-                    message=ev.get("message", ""),
-                    data=ev.get("data", {}) or {},
-                )
-            )
+    for doc in docs:
+        events = [job_event_from_doc(ev) for ev in doc.get("events", [])]
+        events.extend(events_by_job.get(str(doc.get("_id")), []))
 
         items.append(
             JobInDB(
@@ -296,3 +644,88 @@ def list_jobs_for_user(
         )
 
     return items, total
+
+
+# Summary listings never need the (potentially large) events or payload
+_SUMMARY_PROJECTION = {"events": 0, "initial_payload": 0, "last_agent_message": 0}
+
+
+def _encode_list_cursor(doc: dict[str, Any]) -> str:
+    raw = f"{doc['created_at'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_list_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Raises:
+        ValueError: if the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, job_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), job_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def list_job_summaries_for_user(
+    user_id: str,
+    *,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+) -> Tuple[List[JobSummary], Optional[str], Optional[int]]:
+    """
+    List a user's jobs newest first without their events.
+
+    Uses keyset pagination on (created_at, _id) served by the
+    (user_id, created_at, _id) index, so each page costs the same regardless
+    of how deep it is. Counting all jobs is optional because it is the only
+    part that grows with the user's history.
+
+    Returns:
+        (summaries, next_cursor, total) where total is None unless requested.
+
+    Raises:
+        ValueError: if `cursor` is malformed.
+    """
+    collection = get_jobs_collection()
+    if collection is None:
+        return [], None, (0 if include_total else None)
+
+    limit = max(limit, 1)
+    query: dict[str, Any] = {"user_id": user_id}
+    if cursor:
+        created_at, job_id = _decode_list_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": job_id}},
+        ]
+
+    # Fetch one extra document to learn whether another page exists
+    docs = list(
+        collection.find(query, projection=_SUMMARY_PROJECTION)
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+
+    items = [
+        JobSummary(
+            id=str(doc.get("_id")),
+            type=doc.get("type"),
+            status=doc.get("status"),
+            session_id=doc.get("session_id"),
+            user_id=doc.get("user_id"),
+            title=doc.get("title"),
+            description=doc.get("description"),
+            created_at=doc.get("created_at"),
+            updated_at=doc.get("updated_at"),
+            error_message=doc.get("error_message"),
+        )
+        for doc in docs
+    ]
+    next_cursor = _encode_list_cursor(docs[-1]) if has_more and docs else None
+    total = collection.count_documents({"user_id": user_id}) if include_total else None
+    return items, next_cursor, total
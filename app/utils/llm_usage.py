@@ -0,0 +1,347 @@
+"""Token, latency and cost accounting of LLM calls per job, node and model.
+
+Usage is taken from every LangChain chat model response (UsageCallbackHandler,
+attached to graph runs next to the metrics callbacks) and from direct
+google-genai calls (record_llm_usage). Calls only add to an in-memory
+per-job, per-(node, model) tally; flush_job_usage `$inc`s it into the job's
+`usage_entries` from the event-sink flusher thread and once when the job ends,
+so no LLM call waits on MongoDB. GET /v1/jobs/{id} returns the breakdown as
+`usage`; summarize_model_usage aggregates a user's recent jobs per model.
+
+Costs use Config.LLM_PRICING (USD per million tokens); models without a price
+report token counts only.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from uuid import UUID
+
+from app.config import Config
+from app.db import get_jobs_collection
+from app.utils.job_event_sink import add_flush_listener
+from app.utils.metrics import _model_name, counter
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler  # type: ignore
+    from langchain_core.runnables.config import ensure_config  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    BaseCallbackHandler = object  # type: ignore
+    ensure_config = None  # type: ignore
+
+LLM_TOKENS = counter(
+    "agent_llm_tokens_total",
+    "Tokens used by LLM calls.",
+    ("model", "node", "kind"),
+)
+
+_TOKEN_FIELDS = ("input_tokens", "output_tokens", "total_tokens", "cached_tokens")
+
+
+def _parse_pricing() -> dict[str, dict[str, float]]:
+    """Config.LLM_PRICING: "model=in:1.25,out:10,cached:0.31;..." (USD / 1M)."""
+    pricing: dict[str, dict[str, float]] = {}
+    for entry in Config.LLM_PRICING.split(";"):
+        model, _, spec = entry.partition("=")
+        prices: dict[str, float] = {}
+        for part in spec.split(","):
+            name, _, value = part.partition(":")
+            try:
+                prices[name.strip().lower()] = float(value)
+            except ValueError:
+                continue
+        if model.strip() and prices:
+            pricing[model.strip()] = prices
+    return pricing
+
+
+def estimate_cost(
+    model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0
+) -> Optional[float]:
+    """USD cost of one call, or None when the model has no configured price."""
+    prices = _parse_pricing().get(model.removeprefix("models/"))
+    if prices is None:
+        return None
+    # Cached input tokens are billed at the cached rate (input rate if unset)
+    cached_tokens = min(cached_tokens, input_tokens)
+    cost = (
+        (input_tokens - cached_tokens) * prices.get("in", 0.0)
+        + cached_tokens * prices.get("cached", prices.get("in", 0.0))
+        + output_tokens * prices.get("out", 0.0)
+    )
+    return cost / 1_000_000
+
+
+# job_id -> {(node, model): usage not yet written to the job document}
+_PENDING_USAGE: dict[str, dict[tuple[str, str], dict[str, Any]]] = {}
+_PENDING_LOCK = threading.Lock()
+
+
+def _new_entry(node: str, model: str) -> dict[str, Any]:
+    return {
+        "node": node,
+        "model": model,
+        "calls": 0,
+        "seconds": 0.0,
+        "cost_usd": None,
+        **{field: 0 for field in _TOKEN_FIELDS},
+    }
+
+
+def _entry_field(node: str, model: str) -> str:
+    # Mongo field names can't hold "." (model versions) or start with "$"
+    return f"{node}|{model}".replace(".", "_").replace("$", "_")
+
+
+def _usage_document(entries: list[dict[str, Any]]) -> dict:
+    by_node = sorted(entries, key=lambda e: (e["node"], e["model"]))
+    totals: dict[str, Any] = {"calls": 0, "seconds": 0.0, "cost_usd": None}
+    for field in _TOKEN_FIELDS:
+        totals[field] = 0
+    for entry in by_node:
+        totals["calls"] += entry.get("calls") or 0
+        totals["seconds"] += entry.get("seconds") or 0.0
+        for field in _TOKEN_FIELDS:
+            totals[field] += entry.get(field) or 0
+        if entry.get("cost_usd") is not None:
+            totals["cost_usd"] = (totals["cost_usd"] or 0.0) + entry["cost_usd"]
+    return {"totals": totals, "by_node": by_node}
+
+
+def job_usage_from_doc(doc: dict[str, Any]) -> Optional[dict]:
+    """The `usage` of a job document ({totals, by_node}), if any was recorded."""
+    entries = doc.get("usage_entries")
+    if entries:
+        return _usage_document([dict(entry) for entry in entries.values()])
+    return doc.get("usage")
+
+
+def record_llm_usage(
+    *,
+    job_id: Optional[str],
+    node: Optional[str],
+    model: str,
+    input_tokens: int = 0,
+    output_tokens: int = 0,
+    total_tokens: int = 0,
+    cached_tokens: int = 0,
+    seconds: float = 0.0,
+) -> None:
+    """
+    Add one LLM call to the metrics and, with a job id, to the job's pending
+    usage. Only memory is touched here; flush_job_usage writes it.
+    """
+    model = model.removeprefix("models/")
+    node = node or "unknown"
+    total_tokens = total_tokens or input_tokens + output_tokens
+    LLM_TOKENS.inc(input_tokens, model=model, node=node, kind="input")
+    LLM_TOKENS.inc(output_tokens, model=model, node=node, kind="output")
+    LLM_TOKENS.inc(cached_tokens, model=model, node=node, kind="cached")
+    if not job_id:
+        return
+
+    cost = estimate_cost(model, input_tokens, output_tokens, cached_tokens)
+    with _PENDING_LOCK:
+        entry = _PENDING_USAGE.setdefault(job_id, {}).setdefault(
+            (node, model), _new_entry(node, model)
+        )
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["input_tokens"] += input_tokens
+        entry["output_tokens"] += output_tokens
+        entry["total_tokens"] += total_tokens
+        entry["cached_tokens"] += cached_tokens
+        if cost is not None:
+            entry["cost_usd"] = (entry["cost_usd"] or 0.0) + cost
+
+
+def _merge_back(job_id: str, entries: dict[tuple[str, str], dict[str, Any]]) -> None:
+    with _PENDING_LOCK:
+        pending = _PENDING_USAGE.setdefault(job_id, {})
+        for key, entry in entries.items():
+            current = pending.setdefault(key, _new_entry(*key))
+            for field in ("calls", "seconds", *_TOKEN_FIELDS):
+                current[field] += entry[field]
+            if entry["cost_usd"] is not None:
+                current["cost_usd"] = (current["cost_usd"] or 0.0) + entry["cost_usd"]
+
+
+def flush_job_usage(job_id: str) -> None:
+    """
+    Add the job's pending usage to its document with one `$inc` per
+    (node, model). Blocking; runs on the event-sink flusher thread and once
+    when the job ends (off the event loop).
+    """
+    with _PENDING_LOCK:
+        entries = _PENDING_USAGE.pop(job_id, None)
+    if not entries:
+        return
+    collection = get_jobs_collection()
+    if collection is None:
+        return
+    increments: dict[str, Any] = {}
+    labels: dict[str, Any] = {}
+    for (node, model), entry in entries.items():
+        prefix = f"usage_entries.{_entry_field(node, model)}"
+        labels[f"{prefix}.node"] = node
+        labels[f"{prefix}.model"] = model
+        for field in ("calls", "seconds", *_TOKEN_FIELDS):
+            increments[f"{prefix}.{field}"] = entry[field]
+        if entry["cost_usd"] is not None:
+            increments[f"{prefix}.cost_usd"] = entry["cost_usd"]
+    try:
+        collection.update_one({"_id": job_id}, {"$inc": increments, "$set": labels})
+    except Exception as e:
+        print(f"[LLM_USAGE] Warning: failed to write usage for job {job_id}: {e}")
+        _merge_back(job_id, entries)
+
+
+# Usage is persisted alongside each batch of the job's events
+add_flush_listener(lambda job_id, _docs: flush_job_usage(job_id))
+
+
+def current_run_context(
+    config: Optional[dict] = None,
+) -> tuple[Optional[str], Optional[str]]:
+    """(job_id, node) of the graph run the caller executes in, if any."""
+    if ensure_config is None:
+        return None, None
+    metadata = ensure_config(config).get("metadata") or {}
+    return metadata.get("job_id"), metadata.get("langgraph_node")
+
+
+def _response_usage(response: Any) -> dict[str, int]:
+    """Token counts of a LangChain LLMResult."""
+    for generations in getattr(response, "generations", None) or []:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                details = usage.get("input_token_details") or {}
+                return {
+                    "input_tokens": int(usage.get("input_tokens") or 0),
+                    "output_tokens": int(usage.get("output_tokens") or 0),
+                    "total_tokens": int(usage.get("total_tokens") or 0),
+                    "cached_tokens": int(details.get("cache_read") or 0),
+                }
+    token_usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    return {
+        "input_tokens": int(token_usage.get("prompt_tokens") or 0),
+        "output_tokens": int(token_usage.get("completion_tokens") or 0),
+        "total_tokens": int(token_usage.get("total_tokens") or 0),
+        "cached_tokens": 0,
+    }
+
+
+class UsageCallbackHandler(BaseCallbackHandler):  # type: ignore[misc]
+    """Records the token usage of LangChain model calls made in a graph run."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._runs: dict[UUID, tuple[Optional[str], Optional[str], str, float]] = {}
+
+    def _start(self, run_id: UUID, serialized, metadata) -> None:
+        metadata = metadata or {}
+        with self._lock:
+            self._runs[run_id] = (
+                metadata.get("job_id"),
+                metadata.get("langgraph_node"),
+                _model_name(serialized, metadata),
+                time.perf_counter(),
+            )
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, metadata=None, **kwargs
+    ):
+        self._start(run_id, serialized, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, serialized, metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        job_id, node, model, started = run
+        record_llm_usage(
+            job_id=job_id,
+            node=node,
+            model=model,
+            seconds=time.perf_counter() - started,
+            **_response_usage(response),
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+
+_CALLBACK_HANDLER: Optional[UsageCallbackHandler] = None
+
+
+def usage_callbacks() -> list[UsageCallbackHandler]:
+    """Callbacks to add to a graph run's config to account its LLM usage."""
+    global _CALLBACK_HANDLER
+    if BaseCallbackHandler is object:
+        return []
+    if _CALLBACK_HANDLER is None:
+        _CALLBACK_HANDLER = UsageCallbackHandler()
+    return [_CALLBACK_HANDLER]
+
+
+def summarize_model_usage(user_id: str, *, hours: float = 24) -> list[dict[str, Any]]:
+    """Per-model calls, tokens, latency and cost over `user_id`'s jobs of the last `hours`."""
+    collection = get_jobs_collection()
+    if collection is None:
+        return []
+    since = datetime.utcnow() - timedelta(hours=hours)
+    pipeline = [
+        {
+            "$match": {
+                "user_id": user_id,
+                "created_at": {"$gte": since},
+                "usage_entries": {"$exists": True},
+            }
+        },
+        {"$project": {"entry": {"$objectToArray": "$usage_entries"}}},
+        {"$unwind": "$entry"},
+        {
+            "$group": {
+                "_id": "$entry.v.model",
+                "jobs": {"$addToSet": "$_id"},
+                "calls": {"$sum": "$entry.v.calls"},
+                "seconds": {"$sum": "$entry.v.seconds"},
+                "input_tokens": {"$sum": "$entry.v.input_tokens"},
+                "output_tokens": {"$sum": "$entry.v.output_tokens"},
+                "total_tokens": {"$sum": "$entry.v.total_tokens"},
+                "cached_tokens": {"$sum": "$entry.v.cached_tokens"},
+                "cost_usd": {"$sum": "$entry.v.cost_usd"},
+            }
+        },
+        {"$sort": {"total_tokens": -1}},
+    ]
+    summaries: list[dict[str, Any]] = []
+    for row in collection.aggregate(pipeline):
+        calls = row["calls"] or 0
+        summaries.append(
+            {
+                "model": row["_id"],
+                "jobs": len(row["jobs"]),
+                "calls": calls,
+                "input_tokens": row["input_tokens"],
+                "output_tokens": row["output_tokens"],
+                "total_tokens": row["total_tokens"],
+                "cached_tokens": row["cached_tokens"],
+                "avg_seconds": row["seconds"] / calls if calls else 0.0,
+                "avg_total_tokens": row["total_tokens"] / calls if calls else 0.0,
+                "cost_usd": row["cost_usd"] or None,
+            }
+        )
+    return summaries
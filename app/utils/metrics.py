@@ -0,0 +1,426 @@
+"""Process-local metrics exposed in Prometheus text format on /metrics.
+
+A deliberately small registry (counters, gauges, histograms with labels) so
+the service needs no extra dependency. Every uvicorn worker keeps its own
+values; scrape each worker (or run one per pod) and aggregate in Prometheus.
+
+Sources:
+- MetricsCallbackHandler times graph nodes, LLM calls and tool calls of any
+  LangGraph run it is attached to (see metrics_callbacks()).
+- MongoCommandMetrics times every MongoDB command issued through the shared
+  client (see app.db.get_mongo_client).
+- timed() / observe() are used directly for subprocesses and raw SDK calls.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from abc import ABC, abstractmethod
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterator, Optional
+from uuid import UUID
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    BaseCallbackHandler = object  # type: ignore
+
+try:
+    from pymongo import monitoring  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    monitoring = None  # type: ignore
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; graph work ranges from sub-second tool calls to multi-minute runs
+DURATION_BUCKETS = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600,
+)  # fmt: skip
+DB_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+)  # fmt: skip
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in items
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the (unlabelled) value at scrape time."""
+        self._function = function
+
+    def _samples(self) -> list[str]:
+        if self._function is not None:
+            try:
+                return [f"{self.name} {_format_value(self._function())}"]
+            except Exception as e:
+                print(f"[METRICS] Warning: gauge {self.name} failed: {e}")
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames=(),
+        buckets: tuple[float, ...] = DURATION_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> (bucket counts, sum)
+        self._values: dict[tuple[str, ...], tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(key, list(c), s) for key, (c, s) in self._values.items()]
+        lines: list[str] = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames + ("le",), key + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_REGISTRY: dict[str, _Metric] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _register(metric):
+    with _REGISTRY_LOCK:
+        existing = _REGISTRY.get(metric.name)
+        if existing is not None:
+            return existing
+        _REGISTRY[metric.name] = metric
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    return _register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames=()) -> Gauge:
+    return _register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames=(),
+    buckets: tuple[float, ...] = DURATION_BUCKETS,
+) -> Histogram:
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def render_metrics() -> str:
+    """All registered metrics in Prometheus text exposition format."""
+    with _REGISTRY_LOCK:
+        metrics = list(_REGISTRY.values())
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+NODE_SECONDS = histogram(
+    "agent_node_duration_seconds",
+    "Duration of LangGraph node executions.",
+    ("node", "outcome"),
+)
+LLM_SECONDS = histogram(
+    "agent_llm_request_duration_seconds",
+    "Duration of LLM requests.",
+    ("model", "outcome"),
+)
+TOOL_SECONDS = histogram(
+    "agent_tool_duration_seconds",
+    "Duration of agent tool invocations.",
+    ("tool", "outcome"),
+)
+SUBPROCESS_SECONDS = histogram(
+    "agent_subprocess_duration_seconds",
+    "Duration of template copy, npm, lint and deploy subprocesses.",
+    ("command", "outcome"),
+)
+JOB_SECONDS = histogram(
+    "job_run_duration_seconds",
+    "Wall time of graph job runs.",
+    ("kind", "outcome"),
+)
+MONGO_SECONDS = histogram(
+    "mongo_command_duration_seconds",
+    "Duration of MongoDB commands.",
+    ("command", "outcome"),
+    buckets=DB_BUCKETS,
+)
+JOB_QUEUE_DEPTH = gauge("job_queue_depth", "Jobs waiting to be claimed.")
+JOBS_ACTIVE = gauge("jobs_active", "Jobs running in this process.")
+
+
+def outcome_of(exc: Optional[BaseException]) -> str:
+    if exc is None:
+        return "ok"
+    name = type(exc).__name__
+    if name in {"CancelledError", "JobCancelled"}:
+        return "cancelled"
+    if isinstance(exc, TimeoutError) or "Timeout" in name:
+        return "timeout"
+    return "error"
+
+
+@contextmanager
+def timed(metric: Histogram, **labels: Any) -> Iterator[None]:
+    """Observe the duration of the block, labelled with its outcome."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        metric.observe(time.perf_counter() - started, outcome=outcome_of(e), **labels)
+        raise
+    metric.observe(time.perf_counter() - started, outcome="ok", **labels)
+
+
+def _model_name(
+    serialized: Optional[dict[str, Any]], metadata: Optional[dict[str, Any]]
+) -> str:
+    metadata = metadata or {}
+    if metadata.get("ls_model_name"):
+        return str(metadata["ls_model_name"])
+    kwargs = (serialized or {}).get("kwargs") or {}
+    return str(kwargs.get("model") or kwargs.get("model_name") or "unknown")
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):  # type: ignore[misc]
+    """Times graph nodes, LLM calls and tool calls from LangChain callbacks."""
+
+    # Only does bookkeeping; no need to hop to an executor thread
+    run_inline = True
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._runs: dict[UUID, tuple[Histogram, str, str, float]] = {}
+
+    def _start(self, run_id: UUID, metric: Histogram, label: str, value: str):
+        with self._lock:
+            self._runs[run_id] = (metric, label, value, time.perf_counter())
+
+    def _end(self, run_id: UUID, outcome: str) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        metric, label, value, started = run
+        metric.observe(time.perf_counter() - started, outcome=outcome, **{label: value})
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, metadata=None, name=None, **kwargs
+    ):
+        node = (metadata or {}).get("langgraph_node")
+        # Nested runnables inside a node share its metadata; only time the node
+        if node and (name or (serialized or {}).get("name")) == node:
+            self._start(run_id, NODE_SECONDS, "node", node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id, "ok")
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        # GraphInterrupt/ParentCommand are control flow, not failures
+        name = type(error).__name__
+        outcome = "ok" if name in {"GraphInterrupt", "ParentCommand"} else None
+        self._end(run_id, outcome or outcome_of(error))
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, metadata=None, **kwargs
+    ):
+        self._start(run_id, LLM_SECONDS, "model", _model_name(serialized, metadata))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, LLM_SECONDS, "model", _model_name(serialized, metadata))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "ok")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, outcome_of(error))
+
+    def on_tool_start(self, serialized, input_str, *, run_id, name=None, **kwargs):
+        tool = name or (serialized or {}).get("name") or "unknown"
+        self._start(run_id, TOOL_SECONDS, "tool", tool)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, "ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, outcome_of(error))
+
+
+_CALLBACK_HANDLER: Optional[MetricsCallbackHandler] = None
+
+
+def metrics_callbacks() -> list[MetricsCallbackHandler]:
+    """Callbacks to add to a graph run's config to time its nodes and calls."""
+    global _CALLBACK_HANDLER
+    if BaseCallbackHandler is object:
+        return []
+    if _CALLBACK_HANDLER is None:
+        _CALLBACK_HANDLER = MetricsCallbackHandler()
+    return [_CALLBACK_HANDLER]
+
+
+if monitoring is not None:
+
+    class MongoCommandMetrics(monitoring.CommandListener):
+        """Records MongoDB command latency per command name."""
+
+        def started(self, event) -> None:
+            pass
+
+        def succeeded(self, event) -> None:
+            MONGO_SECONDS.observe(
+                event.duration_micros / 1_000_000,
+                command=event.command_name,
+                outcome="ok",
+            )
+
+        def failed(self, event) -> None:
+            MONGO_SECONDS.observe(
+                event.duration_micros / 1_000_000,
+                command=event.command_name,
+                outcome="error",
+            )
+
+else:  # pragma: no cover - optional dependency
+    MongoCommandMetrics = None  # type: ignore
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802 - http.server API
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # Scrapes would flood the worker log
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serve /metrics on `port` from a daemon thread (standalone workers)."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsRequestHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    )
+    thread.start()
+    return server
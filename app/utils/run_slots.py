@@ -0,0 +1,187 @@
+"""Cluster-wide admission control for graph runs.
+
+Every worker must hold a run slot before it claims a job, which caps how many
+graph runs (and therefore design_planner → generate_section fan-outs) execute
+at once across all pods. Slots are leases: the holder renews them with its
+heartbeat and a slot held by a dead worker frees itself when it expires.
+
+With MongoDB the slots are documents `slot-0 … slot-{N-1}` shared by every
+process; without it the cap applies per process.
+"""
+
+from __future__ import annotations
+
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.config import Config
+from app.db import get_run_slots_collection
+
+try:
+    from pymongo import ReturnDocument  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    ReturnDocument = None  # type: ignore
+
+
+class RunSlotStore(ABC):
+    """Interface shared by run slot backends."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+
+    @abstractmethod
+    def acquire(self, holder: str, ttl_seconds: int) -> Optional[str]:
+        """Take a free slot for `holder`; returns the slot id or None if full."""
+
+    @abstractmethod
+    def renew(self, slot_id: str, holder: str, ttl_seconds: int) -> bool:
+        ...
+
+    @abstractmethod
+    def release(self, slot_id: str, holder: str) -> bool:
+        ...
+
+    @abstractmethod
+    def in_use(self) -> int:
+        """Number of slots currently held."""
+
+
+class MongoRunSlotStore(RunSlotStore):
+    def __init__(self, collection, capacity: int) -> None:
+        super().__init__(capacity)
+        self.collection = collection
+        self.slot_ids = [f"slot-{i}" for i in range(capacity)]
+        self._seeded = False
+
+    def _ensure_slots(self) -> None:
+        if self._seeded:
+            return
+        for slot_id in self.slot_ids:
+            self.collection.update_one(
+                {"_id": slot_id},
+                {"$setOnInsert": {"holder": None, "expires_at": None}},
+                upsert=True,
+            )
+        self._seeded = True
+
+    def acquire(self, holder: str, ttl_seconds: int) -> Optional[str]:
+        self._ensure_slots()
+        now = datetime.utcnow()
+        doc = self.collection.find_one_and_update(
+            {
+                "_id": {"$in": self.slot_ids},
+                "$or": [{"holder": None}, {"expires_at": {"$lt": now}}],
+            },
+            {
+                "$set": {
+                    "holder": holder,
+                    "expires_at": now + timedelta(seconds=ttl_seconds),
+                    "acquired_at": now,
+                }
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+        return str(doc["_id"]) if doc else None
+
+    def renew(self, slot_id: str, holder: str, ttl_seconds: int) -> bool:
+        result = self.collection.update_one(
+            {"_id": slot_id, "holder": holder},
+            {
+                "$set": {
+                    "expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds)
+                }
+            },
+        )
+        return result.matched_count == 1
+
+    def release(self, slot_id: str, holder: str) -> bool:
+        result = self.collection.update_one(
+            {"_id": slot_id, "holder": holder},
+            {"$set": {"holder": None, "expires_at": None}},
+        )
+        return result.modified_count == 1
+
+    def in_use(self) -> int:
+        return self.collection.count_documents(
+            {
+                "_id": {"$in": self.slot_ids},
+                "holder": {"$ne": None},
+                "expires_at": {"$gte": datetime.utcnow()},
+            }
+        )
+
+
+class InMemoryRunSlotStore(RunSlotStore):
+    def __init__(self, capacity: int) -> None:
+        super().__init__(capacity)
+        self._lock = threading.Lock()
+        self._slots: dict[str, tuple[str, datetime]] = {}
+
+    def _expire(self) -> None:
+        now = datetime.utcnow()
+        for slot_id, (_, expires_at) in list(self._slots.items()):
+            if expires_at < now:
+                self._slots.pop(slot_id, None)
+
+    def acquire(self, holder: str, ttl_seconds: int) -> Optional[str]:
+        with self._lock:
+            self._expire()
+            for i in range(self.capacity):
+                slot_id = f"slot-{i}"
+                if slot_id not in self._slots:
+                    self._slots[slot_id] = (
+                        holder,
+                        datetime.utcnow() + timedelta(seconds=ttl_seconds),
+                    )
+                    return slot_id
+            return None
+
+    def renew(self, slot_id: str, holder: str, ttl_seconds: int) -> bool:
+        with self._lock:
+            slot = self._slots.get(slot_id)
+            if slot is None or slot[0] != holder:
+                return False
+            self._slots[slot_id] = (
+                holder,
+                datetime.utcnow() + timedelta(seconds=ttl_seconds),
+            )
+            return True
+
+    def release(self, slot_id: str, holder: str) -> bool:
+        with self._lock:
+            slot = self._slots.get(slot_id)
+            if slot is None or slot[0] != holder:
+                return False
+            self._slots.pop(slot_id, None)
+            return True
+
+    def in_use(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._slots)
+
+
+_STORE: Optional[RunSlotStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_run_slot_store() -> Optional[RunSlotStore]:
+    """
+    Return the process-wide run slot store, or None when admission control is
+    disabled (Config.JOB_MAX_ACTIVE_RUNS <= 0).
+    """
+    global _STORE
+    if Config.JOB_MAX_ACTIVE_RUNS <= 0:
+        return None
+    if _STORE is not None:
+        return _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            collection = get_run_slots_collection()
+            if collection is not None and ReturnDocument is not None:
+                _STORE = MongoRunSlotStore(collection, Config.JOB_MAX_ACTIVE_RUNS)
+            else:
+                _STORE = InMemoryRunSlotStore(Config.JOB_MAX_ACTIVE_RUNS)
+    return _STORE
@@ -0,0 +1,214 @@
+"""Per-session execution leases.
+
+Only one graph run may own a session at a time: the checkpointer thread and
+the workspace returned by get_session_dir are both keyed by session_id, so two
+overlapping runs would interleave file writes and conflicting checkpoints.
+A lease names the job that currently owns the session and expires on its own
+if the owner dies without releasing it.
+
+Leases live in MongoDB so they hold across uvicorn workers and job workers;
+an in-process store is used when Mongo is unavailable.
+"""
+
+from __future__ import annotations
+
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.db import get_session_leases_collection
+
+try:
+    from pymongo.errors import DuplicateKeyError  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    DuplicateKeyError = None  # type: ignore
+
+
+# Upserts tried before a contended session is reported busy
+_ACQUIRE_ATTEMPTS = 3
+# Holder reported when the session stayed contended but its owner is unknown
+_UNKNOWN_HOLDER = "unknown"
+
+
+class SessionLeaseStore(ABC):
+    """Interface shared by lease backends."""
+
+    @abstractmethod
+    def acquire(self, session_id: str, job_id: str, ttl_seconds: int) -> Optional[str]:
+        """
+        Take (or re-take) the lease for `job_id`.
+
+        Returns:
+            None when the lease is held by `job_id`, otherwise the id of the
+            job that currently owns the session.
+        """
+
+    @abstractmethod
+    def renew(self, session_id: str, job_id: str, ttl_seconds: int) -> bool:
+        ...
+
+    @abstractmethod
+    def release(self, session_id: str, job_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def holder(self, session_id: str) -> Optional[str]:
+        """Return the job id owning the session, if the lease is still live."""
+
+
+class MongoSessionLeaseStore(SessionLeaseStore):
+    def __init__(self, collection) -> None:
+        self.collection = collection
+
+    def acquire(self, session_id: str, job_id: str, ttl_seconds: int) -> Optional[str]:
+        for _ in range(_ACQUIRE_ATTEMPTS):
+            now = datetime.utcnow()
+            try:
+                self.collection.update_one(
+                    {
+                        "_id": session_id,
+                        "$or": [{"expires_at": {"$lt": now}}, {"job_id": job_id}],
+                    },
+                    {
+                        "$set": {
+                            "job_id": job_id,
+                            "expires_at": now + timedelta(seconds=ttl_seconds),
+                            "acquired_at": now,
+                        }
+                    },
+                    upsert=True,
+                )
+                return None
+            except Exception as e:
+                # A live lease owned by another job makes the upsert collide on _id.
+                if DuplicateKeyError is None or not isinstance(e, DuplicateKeyError):
+                    raise
+            holder = self.holder(session_id)
+            if holder is not None:
+                return holder
+            # The colliding lease was released or expired meanwhile: try again
+        # Still contended; report the session as busy rather than owned
+        return self.holder(session_id) or _UNKNOWN_HOLDER
+
+    def renew(self, session_id: str, job_id: str, ttl_seconds: int) -> bool:
+        result = self.collection.update_one(
+            {"_id": session_id, "job_id": job_id},
+            {
+                "$set": {
+                    "expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds)
+                }
+            },
+        )
+        return result.matched_count == 1
+
+    def release(self, session_id: str, job_id: str) -> bool:
+        result = self.collection.delete_one({"_id": session_id, "job_id": job_id})
+        return result.deleted_count == 1
+
+    def holder(self, session_id: str) -> Optional[str]:
+        doc = self.collection.find_one(
+            {"_id": session_id, "expires_at": {"$gte": datetime.utcnow()}}
+        )
+        return doc.get("job_id") if doc else None
+
+
+class InMemorySessionLeaseStore(SessionLeaseStore):
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._leases: dict[str, tuple[str, datetime]] = {}
+
+    def _live(self, session_id: str) -> Optional[tuple[str, datetime]]:
+        lease = self._leases.get(session_id)
+        if lease is None:
+            return None
+        if lease[1] < datetime.utcnow():
+            self._leases.pop(session_id, None)
+            return None
+        return lease
+
+    def acquire(self, session_id: str, job_id: str, ttl_seconds: int) -> Optional[str]:
+        with self._lock:
+            lease = self._live(session_id)
+            if lease is not None and lease[0] != job_id:
+                return lease[0]
+            self._leases[session_id] = (
+                job_id,
+                datetime.utcnow() + timedelta(seconds=ttl_seconds),
+            )
+            return None
+
+    def renew(self, session_id: str, job_id: str, ttl_seconds: int) -> bool:
+        with self._lock:
+            lease = self._live(session_id)
+            if lease is None or lease[0] != job_id:
+                return False
+            self._leases[session_id] = (
+                job_id,
+                datetime.utcnow() + timedelta(seconds=ttl_seconds),
+            )
+            return True
+
+    def release(self, session_id: str, job_id: str) -> bool:
+        with self._lock:
+            lease = self._leases.get(session_id)
+            if lease is None or lease[0] != job_id:
+                return False
+            self._leases.pop(session_id, None)
+            return True
+
+    def holder(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            lease = self._live(session_id)
+            return lease[0] if lease else None
+
+
+_STORE: Optional[SessionLeaseStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_session_lease_store() -> SessionLeaseStore:
+    """Return the process-wide lease store (Mongo when available)."""
+    global _STORE
+    if _STORE is not None:
+        return _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            collection = get_session_leases_collection()
+            if collection is not None and DuplicateKeyError is not None:
+                _STORE = MongoSessionLeaseStore(collection)
+            else:
+                _STORE = InMemorySessionLeaseStore()
+    return _STORE
+
+
+def acquire_session_lease(
+    session_id: str, job_id: str, ttl_seconds: int
+) -> Optional[str]:
+    """
+    Try to make `job_id` the owner of `session_id`.
+
+    Returns:
+        None on success, otherwise the id of the job holding the session.
+    """
+    return get_session_lease_store().acquire(session_id, job_id, ttl_seconds)
+
+
+def renew_session_lease(session_id: str, job_id: str, ttl_seconds: int) -> bool:
+    return get_session_lease_store().renew(session_id, job_id, ttl_seconds)
+
+
+def release_session_lease(session_id: str, job_id: str) -> bool:
+    try:
+        return get_session_lease_store().release(session_id, job_id)
+    except Exception as e:
+        print(f"[SESSION_LEASE] Warning: failed to release lease for {session_id}: {e}")
+        return False
+
+
+def get_session_lease_holder(session_id: str) -> Optional[str]:
+    try:
+        return get_session_lease_store().holder(session_id)
+    except Exception as e:
+        print(f"[SESSION_LEASE] Warning: failed to read lease for {session_id}: {e}")
+        return None
@@ -0,0 +1,69 @@
+"""Small thread-safe in-process cache bounded by size (LRU) and age (TTL)."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Optional, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    Mapping that holds at most `max_entries` items, each for at most
+    `ttl_seconds`. The least recently used entry is evicted when full.
+    """
+
+    def __init__(self, *, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max(max_entries, 1)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[K, tuple[float, V]]" = OrderedDict()
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - stored_at > self.ttl_seconds
+
+    def get(self, key: K) -> Optional[V]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[0], now):
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: K, value: V) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._items[key] = (now, value)
+            self._items.move_to_end(key)
+            # Oldest entries sit at the front: drop expired ones, then trim
+            while self._items:
+                oldest_key, (stored_at, _) = next(iter(self._items.items()))
+                if len(self._items) <= self.max_entries and not self._expired(
+                    stored_at, now
+                ):
+                    break
+                del self._items[oldest_key]
+
+    def pop(self, key: K) -> Optional[V]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.pop(key, None)
+        if entry is None or self._expired(entry[0], now):
+            return None
+        return entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
@@ -0,0 +1,463 @@
+"""Standalone worker that executes queued graph jobs.
+
+Run it next to the API with ``python -m app.worker`` (or ``ROLE=worker`` in
+entrypoint.sh). Each worker claims jobs from the durable queue with a lease,
+renews the lease with heartbeats while the graph runs and acknowledges the
+entry once the runner returns. Graph workers can therefore be scaled and
+restarted independently of the uvicorn HTTP workers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+import threading
+import uuid
+from typing import Optional
+
+from app.config import Config
+from app.models.job import JobStatus, JobType, QueuedJob
+from app.utils.job_cancellation import LEASE_LOST, cancel_local_job
+from app.utils.job_event_sink import flush_job_events
+from app.utils.job_queue import JobQueue, WeightedFairScheduler, get_job_queue
+from app.utils.metrics import JOB_QUEUE_DEPTH, JOBS_ACTIVE, start_metrics_server
+from app.utils.run_slots import get_run_slot_store
+from app.utils.session_leases import (
+    acquire_session_lease,
+    release_session_lease,
+    renew_session_lease,
+)
+from app.utils.jobs import (
+    claim_orphaned_running_jobs,
+    get_cancel_requested_job_ids,
+    is_job_cancel_requested,
+    log_job_event,
+    mark_job_running,
+    touch_job_heartbeat,
+    update_job_status,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def run_queued_job(entry: QueuedJob) -> None:
+    """Dispatch a claimed queue entry to the matching job runner.
+
+    Entries re-queued by the reconciler, or re-claimed after their worker's
+    lease expired, continue from the session checkpoint so nodes that already
+    finished are not run (and billed) twice.
+    """
+    from app.agent.job_runner import resume_job, run_chat_job, run_init_job
+
+    payload = dict(entry.payload)
+    resume = bool(payload.pop("resume", False))
+    if resume or entry.attempts > 1:
+        if await resume_job(entry.job_id, payload["session_id"], entry.type.value):
+            return
+        logger.info("[WORKER] No checkpoint for job %s; starting over", entry.job_id)
+
+    if entry.type == JobType.INIT:
+        if "init_payload" not in payload:
+            raise RuntimeError(
+                "Init job was interrupted before its first checkpoint and "
+                "cannot be restarted"
+            )
+        await run_init_job(entry.job_id, **payload)
+    elif entry.type == JobType.CHAT:
+        if "message" not in payload:
+            raise RuntimeError(
+                "Chat job was interrupted before its first checkpoint and "
+                "cannot be restarted"
+            )
+        await run_chat_job(entry.job_id, **payload)
+    else:  # pragma: no cover - guarded by the JobType enum
+        raise ValueError(f"Unsupported job type: {entry.type}")
+
+
+def reconcile_orphaned_jobs(queue: Optional[JobQueue] = None) -> int:
+    """
+    Re-queue RUNNING jobs whose worker died so they resume from the checkpoint.
+
+    A job is orphaned when its heartbeat is older than
+    Config.JOB_STALE_HEARTBEAT_SECONDS. Jobs that still have a queue entry
+    (e.g. an expired Mongo lease) are left for the normal re-claim path.
+
+    Returns:
+        Number of orphaned jobs recovered.
+    """
+    queue = queue or get_job_queue()
+    try:
+        orphans = claim_orphaned_running_jobs(Config.JOB_STALE_HEARTBEAT_SECONDS)
+    except Exception as e:
+        logger.warning("[WORKER] Orphaned job scan failed: %s", e)
+        return 0
+
+    for doc in orphans:
+        job_id = str(doc["_id"])
+        try:
+            job_type = JobType(doc.get("type"))
+            payload: dict = {"session_id": doc.get("session_id"), "resume": True}
+            message = (doc.get("initial_payload") or {}).get("message")
+            if job_type == JobType.CHAT and message:
+                payload["message"] = message
+            requeued = queue.ensure_enqueued(job_id, job_type, payload)
+            log_job_event(
+                job_id,
+                node="job_recovery",
+                message="Worker stopped responding; resuming from the last checkpoint.",
+                event_type="job_recovering",
+                data={"requeued": requeued},
+            )
+            logger.info("[WORKER] Recovering orphaned job %s", job_id)
+        except Exception as e:
+            logger.warning("[WORKER] Failed to recover job %s: %s", job_id, e)
+    return len(orphans)
+
+
+class JobWorker:
+    """Claims jobs from the queue and runs them as tasks on one event loop.
+
+    Graph runs are fully async (agent.astream), so a single worker process can
+    drive many sessions concurrently; `concurrency` bounds how many at once.
+    A cluster-wide run slot (see app/utils/run_slots.py) is taken before each
+    claim so Config.JOB_MAX_ACTIVE_RUNS holds across all workers; jobs that
+    cannot get a slot stay pending in the queue. Claims follow a weighted-fair
+    order over priority classes so interactive follow-ups aren't stuck behind
+    a backlog of init builds.
+    """
+
+    def __init__(
+        self,
+        queue: Optional[JobQueue] = None,
+        *,
+        worker_id: Optional[str] = None,
+        concurrency: Optional[int] = None,
+    ) -> None:
+        self.queue = queue or get_job_queue()
+        self.worker_id = (
+            worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        )
+        self.concurrency = max(concurrency or Config.JOB_WORKER_CONCURRENCY, 1)
+        self._active: dict[str, QueuedJob] = {}
+        # Cluster run slots held by this worker; "" marks admission control off
+        self._run_slots: dict[str, str] = {}
+        self._reserved_run_slot: Optional[str] = None
+        # Jobs whose queue lease expired under us (filled by _renew_leases)
+        self._lost_leases: set[str] = set()
+        self._scheduler = WeightedFairScheduler()
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        """Stop claiming new jobs; running jobs are allowed to finish."""
+        self._stop.set()
+
+    def active_count(self) -> int:
+        return len(self._active)
+
+    def run(self) -> None:
+        asyncio.run(self.arun())
+
+    async def arun(self) -> None:
+        logger.info(
+            "[WORKER] %s started (backend=%s, concurrency=%d)",
+            self.worker_id,
+            self.queue.backend,
+            self.concurrency,
+        )
+        JOBS_ACTIVE.set_function(self.active_count)
+        await asyncio.to_thread(reconcile_orphaned_jobs, self.queue)
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks: set[asyncio.Task] = set()
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        cancel_watch = asyncio.create_task(self._cancel_watch_loop())
+        try:
+            while not self._stop.is_set():
+                await slots.acquire()
+                self._reserved_run_slot = await asyncio.to_thread(
+                    self._acquire_run_slot
+                )
+                if self._reserved_run_slot is None:
+                    slots.release()
+                    await asyncio.sleep(Config.JOB_WORKER_POLL_SECONDS)
+                    continue
+                entry = await asyncio.to_thread(self._claim_next)
+                if entry is None:
+                    # Nothing to run: hand the slot back so an idle worker
+                    # doesn't count against cluster-wide admission.
+                    if self._reserved_run_slot:
+                        await asyncio.to_thread(
+                            self._release_run_slot, self._reserved_run_slot
+                        )
+                    self._reserved_run_slot = None
+                    slots.release()
+                    await asyncio.sleep(Config.JOB_WORKER_POLL_SECONDS)
+                    continue
+                self._run_slots[entry.job_id] = self._reserved_run_slot
+                self._reserved_run_slot = None
+                self._active[entry.job_id] = entry
+                task = asyncio.create_task(self._execute(entry, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            heartbeat.cancel()
+            cancel_watch.cancel()
+            if self._reserved_run_slot:
+                await asyncio.to_thread(self._release_run_slot, self._reserved_run_slot)
+            self._reserved_run_slot = None
+            await asyncio.to_thread(flush_job_events)
+            logger.info("[WORKER] %s stopped", self.worker_id)
+
+    def _acquire_run_slot(self) -> Optional[str]:
+        store = get_run_slot_store()
+        if store is None:
+            return ""
+        try:
+            return store.acquire(self.worker_id, Config.JOB_LEASE_SECONDS)
+        except Exception as e:
+            logger.warning("[WORKER] Failed to acquire run slot: %s", e)
+            return None
+
+    def _release_run_slot(self, slot_id: str) -> None:
+        store = get_run_slot_store()
+        if store is None or not slot_id:
+            return
+        try:
+            store.release(slot_id, self.worker_id)
+        except Exception as e:
+            logger.warning("[WORKER] Failed to release run slot %s: %s", slot_id, e)
+
+    def _claim_next(self) -> Optional[QueuedJob]:
+        try:
+            entry = self.queue.claim(
+                self.worker_id, Config.JOB_LEASE_SECONDS, self._scheduler.order()
+            )
+        except Exception as e:
+            logger.warning("[WORKER] Failed to claim job: %s", e)
+            return None
+        if entry is not None:
+            self._scheduler.charge(entry.priority)
+        return entry
+
+    async def _execute(self, entry: QueuedJob, slots: asyncio.Semaphore) -> None:
+        job_id = entry.job_id
+        session_id = entry.payload.get("session_id") or ""
+        owns_session = False
+        try:
+            if entry.attempts > Config.JOB_MAX_ATTEMPTS:
+                message = (
+                    f"Job abandoned after {entry.attempts - 1} attempt(s); "
+                    "the worker running it stopped responding."
+                )
+                await asyncio.to_thread(
+                    log_job_event,
+                    job_id,
+                    node="job_worker",
+                    message=message,
+                    event_type="error",
+                    data={"attempts": entry.attempts - 1},
+                )
+                await asyncio.to_thread(
+                    update_job_status,
+                    job_id,
+                    status=JobStatus.FAILED,
+                    error_message=message,
+                )
+                self._active.pop(job_id, None)
+                await asyncio.to_thread(
+                    self.queue.fail, job_id, self.worker_id, message
+                )
+                return
+
+            # Cancelled while still queued: acknowledge without running it.
+            if await asyncio.to_thread(is_job_cancel_requested, job_id):
+                logger.info("[WORKER] Skipping cancelled job %s", job_id)
+                self._active.pop(job_id, None)
+                await asyncio.to_thread(self.queue.complete, job_id, self.worker_id)
+                return
+
+            # Only one graph run per session, in enqueue order: wait behind an
+            # older pending job of the session and behind the job that owns it.
+            # (Deferring moves available_at, so claim order alone can't keep
+            # same-session jobs in order.)
+            holder = await asyncio.to_thread(
+                self.queue.older_session_job, session_id, job_id, entry.enqueued_at
+            )
+            if holder is None:
+                holder = await asyncio.to_thread(
+                    acquire_session_lease,
+                    session_id,
+                    job_id,
+                    Config.JOB_LEASE_SECONDS,
+                )
+                owns_session = holder is None
+            if holder is not None:
+                logger.info(
+                    "[WORKER] Session %s busy with job %s; deferring job %s",
+                    session_id,
+                    holder,
+                    job_id,
+                )
+                self._active.pop(job_id, None)
+                await asyncio.to_thread(
+                    self.queue.release,
+                    job_id,
+                    self.worker_id,
+                    delay_seconds=Config.SESSION_BUSY_RETRY_SECONDS,
+                )
+                return
+
+            # A cancel may land after the cancel check above; never overwrite it.
+            if not await asyncio.to_thread(
+                mark_job_running, job_id, worker_id=self.worker_id
+            ):
+                logger.info("[WORKER] Skipping cancelled job %s", job_id)
+                self._active.pop(job_id, None)
+                await asyncio.to_thread(self.queue.complete, job_id, self.worker_id)
+                return
+            logger.info(
+                "[WORKER] Running %s job %s (priority=%s, attempt %d)",
+                entry.type.value,
+                job_id,
+                entry.priority.value,
+                entry.attempts,
+            )
+            if job_id in self._lost_leases:
+                return
+            await run_queued_job(entry)
+            self._active.pop(job_id, None)
+            if job_id not in self._lost_leases:
+                await asyncio.to_thread(self.queue.complete, job_id, self.worker_id)
+        except Exception as e:
+            logger.exception("[WORKER] Job %s crashed: %s", job_id, e)
+            self._active.pop(job_id, None)
+            try:
+                await asyncio.to_thread(
+                    update_job_status,
+                    job_id,
+                    status=JobStatus.FAILED,
+                    error_message=str(e),
+                )
+                await asyncio.to_thread(self.queue.fail, job_id, self.worker_id, str(e))
+            except Exception:
+                pass
+        finally:
+            # After a lost lease the session lease (keyed by job id) may be
+            # the new owner's
+            if owns_session and job_id not in self._lost_leases:
+                await asyncio.to_thread(release_session_lease, session_id, job_id)
+            self._lost_leases.discard(job_id)
+            run_slot = self._run_slots.pop(job_id, "")
+            if run_slot:
+                await asyncio.to_thread(self._release_run_slot, run_slot)
+            self._active.pop(job_id, None)
+            slots.release()
+
+    def _renew_leases(self, entries: list[QueuedJob]) -> None:
+        # _execute drops a job from _active before it completes, fails or
+        # releases the queue entry, so a failed heartbeat for a job no longer
+        # in _active means it finished, not that its lease was lost.
+        for entry in entries:
+            job_id = entry.job_id
+            try:
+                if not self.queue.heartbeat(
+                    job_id, self.worker_id, Config.JOB_LEASE_SECONDS
+                ):
+                    if job_id not in self._active:
+                        continue
+                    # Another worker may claim it: stop so it never runs twice
+                    logger.warning(
+                        "[WORKER] Lost lease for job %s; stopping it", job_id
+                    )
+                    self._lost_leases.add(job_id)
+                    cancel_local_job(job_id, reason=LEASE_LOST)
+                    continue
+                session_id = entry.payload.get("session_id")
+                if session_id:
+                    renew_session_lease(session_id, job_id, Config.JOB_LEASE_SECONDS)
+                touch_job_heartbeat(job_id, worker_id=self.worker_id)
+            except Exception as e:
+                logger.warning("[WORKER] Heartbeat failed for %s: %s", job_id, e)
+
+    def _renew_run_slots(self, slot_ids: list[str]) -> None:
+        store = get_run_slot_store()
+        if store is None:
+            return
+        for slot_id in slot_ids:
+            try:
+                if not store.renew(slot_id, self.worker_id, Config.JOB_LEASE_SECONDS):
+                    logger.warning("[WORKER] Lost run slot %s", slot_id)
+            except Exception as e:
+                logger.warning(
+                    "[WORKER] Run slot renewal failed for %s: %s", slot_id, e
+                )
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(Config.JOB_HEARTBEAT_SECONDS)
+            entries = list(self._active.values())
+            if entries:
+                await asyncio.to_thread(self._renew_leases, entries)
+            run_slots = [
+                slot_id
+                for slot_id in [*self._run_slots.values(), self._reserved_run_slot]
+                if slot_id
+            ]
+            if run_slots:
+                await asyncio.to_thread(self._renew_run_slots, run_slots)
+
+    async def _cancel_watch_loop(self) -> None:
+        """Forward cancel requests made from other processes to local runs."""
+        while True:
+            await asyncio.sleep(Config.JOB_CANCEL_POLL_SECONDS)
+            job_ids = list(self._active)
+            if not job_ids:
+                continue
+            try:
+                cancelled = await asyncio.to_thread(
+                    get_cancel_requested_job_ids, job_ids
+                )
+            except Exception as e:
+                logger.warning("[WORKER] Cancel poll failed: %s", e)
+                continue
+            for job_id in cancelled:
+                if cancel_local_job(job_id):
+                    logger.info("[WORKER] Cancelling job %s", job_id)
+
+
+def start_embedded_worker() -> JobWorker:
+    """Run a worker on a daemon thread inside the current (API) process."""
+    worker = JobWorker()
+    thread = threading.Thread(
+        target=worker.run, name="embedded-job-worker", daemon=True
+    )
+    thread.start()
+    return worker
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+    )
+    worker = JobWorker()
+
+    def _handle_signal(signum, _frame) -> None:
+        logger.info("[WORKER] Received signal %s, draining...", signum)
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, _handle_signal)
+    signal.signal(signal.SIGINT, _handle_signal)
+    if Config.WORKER_METRICS_PORT > 0:
+        JOB_QUEUE_DEPTH.set_function(worker.queue.depth)
+        start_metrics_server(Config.WORKER_METRICS_PORT)
+        logger.info("[WORKER] Serving /metrics on :%d", Config.WORKER_METRICS_PORT)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ set -euo pipefail
 : "${APP_MODULE:=app.main:app}"
 : "${WORKERS:=4}"
 : "${APP_ENV:=production}"
+# ROLE selects the process type: "api" (uvicorn) or "worker" (graph job worker)
+: "${ROLE:=api}"
 # Uvicorn expects lowercase log levels among: critical,error,warning,info,debug,trace
 : "${LOG_LEVEL:=info}"
 
@@ -16,7 +18,10 @@ case "${LOWER_LOG_LEVEL}" in
   *) echo "[entrypoint] Invalid LOG_LEVEL='${LOG_LEVEL}', falling back to 'info'"; LOWER_LOG_LEVEL=info ;;
 esac
 
-if [ "${APP_ENV}" = "local" ]; then
+if [ "${ROLE}" = "worker" ]; then
+  echo "[entrypoint] Starting graph job worker (log-level=${LOG_LEVEL})"
+  exec python -m app.worker
+elif [ "${APP_ENV}" = "local" ]; then
   echo "[entrypoint] Starting development server (reload) for ${APP_MODULE} on ${HOST}:${PORT}"
   exec python -m uvicorn "${APP_MODULE}" --host "${HOST}" --port "${PORT}" --reload --reload-dir app --log-level "${LOWER_LOG_LEVEL}"
 else
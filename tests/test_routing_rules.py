@@ -0,0 +1,77 @@
+import pytest
+
+from app.agent.routing_rules import (
+    RouteDecision,
+    decide_without_llm,
+    is_deploy_command,
+    remember_decision,
+)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "show me how the pricing works",
+        "what happens if the payment fails?",
+        "How does the contact form work?",
+        "is the footer broken on mobile?",
+        "can you add a FAQ?",
+        "use the new logo",
+    ],
+)
+def test_questions_and_ambiguous_verbs_are_left_to_the_llm(text):
+    assert decide_without_llm("session-questions", text) is None
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "The contact form is broken",
+        "I get a TypeError when I open the page",
+        "the hero section doesn't work on mobile",
+    ],
+)
+def test_declarative_bug_reports_route_to_code(text):
+    decision = decide_without_llm("session-bugs", text)
+    assert decision == RouteDecision(
+        "code", True, "Message reports an error or bug.", "rule"
+    )
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["make the hero darker", "Please add a FAQ section", "could you remove the banner"],
+)
+def test_edit_instructions_route_to_code(text):
+    decision = decide_without_llm("session-edits", text)
+    assert decision is not None
+    assert (decision.next_node, decision.is_followup, decision.source) == (
+        "code",
+        True,
+        "heuristic",
+    )
+
+
+def test_deploy_command_routes_to_deploy():
+    decision = decide_without_llm("session-deploy", "Deploy the landing page")
+    assert decision is not None
+    assert (decision.next_node, decision.source) == ("deploy", "rule")
+
+
+def test_llm_decisions_are_reused_for_the_same_question():
+    text = "what happens if the payment fails?"
+    remember_decision(
+        "session-cache", text, RouteDecision("clarify", False, "Question.", "llm")
+    )
+    decision = decide_without_llm("session-cache", text)
+    assert decision == RouteDecision("clarify", False, "Question.", "cache")
+    assert decide_without_llm("another-session", text) is None
+
+
+def test_is_deploy_command():
+    assert is_deploy_command("Deploy the landing page")
+    assert is_deploy_command(
+        "This is a follow-up request: User prompt: please redeploy it"
+    )
+    assert not is_deploy_command("deploy a new pricing section")
+    assert not is_deploy_command("how do I deploy?")